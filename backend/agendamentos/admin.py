@@ -1,7 +1,9 @@
 from django.contrib import admin
 from .models import (
-    CreditoAula 
+    CreditoAula,
+    MovimentoCredito,
 )
 
 # Register your models here.
-admin.site.register(CreditoAula)
\ No newline at end of file
+admin.site.register(CreditoAula)
+admin.site.register(MovimentoCredito)
\ No newline at end of file
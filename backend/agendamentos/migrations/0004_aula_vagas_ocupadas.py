@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:36
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def preencher_vagas_ocupadas(apps, schema_editor):
+    Aula = apps.get_model("agendamentos", "Aula")
+    AulaAluno = apps.get_model("agendamentos", "AulaAluno")
+    contagem = (
+        AulaAluno.objects.filter(aula=OuterRef("pk"))
+        .order_by()
+        .values("aula")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Aula.objects.update(vagas_ocupadas=Coalesce(Subquery(contagem), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agendamentos", "0003_creditoaula_matricula_origem"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="aula",
+            name="vagas_ocupadas",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(preencher_vagas_ocupadas, migrations.RunPython.noop),
+    ]
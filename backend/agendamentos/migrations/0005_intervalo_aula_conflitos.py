@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:39
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def preencher_intervalos(apps, schema_editor):
+    Aula = apps.get_model("agendamentos", "Aula")
+    AulaAluno = apps.get_model("agendamentos", "AulaAluno")
+
+    lote = []
+    for aula in Aula.objects.only("id", "data_hora_inicio", "duracao_minutos").iterator(chunk_size=2000):
+        aula.data_hora_fim = aula.data_hora_inicio + timedelta(minutes=aula.duracao_minutos)
+        lote.append(aula)
+        if len(lote) >= 2000:
+            Aula.objects.bulk_update(lote, ["data_hora_fim"])
+            lote = []
+    if lote:
+        Aula.objects.bulk_update(lote, ["data_hora_fim"])
+
+    aulas = Aula.objects.filter(pk=OuterRef("aula_id"))
+    AulaAluno.objects.update(
+        data_hora_inicio=Subquery(aulas.values("data_hora_inicio")[:1]),
+        data_hora_fim=Subquery(aulas.values("data_hora_fim")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agendamentos", "0004_aula_vagas_ocupadas"),
+        ("alunos", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="aula",
+            name="data_hora_fim",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="aulaaluno",
+            name="data_hora_fim",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="aulaaluno",
+            name="data_hora_inicio",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="aulaaluno",
+            index=models.Index(
+                fields=["aluno", "data_hora_fim", "data_hora_inicio"],
+                name="aulaaluno_aluno_intervalo_idx",
+            ),
+        ),
+        migrations.RunPython(preencher_intervalos, migrations.RunPython.noop),
+    ]
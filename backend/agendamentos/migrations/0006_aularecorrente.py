@@ -0,0 +1,118 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agendamentos", "0005_intervalo_aula_conflitos"),
+        ("studios", "0003_alter_studio_options"),
+        ("usuarios", "0002_alter_colaborador_registro_profissional"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AulaRecorrente",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "dia_semana",
+                    models.IntegerField(
+                        choices=[
+                            (0, "Segunda-feira"),
+                            (1, "Terça-feira"),
+                            (2, "Quarta-feira"),
+                            (3, "Quinta-feira"),
+                            (4, "Sexta-feira"),
+                            (5, "Sábado"),
+                            (6, "Domingo"),
+                        ]
+                    ),
+                ),
+                ("horario", models.TimeField()),
+                ("duracao_minutos", models.PositiveIntegerField(default=60)),
+                ("capacidade_maxima", models.PositiveIntegerField(default=3)),
+                (
+                    "tipo_aula",
+                    models.CharField(
+                        choices=[
+                            ("REGULAR", "Regular"),
+                            ("EXPERIMENTAL", "Experimental"),
+                            ("REPOSICAO", "Reposição"),
+                        ],
+                        default="REGULAR",
+                        max_length=20,
+                    ),
+                ),
+                ("ativa", models.BooleanField(default=True)),
+                (
+                    "instrutor_principal",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="aulas_recorrentes_principais",
+                        to="usuarios.colaborador",
+                    ),
+                ),
+                (
+                    "instrutor_substituto",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="aulas_recorrentes_substitutas",
+                        to="usuarios.colaborador",
+                    ),
+                ),
+                (
+                    "modalidade",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="aulas_recorrentes",
+                        to="agendamentos.modalidade",
+                    ),
+                ),
+                (
+                    "studio",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="aulas_recorrentes",
+                        to="studios.studio",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Aula Recorrente",
+                "verbose_name_plural": "Aulas Recorrentes",
+                "ordering": ["studio", "dia_semana", "horario"],
+            },
+        ),
+        migrations.AddField(
+            model_name="aula",
+            name="recorrencia",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="aulas_geradas",
+                to="agendamentos.aularecorrente",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="aula",
+            constraint=models.UniqueConstraint(
+                fields=("recorrencia", "data_hora_inicio"),
+                name="aula_recorrencia_inicio_unica",
+            ),
+        ),
+    ]
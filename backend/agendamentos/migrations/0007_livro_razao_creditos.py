@@ -0,0 +1,166 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:50
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def preencher_livro_razao(apps, schema_editor):
+    """
+    Lotes ainda válidos recebem todo o saldo; lotes invalidados ficam zerados.
+    Cada lote ganha uma concessão e, se invalidado, o consumo/expiração que o
+    zerou, de modo que a soma dos movimentos bata com o saldo.
+    """
+    CreditoAula = apps.get_model("agendamentos", "CreditoAula")
+    MovimentoCredito = apps.get_model("agendamentos", "MovimentoCredito")
+    CreditoAula.objects.filter(data_invalidacao__isnull=True).update(saldo=F("quantidade"))
+
+    lotes = CreditoAula.objects.values_list(
+        "pk", "aluno_id", "quantidade", "data_invalidacao", "adicionado_por_id", "invalidado_por_id"
+    )
+    consumidos = set(
+        CreditoAula.objects.filter(agendamento_uso__isnull=False).values_list("pk", flat=True)
+    )
+    movimentos = []
+    for pk, aluno_id, quantidade, data_invalidacao, adicionado_por_id, invalidado_por_id in lotes.iterator():
+        movimentos.append(
+            MovimentoCredito(
+                credito_id=pk,
+                aluno_id=aluno_id,
+                tipo="CONCESSAO",
+                quantidade=quantidade,
+                registrado_por_id=adicionado_por_id,
+            )
+        )
+        if data_invalidacao is not None:
+            movimentos.append(
+                MovimentoCredito(
+                    credito_id=pk,
+                    aluno_id=aluno_id,
+                    tipo="CONSUMO" if pk in consumidos else "EXPIRACAO",
+                    quantidade=-quantidade,
+                    registrado_por_id=invalidado_por_id,
+                )
+            )
+    MovimentoCredito.objects.bulk_create(movimentos, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agendamentos", "0006_aularecorrente"),
+        ("alunos", "0001_initial"),
+        ("financeiro", "0009_historicalestoquestudio_historicalmatricula_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MovimentoCredito",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "tipo",
+                    models.CharField(
+                        choices=[
+                            ("CONCESSAO", "Concessão"),
+                            ("CONSUMO", "Consumo"),
+                            ("ESTORNO", "Estorno"),
+                            ("EXPIRACAO", "Expiração"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "quantidade",
+                    models.BigIntegerField(
+                        help_text="Positiva para concessões e estornos, negativa para consumos e expirações."
+                    ),
+                ),
+                ("data", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Movimento de Crédito",
+                "verbose_name_plural": "Movimentos de Crédito",
+                "ordering": ["-data", "-pk"],
+            },
+        ),
+        migrations.AddField(
+            model_name="creditoaula",
+            name="saldo",
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name="creditoaula",
+            name="quantidade",
+            field=models.PositiveBigIntegerField(
+                default=1,
+                help_text="Quantidade de créditos concedidos neste lote",
+                validators=[django.core.validators.MinValueValidator(1)],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="creditoaula",
+            index=models.Index(
+                fields=["aluno", "data_validade"], name="credito_aluno_validade_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="movimentocredito",
+            name="agendamento",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="movimentos_credito",
+                to="agendamentos.aulaaluno",
+            ),
+        ),
+        migrations.AddField(
+            model_name="movimentocredito",
+            name="aluno",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="movimentos_credito",
+                to="alunos.aluno",
+            ),
+        ),
+        migrations.AddField(
+            model_name="movimentocredito",
+            name="credito",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="movimentos",
+                to="agendamentos.creditoaula",
+            ),
+        ),
+        migrations.AddField(
+            model_name="movimentocredito",
+            name="registrado_por",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="movimentos_credito_registrados",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="movimentocredito",
+            index=models.Index(
+                fields=["aluno", "data"], name="movcredito_aluno_data_idx"
+            ),
+        ),
+        migrations.RunPython(preencher_livro_razao, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agendamentos", "0007_livro_razao_creditos"),
+        ("studios", "0003_alter_studio_options"),
+        ("usuarios", "0002_alter_colaborador_registro_profissional"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="aula",
+            index=models.Index(
+                fields=["studio", "data_hora_inicio"], name="aula_studio_inicio_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agendamentos", "0008_aula_studio_inicio_idx"),
+        ("alunos", "0001_initial"),
+        ("studios", "0003_alter_studio_options"),
+        ("usuarios", "0002_alter_colaborador_registro_profissional"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="aula",
+            index=models.Index(
+                fields=["instrutor_principal", "data_hora_inicio"],
+                name="aula_instrutor_inicio_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="aula",
+            index=models.Index(fields=["data_hora_inicio"], name="aula_inicio_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="aulaaluno",
+            index=models.Index(
+                fields=["aluno", "status_presenca"], name="aulaaluno_aluno_status_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agendamentos", "0009_indices_periodo_aulas"),
+        ("alunos", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="aulaaluno",
+            index=models.Index(
+                fields=["aluno", "data_hora_inicio"], name="aulaaluno_aluno_inicio_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="aulaaluno",
+            index=models.Index(
+                fields=["data_hora_inicio"], name="aulaaluno_inicio_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:14
+
+import agendamentos.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agendamentos", "0010_indices_paginacao_cursor"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="aula",
+            name="data_ultima_modificacao",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.CreateModel(
+            name="TokenCalendario",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "token",
+                    models.CharField(
+                        default=agendamentos.models.gerar_token_calendario,
+                        max_length=64,
+                        unique=True,
+                    ),
+                ),
+                ("data_criacao", models.DateTimeField(auto_now_add=True)),
+                (
+                    "usuario",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="token_calendario",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Token de Calendário",
+                "verbose_name_plural": "Tokens de Calendário",
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agendamentos", "0011_feeds_icalendar"),
+        ("studios", "0003_alter_studio_options"),
+        ("usuarios", "0002_alter_colaborador_registro_profissional"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="aula",
+            index=models.Index(
+                fields=["instrutor_principal", "data_hora_fim", "data_hora_inicio"],
+                name="aula_principal_conflito_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="aula",
+            index=models.Index(
+                fields=["instrutor_substituto", "data_hora_fim", "data_hora_inicio"],
+                name="aula_substituto_conflito_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agendamentos", "0012_indices_conflito_instrutor"),
+        ("alunos", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="reposicao",
+            index=models.Index(
+                fields=["aluno", "status"], name="reposicao_aluno_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reposicao",
+            index=models.Index(
+                fields=["status", "data_expiracao"],
+                name="reposicao_status_validade_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agendamentos", "0013_expiracao_reposicoes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="aula",
+            name="cancelamentos",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:11
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef, Q
+
+
+def preencher_status(apps, schema_editor):
+    """
+    Lotes invalidados que perderam saldo por expiração ficam EXPIRADA; os
+    demais lotes sem saldo ficam UTILIZADA. O restante já nasce DISPONIVEL.
+    """
+    CreditoAula = apps.get_model("agendamentos", "CreditoAula")
+    MovimentoCredito = apps.get_model("agendamentos", "MovimentoCredito")
+    expirados = MovimentoCredito.objects.filter(credito=OuterRef("pk"), tipo="EXPIRACAO")
+    sem_saldo = CreditoAula.objects.filter(Q(data_invalidacao__isnull=False) | Q(saldo=0))
+    sem_saldo.filter(Exists(expirados)).update(status="EXPIRADA")
+    sem_saldo.exclude(Exists(expirados)).update(status="UTILIZADA")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agendamentos", "0014_cancelamentos_por_aula"),
+        ("alunos", "0001_initial"),
+        ("financeiro", "0010_vencimento_por_status"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="creditoaula",
+            name="credito_aluno_validade_idx",
+        ),
+        migrations.AddField(
+            model_name="creditoaula",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("DISPONIVEL", "Disponível"),
+                    ("UTILIZADA", "Utilizada"),
+                    ("EXPIRADA", "Expirada"),
+                ],
+                default="DISPONIVEL",
+                editable=False,
+                max_length=10,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="creditoaula",
+            index=models.Index(
+                fields=["aluno", "status", "data_validade"],
+                name="credito_aluno_status_idx",
+            ),
+        ),
+        migrations.RunPython(preencher_status, migrations.RunPython.noop),
+    ]
@@ -7,6 +7,8 @@ from financeiro.models import Matricula
 from django.core.validators import MinValueValidator
 from django.conf import settings
 from django.core.validators import MinValueValidator
+from datetime import timedelta
+import secrets
 
 
 class HorarioTrabalho(models.Model):
@@ -101,19 +103,134 @@ class Aula(models.Model):
     )
     data_hora_inicio = models.DateTimeField()
     duracao_minutos = models.PositiveIntegerField(default=60)
+    # Fim da aula (início + duração), armazenado para consultas de sobreposição por índice.
+    data_hora_fim = models.DateTimeField(null=True, editable=False)
     capacidade_maxima = models.PositiveIntegerField(default=3)
+    # Contador desnormalizado de inscrições (AulaAluno) da aula.
+    # Mantido via F() pelos signals e pelos serviços de agendamento;
+    # pode ser reconstruído com `manage.py reconciliar_vagas`.
+    vagas_ocupadas = models.PositiveIntegerField(default=0, editable=False)
+    # Inscrições canceladas antes do início da aula. O histórico por horário
+    # alimenta a probabilidade de promoção da lista de espera.
+    cancelamentos = models.PositiveIntegerField(default=0, editable=False)
     tipo_aula = models.CharField(
         max_length=20, choices=TipoAula.choices, default=TipoAula.REGULAR
     )
+    recorrencia = models.ForeignKey(
+        "AulaRecorrente",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="aulas_geradas",
+    )
+    # Atualizado a cada save(); serve de Last-Modified/ETag para os feeds iCalendar.
+    # Os UPDATEs do contador de vagas não passam por aqui, de propósito.
+    data_ultima_modificacao = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["data_hora_inicio"]
         verbose_name = "Aula"
         verbose_name_plural = "Aulas"
+        indexes = [
+            # Busca de vagas e grades por estúdio em um intervalo de datas.
+            models.Index(fields=["studio", "data_hora_inicio"], name="aula_studio_inicio_idx"),
+            # Agenda do instrutor e calendário geral (sem filtro de estúdio).
+            models.Index(fields=["instrutor_principal", "data_hora_inicio"], name="aula_instrutor_inicio_idx"),
+            models.Index(fields=["data_hora_inicio"], name="aula_inicio_idx"),
+            # Conflitos de horário de instrutores: aulas que terminam depois do início pedido.
+            models.Index(
+                fields=["instrutor_principal", "data_hora_fim", "data_hora_inicio"],
+                name="aula_principal_conflito_idx",
+            ),
+            models.Index(
+                fields=["instrutor_substituto", "data_hora_fim", "data_hora_inicio"],
+                name="aula_substituto_conflito_idx",
+            ),
+        ]
+        constraints = [
+            # Garante que o gerador de aulas recorrentes seja idempotente.
+            models.UniqueConstraint(
+                fields=["recorrencia", "data_hora_inicio"],
+                name="aula_recorrencia_inicio_unica",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.modalidade.nome} em {self.studio.nome} - {self.data_hora_inicio.strftime('%d/%m/%Y %H:%M')}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Estúdio lido do banco: se a aula for movida, os dois calendários são invalidados.
+        instancia._studio_id_carregado = instancia.__dict__.get('studio_id')
+        return instancia
+
+    def calcular_data_hora_fim(self):
+        return self.data_hora_inicio + timedelta(minutes=self.duracao_minutos)
+
+    def save(self, *args, **kwargs):
+        self.data_hora_fim = self.calcular_data_hora_fim()
+        criando = self._state.adding
+
+        # Os contadores só são alterados por UPDATEs atômicos (F()); um save()
+        # comum não deve sobrescrevê-los com o valor carregado em memória.
+        if not criando and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ('vagas_ocupadas', 'cancelamentos')
+            ]
+        super().save(*args, **kwargs)
+
+        # Mantém o intervalo copiado nas inscrições em sincronia com a aula.
+        if not criando:
+            self.alunos_inscritos.exclude(
+                data_hora_inicio=self.data_hora_inicio,
+                data_hora_fim=self.data_hora_fim,
+            ).update(data_hora_inicio=self.data_hora_inicio, data_hora_fim=self.data_hora_fim)
+
+
+class AulaRecorrente(models.Model):
+    """
+    Modelo (gabarito) de uma aula semanal fixa do estúdio.
+    É expandido em instâncias de Aula pelo gerador de aulas recorrentes.
+    """
+
+    studio = models.ForeignKey(
+        Studio, on_delete=models.CASCADE, related_name="aulas_recorrentes"
+    )
+    modalidade = models.ForeignKey(
+        Modalidade, on_delete=models.PROTECT, related_name="aulas_recorrentes"
+    )
+    instrutor_principal = models.ForeignKey(
+        Colaborador,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="aulas_recorrentes_principais",
+    )
+    instrutor_substituto = models.ForeignKey(
+        Colaborador,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="aulas_recorrentes_substitutas",
+    )
+    dia_semana = models.IntegerField(choices=HorarioTrabalho.DiaSemana.choices)
+    horario = models.TimeField()
+    duracao_minutos = models.PositiveIntegerField(default=60)
+    capacidade_maxima = models.PositiveIntegerField(default=3)
+    tipo_aula = models.CharField(
+        max_length=20, choices=Aula.TipoAula.choices, default=Aula.TipoAula.REGULAR
+    )
+    ativa = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ["studio", "dia_semana", "horario"]
+        verbose_name = "Aula Recorrente"
+        verbose_name_plural = "Aulas Recorrentes"
+
+    def __str__(self):
+        return f"{self.modalidade.nome} em {self.studio.nome} - {self.get_dia_semana_display()} às {self.horario.strftime('%H:%M')}"
+
 
 class AulaAluno(models.Model):
     """
@@ -136,6 +253,11 @@ class AulaAluno(models.Model):
         max_length=20, choices=StatusPresenca.choices, default=StatusPresenca.AGENDADO
     )
 
+    # Cópia do intervalo da aula, usada na detecção de conflitos de horário
+    # via índice (aluno, data_hora_fim, data_hora_inicio) sem JOIN com Aula.
+    data_hora_inicio = models.DateTimeField(null=True, editable=False)
+    data_hora_fim = models.DateTimeField(null=True, editable=False)
+
     # Adicionando o campo credito_utilizado
     credito_utilizado = models.ForeignKey(
         "CreditoAula",
@@ -149,10 +271,26 @@ class AulaAluno(models.Model):
         unique_together = ("aula", "aluno")
         verbose_name = "Agendamento de Aluno"
         verbose_name_plural = "Agendamentos de Alunos"
+        indexes = [
+            models.Index(
+                fields=["aluno", "data_hora_fim", "data_hora_inicio"],
+                name="aulaaluno_aluno_intervalo_idx",
+            ),
+            models.Index(fields=["aluno", "status_presenca"], name="aulaaluno_aluno_status_idx"),
+            # Listagens paginadas por cursor em (data_hora_inicio, id).
+            models.Index(fields=["aluno", "data_hora_inicio"], name="aulaaluno_aluno_inicio_idx"),
+            models.Index(fields=["data_hora_inicio"], name="aulaaluno_inicio_idx"),
+        ]
 
     def __str__(self):
         return f"{self.aluno} na aula de {self.aula.modalidade.nome} em {self.aula.data_hora_inicio.strftime('%d/%m')}"
 
+    def save(self, *args, **kwargs):
+        if self.aula_id:
+            self.data_hora_inicio = self.aula.data_hora_inicio
+            self.data_hora_fim = self.aula.data_hora_fim or self.aula.calcular_data_hora_fim()
+        super().save(*args, **kwargs)
+
 
 class Reposicao(models.Model):
     """
@@ -177,6 +315,14 @@ class Reposicao(models.Model):
         default=StatusReposicao.DISPONIVEL,
     )
 
+    class Meta:
+        indexes = [
+            # Consulta de reposições disponíveis do aluno; as vencidas saem do
+            # status DISPONIVEL pela varredura diária (expirar_creditos).
+            models.Index(fields=["aluno", "status"], name="reposicao_aluno_status_idx"),
+            models.Index(fields=["status", "data_expiracao"], name="reposicao_status_validade_idx"),
+        ]
+
     def __str__(self):
         return f"Reposição para {self.aluno} (expira em {self.data_expiracao})"
 
@@ -231,7 +377,23 @@ class CreditoAula(models.Model):
     quantidade = models.PositiveBigIntegerField(
         default=1,
         validators=[MinValueValidator(1)],
-        help_text="Quantidade de créditos disponíveis",
+        help_text="Quantidade de créditos concedidos neste lote",
+    )
+
+    # Saldo em cache do lote: quantidade concedida menos consumos e expirações,
+    # mais estornos. O histórico completo fica em MovimentoCredito; o agendamento
+    # só lê e decrementa este campo.
+    saldo = models.PositiveBigIntegerField(default=0, editable=False)
+
+    # Situação do lote, mantida junto com saldo e data_invalidacao: DISPONIVEL
+    # enquanto houver saldo, UTILIZADA quando o saldo se esgota em agendamentos
+    # e EXPIRADA quando o lote vence ou é invalidado manualmente. A busca de
+    # crédito do agendamento filtra por ela (índice aluno, status, validade).
+    status = models.CharField(
+        max_length=10,
+        choices=StatusCredito.choices,
+        default=StatusCredito.DISPONIVEL,
+        editable=False,
     )
 
     agendamento_origem = models.ForeignKey(
@@ -271,5 +433,99 @@ class CreditoAula(models.Model):
         related_name='creditos_gerados'
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["aluno", "status", "data_validade"],
+                name="credito_aluno_status_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"Reposição para {self.aluno} (expira em {self.data_validade})"
+
+    def save(self, *args, **kwargs):
+        # Um lote novo nasce com todo o saldo, a menos que já venha invalidado.
+        if self._state.adding and not self.saldo and self.data_invalidacao is None:
+            self.saldo = self.quantidade
+        if self._state.adding and self.data_invalidacao is not None:
+            self.status = self.StatusCredito.EXPIRADA
+        elif self._state.adding and not self.saldo:
+            self.status = self.StatusCredito.UTILIZADA
+        super().save(*args, **kwargs)
+
+
+class MovimentoCredito(models.Model):
+    """
+    Livro-razão dos créditos de aula: cada concessão, consumo, estorno ou
+    expiração de um lote gera uma entrada. A soma das entradas de um lote é
+    igual ao seu saldo.
+    """
+
+    class Tipo(models.TextChoices):
+        CONCESSAO = "CONCESSAO", "Concessão"
+        CONSUMO = "CONSUMO", "Consumo"
+        ESTORNO = "ESTORNO", "Estorno"
+        EXPIRACAO = "EXPIRACAO", "Expiração"
+
+    credito = models.ForeignKey(
+        CreditoAula, on_delete=models.CASCADE, related_name="movimentos"
+    )
+    aluno = models.ForeignKey(
+        Aluno, on_delete=models.CASCADE, related_name="movimentos_credito", null=True
+    )
+    tipo = models.CharField(max_length=10, choices=Tipo.choices)
+    quantidade = models.BigIntegerField(
+        help_text="Positiva para concessões e estornos, negativa para consumos e expirações."
+    )
+    agendamento = models.ForeignKey(
+        AulaAluno,
+        on_delete=models.SET_NULL,
+        related_name="movimentos_credito",
+        null=True,
+        blank=True,
+    )
+    registrado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        related_name="movimentos_credito_registrados",
+        null=True,
+        blank=True,
+    )
+    data = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-data", "-pk"]
+        verbose_name = "Movimento de Crédito"
+        verbose_name_plural = "Movimentos de Crédito"
+        indexes = [
+            models.Index(fields=["aluno", "data"], name="movcredito_aluno_data_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} de {self.quantidade} crédito(s) para {self.aluno}"
+
+
+def gerar_token_calendario():
+    return secrets.token_urlsafe(32)
+
+
+class TokenCalendario(models.Model):
+    """
+    Token secreto que dá acesso, sem login, aos feeds iCalendar (.ics) de um
+    usuário. Aplicativos de calendário não enviam credenciais, então a URL do
+    feed carrega o token; gerar um novo token invalida as URLs antigas.
+    """
+
+    usuario = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="token_calendario"
+    )
+    token = models.CharField(max_length=64, unique=True, default=gerar_token_calendario)
+    data_criacao = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Token de Calendário"
+        verbose_name_plural = "Tokens de Calendário"
+
+    def __str__(self):
+        return f"Token de calendário de {self.usuario}"
@@ -1,6 +1,8 @@
 # agendamentos/serializers.py
 import datetime
+from collections import Counter
 from rest_framework import serializers
+from django.db import transaction
 from .models import (
     HorarioTrabalho,
     BloqueioAgenda,
@@ -10,13 +12,26 @@ from .models import (
     Reposicao,
     ListaEspera,
     CreditoAula,
+    AulaRecorrente,
     Aluno
 )
 from studios.models import Studio
-from datetime import timedelta
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 from alunos.serializers import AlunoSerializer 
+from .services import (
+    calcular_ocupacao,
+    bloquear_aula,
+    buscar_conflito_aluno,
+    mensagem_conflito,
+    buscar_credito_disponivel,
+    filtrar_por_periodo,
+    intervalo_da_aula,
+    motivo_fora_do_expediente,
+    buscar_conflito_instrutor,
+    mensagem_conflito_instrutor,
+)
+from .tarefas import agendar_promocao_lista_espera
 
 class HorarioTrabalhoSerializer(serializers.ModelSerializer):
     class Meta:
@@ -67,6 +82,241 @@ class AulaWriteSerializer(serializers.ModelSerializer):
             "instrutor_substituto",
         ]
 
+    def validate(self, attrs):
+        """
+        Rejeita aulas fora do horário de funcionamento do estúdio, em datas
+        bloqueadas ou com um instrutor já escalado em outra aula no mesmo horário.
+        Só é verificado quando algum desses dados muda.
+        """
+        campos_horario = {'studio', 'data_hora_inicio', 'duracao_minutos'}
+        campos_instrutor = {'instrutor_principal', 'instrutor_substituto'}
+        if not (campos_horario | campos_instrutor) & attrs.keys():
+            return attrs
+
+        # Aula em memória com os valores finais, sem salvar.
+        aula = Aula(pk=getattr(self.instance, 'pk', None))
+        if self.instance is not None:
+            for campo in ('studio_id', 'instrutor_principal_id', 'instrutor_substituto_id', 'data_hora_inicio', 'duracao_minutos'):
+                setattr(aula, campo, getattr(self.instance, campo))
+        for campo in (campos_horario | campos_instrutor) & attrs.keys():
+            setattr(aula, campo, attrs[campo])
+        if aula.data_hora_inicio is None:
+            return attrs
+        inicio, fim = aula.data_hora_inicio, aula.calcular_data_hora_fim()
+
+        if campos_horario & attrs.keys():
+            motivo = motivo_fora_do_expediente(aula.studio_id, inicio, fim)
+            if motivo:
+                raise ValidationError({"data_hora_inicio": motivo})
+
+        aula.data_hora_fim = fim
+        conflito = buscar_conflito_instrutor(aula)
+        if conflito:
+            raise ValidationError(mensagem_conflito_instrutor(conflito))
+        return attrs
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        """
+        Trava a aula antes de salvar: o contador `vagas_ocupadas` é relido do banco
+        (evitando sobrescrevê-lo com um valor antigo) e a nova capacidade não pode
+        ficar abaixo das vagas já ocupadas.
+        """
+        aula_travada = bloquear_aula(instance.pk)
+        instance.vagas_ocupadas = aula_travada.vagas_ocupadas
+
+        capacidade_anterior = aula_travada.capacidade_maxima
+        nova_capacidade = validated_data.get('capacidade_maxima', instance.capacidade_maxima)
+        if nova_capacidade < instance.vagas_ocupadas:
+            raise ValidationError({
+                "capacidade_maxima": f"A capacidade não pode ser menor que o número de alunos já inscritos ({instance.vagas_ocupadas})."
+            })
+        aula = super().update(instance, validated_data)
+
+        # Novas vagas abertas: promove a lista de espera.
+        if nova_capacidade > capacidade_anterior:
+            agendar_promocao_lista_espera(aula.pk)
+        return aula
+
+class BuscaDisponibilidadeSerializer(serializers.Serializer):
+    """
+    Parâmetros (query string) da busca de vagas. 'studio' aceita vários IDs
+    separados por vírgula. Sem datas, busca a partir de hoje pelos próximos 7 dias.
+    """
+    data_inicio = serializers.DateField(required=False)
+    data_fim = serializers.DateField(required=False)
+    studio = serializers.CharField(required=False, source='studios')
+    modalidade = serializers.IntegerField(required=False)
+    instrutor = serializers.IntegerField(required=False)
+    hora_inicio = serializers.TimeField(required=False)
+    hora_fim = serializers.TimeField(required=False)
+    limite = serializers.IntegerField(required=False, default=200, min_value=1, max_value=500)
+
+    def validate_studio(self, value):
+        try:
+            return [int(studio_id) for studio_id in value.split(',') if studio_id.strip()]
+        except ValueError:
+            raise ValidationError("Informe os IDs dos estúdios separados por vírgula.")
+
+    def validate(self, attrs):
+        attrs.setdefault('data_inicio', timezone.localdate())
+        attrs.setdefault('data_fim', attrs['data_inicio'] + datetime.timedelta(days=6))
+        if attrs['data_fim'] < attrs['data_inicio']:
+            raise ValidationError({"data_fim": "A data final deve ser igual ou posterior à data inicial."})
+        if (attrs['data_fim'] - attrs['data_inicio']).days > 62:
+            raise ValidationError({"data_fim": "O período máximo de busca é de dois meses."})
+        return attrs
+
+
+class AulaDisponivelSerializer(serializers.Serializer):
+    """
+    Projeção compacta de uma aula com vagas (services.buscar_aulas_disponiveis).
+    """
+    id = serializers.IntegerField()
+    data_hora_inicio = serializers.DateTimeField()
+    data_hora_fim = serializers.DateTimeField()
+    duracao_minutos = serializers.IntegerField()
+    tipo_aula = serializers.CharField()
+    studio_id = serializers.IntegerField()
+    studio_nome = serializers.CharField()
+    modalidade_id = serializers.IntegerField()
+    modalidade_nome = serializers.CharField()
+    instrutor_nome = serializers.SerializerMethodField()
+    vagas_livres = serializers.IntegerField()
+
+    def get_instrutor_nome(self, obj):
+        return (obj['instrutor_nome'] or '').strip() or None
+
+
+class CalendarioSemanalSerializer(serializers.Serializer):
+    """
+    Parâmetros (query string) do calendário semanal. 'semana' segue o formato
+    ISO (ex: 2025-W07); sem ela, usa a semana atual.
+    """
+    studio = serializers.PrimaryKeyRelatedField(queryset=Studio.objects.all())
+    semana = serializers.RegexField(r'^\d{4}-W\d{2}$', required=False)
+
+    def validate_semana(self, value):
+        ano, semana = int(value[:4]), int(value[6:])
+        try:
+            datetime.date.fromisocalendar(ano, semana, 1)
+        except ValueError:
+            raise ValidationError("Semana ISO inválida.")
+        return ano, semana
+
+    def validate(self, attrs):
+        if 'semana' not in attrs:
+            ano, semana, _ = timezone.localdate().isocalendar()
+            attrs['semana'] = (ano, semana)
+        return attrs
+
+
+class AgendamentoSerieSerializer(serializers.Serializer):
+    """
+    Agendamento em série: informe uma aula recorrente (com período opcional)
+    ou uma lista de IDs de aulas. O 'aluno' só é aceito para o staff; o aluno
+    logado agenda para si mesmo.
+    """
+    aluno = serializers.PrimaryKeyRelatedField(queryset=Aluno.objects.all(), required=False)
+    recorrencia = serializers.PrimaryKeyRelatedField(queryset=AulaRecorrente.objects.all(), required=False)
+    aulas = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=200)
+    data_inicio = serializers.DateField(required=False)
+    data_fim = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if bool(attrs.get('recorrencia')) == bool(attrs.get('aulas')):
+            raise ValidationError("Informe uma aula recorrente ('recorrencia') ou uma lista de aulas ('aulas').")
+        if attrs.get('data_inicio') and attrs.get('data_fim') and attrs['data_fim'] < attrs['data_inicio']:
+            raise ValidationError({"data_fim": "A data final deve ser igual ou posterior à data inicial."})
+        return attrs
+
+    def aulas_alvo(self):
+        """IDs das aulas da série, resolvidos a partir da recorrência ou da lista."""
+        dados = self.validated_data
+        if dados.get('aulas'):
+            return dados['aulas']
+        aulas = Aula.objects.filter(
+            recorrencia=dados['recorrencia'], data_hora_inicio__gt=timezone.now()
+        )
+        aulas = filtrar_por_periodo(aulas, dados.get('data_inicio'), dados.get('data_fim'))
+        return list(aulas.order_by('data_hora_inicio').values_list('pk', flat=True)[:200])
+
+
+class CancelamentoAulasSerializer(serializers.Serializer):
+    """
+    Cancelamento de aulas em lote: informe uma lista de IDs de aulas ou um
+    período (com estúdio opcional). Aulas que já começaram são ignoradas.
+    """
+    aulas = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=1000)
+    data_inicio = serializers.DateField(required=False)
+    data_fim = serializers.DateField(required=False)
+    studio = serializers.PrimaryKeyRelatedField(queryset=Studio.objects.all(), required=False)
+    motivo = serializers.CharField(required=False, allow_blank=True, max_length=255)
+
+    def validate(self, attrs):
+        periodo = attrs.get('data_inicio') and attrs.get('data_fim')
+        if bool(attrs.get('aulas')) == bool(periodo):
+            raise ValidationError("Informe uma lista de aulas ('aulas') ou um período ('data_inicio' e 'data_fim').")
+        if periodo:
+            if attrs['data_fim'] < attrs['data_inicio']:
+                raise ValidationError({"data_fim": "A data final deve ser igual ou posterior à data inicial."})
+            if (attrs['data_fim'] - attrs['data_inicio']).days > 62:
+                raise ValidationError({"data_fim": "O período máximo de cancelamento é de dois meses."})
+        return attrs
+
+    def filtrar(self, queryset):
+        """Restringe o queryset de aulas às selecionadas pelos parâmetros."""
+        dados = self.validated_data
+        if dados.get('aulas'):
+            return queryset.filter(pk__in=dados['aulas'])
+        if dados.get('studio'):
+            queryset = queryset.filter(studio=dados['studio'])
+        return filtrar_por_periodo(queryset, dados['data_inicio'], dados['data_fim'])
+
+
+class PresencaChamadaSerializer(serializers.Serializer):
+    aluno = serializers.IntegerField()
+    status_presenca = serializers.ChoiceField(choices=AulaAluno.StatusPresenca.choices)
+
+
+class ChamadaSerializer(serializers.Serializer):
+    """
+    Chamada de uma aula inteira: lista de pares (aluno, status_presenca).
+    A inscrição de cada aluno é conferida de uma vez em services.registrar_chamada.
+    """
+    presencas = PresencaChamadaSerializer(many=True, allow_empty=False)
+
+    def validate_presencas(self, value):
+        contagem = Counter(item['aluno'] for item in value)
+        repetidos = sorted(aluno for aluno, total in contagem.items() if total > 1)
+        if repetidos:
+            raise ValidationError(f"Alunos informados mais de uma vez: {repetidos}.")
+        return value
+
+
+class AulaRecorrenteSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AulaRecorrente
+        fields = "__all__"
+
+
+class GerarAulasRecorrentesSerializer(serializers.Serializer):
+    """
+    Parâmetros para expandir as aulas recorrentes em aulas reais.
+    """
+    data_inicio = serializers.DateField()
+    data_fim = serializers.DateField()
+    studio = serializers.PrimaryKeyRelatedField(queryset=Studio.objects.all(), required=False)
+    recorrencias = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    def validate(self, attrs):
+        if attrs['data_fim'] < attrs['data_inicio']:
+            raise ValidationError({"data_fim": "A data final deve ser igual ou posterior à data inicial."})
+        if (attrs['data_fim'] - attrs['data_inicio']).days > 366:
+            raise ValidationError({"data_fim": "O período máximo de geração é de um ano."})
+        return attrs
+
+
 class AulaReadSerializer(serializers.ModelSerializer):
     modalidade = ModalidadeSerializer(read_only=True)
     instrutor_principal = serializers.StringRelatedField(read_only=True)
@@ -74,7 +324,15 @@ class AulaReadSerializer(serializers.ModelSerializer):
     studio = StudioNestedSerializer(read_only=True)
     
     
-    vagas_preenchidas = serializers.SerializerMethodField()
+    vagas_preenchidas = serializers.SerializerMethodField(
+        help_text="Vagas ocupadas na aula: inscrições em qualquer status (agendado, presente ou ausente)."
+    )
+    vagas_disponiveis = serializers.SerializerMethodField(
+        help_text="Capacidade máxima menos as vagas ocupadas (nunca negativa)."
+    )
+    lista_espera_total = serializers.SerializerMethodField(
+        help_text="Alunos aguardando na lista de espera."
+    )
 
     class Meta:
         model = Aula
@@ -88,16 +346,30 @@ class AulaReadSerializer(serializers.ModelSerializer):
             "studio",
             "instrutor_principal",
             "instrutor_substituto",
-            "vagas_preenchidas", 
+            "vagas_preenchidas",
+            "vagas_disponiveis",
+            "lista_espera_total",
         ]   
     
-    # NOVO MÉTODO: get_vagas_preenchidas
     def get_vagas_preenchidas(self, obj):
         """
-        Calcula o número de vagas preenchidas para a aula.
-        Conta apenas os agendamentos com status 'AGENDADO'.
+        Vagas ocupadas: todas as inscrições da aula, em qualquer status
+        (AGENDADO, PRESENTE ou AUSENTE), como no controle de capacidade.
+        Lido do contador Aula.vagas_ocupadas via services.anotar_ocupacao.
+        """
+        return calcular_ocupacao(obj)[0]
+
+    def get_lista_espera_total(self, obj):
+        """
+        Quantidade de alunos aguardando na lista de espera da aula.
+        """
+        return calcular_ocupacao(obj)[1]
+
+    def get_vagas_disponiveis(self, obj):
+        """
+        Vagas ainda livres na aula.
         """
-        return obj.alunos_inscritos.filter(status_presenca='AGENDADO').count()
+        return calcular_ocupacao(obj)[2]
 
 
 class AulaAlunoSerializer(serializers.ModelSerializer):
@@ -160,39 +432,21 @@ class AgendamentoAlunoSerializer(serializers.ModelSerializer):
         
         if AulaAluno.objects.filter(aula=aula, aluno=aluno).exists():
             raise ValidationError({"detail": "Você já está inscrito nesta aula."})
+
+        motivo = motivo_fora_do_expediente(aula.studio_id, *intervalo_da_aula(aula))
+        if motivo:
+            raise ValidationError({"detail": motivo})
         
         
         horario_inicio_desejado = aula.data_hora_inicio
-        horario_fim_desejado = horario_inicio_desejado + timedelta(minutes=aula.duracao_minutos)
-        
-        
-        agendamentos_existentes = AulaAluno.objects.filter(
-            aluno=aluno,
-            status_presenca='AGENDADO'
-        ).select_related('aula') 
-        
         
-        if self.instance:
-            agendamentos_existentes = agendamentos_existentes.exclude(pk=self.instance.pk)
+        # Sobreposição verificada no banco, via índice (aluno, data_hora_fim, data_hora_inicio).
+        conflito = buscar_conflito_aluno(aluno, aula, excluir_agendamento=self.instance)
+        if conflito:
+            raise ValidationError(mensagem_conflito(conflito, "Você já está"))
 
         
-        for agendamento_existente in agendamentos_existentes:
-            inicio_existente = agendamento_existente.aula.data_hora_inicio
-            fim_existente = inicio_existente + timedelta(minutes=agendamento_existente.aula.duracao_minutos)
-            
-            
-            conflito = (
-                horario_inicio_desejado < fim_existente and
-                horario_fim_desejado > inicio_existente
-            )
-            
-            if conflito:
-                raise ValidationError(
-                    f"Conflito de agendamento. Você já está inscrito na aula '{agendamento_existente.aula}' que ocorre de {inicio_existente.strftime('%H:%M')} às {fim_existente.strftime('%H:%M')}."
-                )
-
-        
-        vagas_ocupadas = AulaAluno.objects.filter(aula=aula, status_presenca='AGENDADO').count()
+        vagas_ocupadas = aula.vagas_ocupadas
         is_update_sem_mudanca_aula = self.instance and self.instance.aula == aula
         
         if not is_update_sem_mudanca_aula: 
@@ -203,9 +457,8 @@ class AgendamentoAlunoSerializer(serializers.ModelSerializer):
                     if ListaEspera.objects.filter(aula=aula, aluno=aluno).exists():
                         raise ValidationError({"detail": "Você já está na lista de espera para esta aula."})
                     
-                    
-                    ListaEspera.objects.create(aula=aula, aluno=aluno)
-                    attrs['_adicionado_lista_espera'] = True
+                    # A entrada é gravada pela view (services.entrar_lista_espera), na transação.
+                    attrs['_lista_espera'] = True
                     return attrs
                 else:
                     raise ValidationError("Não há mais vagas disponíveis nesta aula. Para entrar na lista de espera, envie 'entrar_lista_espera: true'.")
@@ -213,11 +466,9 @@ class AgendamentoAlunoSerializer(serializers.ModelSerializer):
         
         
         if aula.tipo_aula == Aula.TipoAula.REGULAR:
-            credito_disponivel = CreditoAula.objects.filter(
-                aluno=aluno,
-                data_invalidacao__isnull=True, 
-                data_validade__gte=horario_inicio_desejado.date()
-            ).order_by('data_validade').first()
+            credito_disponivel = buscar_credito_disponivel(
+                aluno, timezone.localtime(horario_inicio_desejado).date()
+            )
 
             if not credito_disponivel:
                  raise ValidationError("Você não possui créditos de aula disponíveis ou válidos para este agendamento.")
@@ -226,111 +477,6 @@ class AgendamentoAlunoSerializer(serializers.ModelSerializer):
 
         return attrs
         
-class AgendamentoStaffSerializer(serializers.ModelSerializer):
-    """
-    Serializer para o Staff agendar um aluno em uma aula.
-    O 'aluno' é explícito e obrigatório.
-    """
-    aluno = serializers.PrimaryKeyRelatedField(queryset=Aluno.objects.all()) 
-    entrar_lista_espera = serializers.BooleanField(write_only=True, required=False)
-
-    class Meta:
-        model = AulaAluno
-        fields = ['id', 'aula', 'aluno', 'status_presenca', 'credito_utilizado', 'entrar_lista_espera']
-        read_only_fields = [
-            'id',
-            'status_presenca',
-            'credito_utilizado'
-        ]
-
-    def validate(self, attrs):
-        """
-        Validação para:
-        Impedir agendamentos duplos (conflito de horário).
-        Verificar disponibilidade de vagas ou adicionar à lista de espera.
-        Verificar e preparar consumo de crédito (Issue #57).
-        """
-        aula = attrs.get('aula')
-        aluno = attrs.get('aluno')
-        
-        if not aula or not aluno:
-            return attrs 
-
-        # Verificar se o aluno já está inscrito nesta aula
-        if AulaAluno.objects.filter(aula=aula, aluno=aluno).exists():
-            raise ValidationError({"detail": f"O aluno {aluno} já está inscrito nesta aula."})
-            
-        horario_inicio_desejado = aula.data_hora_inicio
-        horario_fim_desejado = horario_inicio_desejado + timedelta(minutes=aula.duracao_minutos)
-        
-        agendamentos_existentes = AulaAluno.objects.filter(
-            aluno=aluno,
-            status_presenca='AGENDADO' 
-        ).select_related('aula') 
-
-        if self.instance:
-            agendamentos_existentes = agendamentos_existentes.exclude(pk=self.instance.pk)
-
-        for agendamento_existente in agendamentos_existentes:
-            inicio_existente = agendamento_existente.aula.data_hora_inicio
-            fim_existente = inicio_existente + timedelta(minutes=agendamento_existente.aula.duracao_minutos)
-            
-            conflito = (
-                horario_inicio_desejado < fim_existente and
-                horario_fim_desejado > inicio_existente
-            )
-            
-            if conflito:
-                raise ValidationError(
-                    f"Conflito de agendamento. O aluno já está inscrito na aula '{agendamento_existente.aula}' que ocorre de {inicio_existente.strftime('%H:%M')} às {fim_existente.strftime('%H:%M')}."
-                )
-        vagas_ocupadas = AulaAluno.objects.filter(aula=aula, status_presenca='AGENDADO').count()
-        
-        is_update_sem_mudanca_aula = self.instance and self.instance.aula == aula
-        
-        if not is_update_sem_mudanca_aula: 
-            if vagas_ocupadas >= aula.capacidade_maxima:
-                if attrs.get('entrar_lista_espera'):
-                    if ListaEspera.objects.filter(aula=aula, aluno=aluno).exists():
-                        raise ValidationError({"detail": f"O aluno {aluno} já está na lista de espera para esta aula."})
-                    
-                    ListaEspera.objects.create(aula=aula, aluno=aluno)
-                    attrs['_adicionado_lista_espera'] = True
-                    return attrs
-                else:
-                    raise ValidationError("Não há mais vagas disponíveis nesta aula. Para adicionar o aluno à lista de espera, envie 'entrar_lista_espera: true'.")
-
-        
-        if aula.tipo_aula == Aula.TipoAula.REGULAR:
-            credito_disponivel = CreditoAula.objects.filter(
-                aluno=aluno,
-                data_invalidacao__isnull=True, 
-                data_validade__gte=horario_inicio_desejado.date()
-            ).order_by('data_validade').first()
-
-            if not credito_disponivel:
-                 raise ValidationError("Aluno não possui créditos de aula disponíveis ou válidos para este agendamento.")
-            
-            attrs['credito_a_utilizar'] = credito_disponivel 
-
-        return attrs
-    
-    def create(self, validated_data):
-        validated_data.pop('entrar_lista_espera', None)
-        credito_a_utilizar = validated_data.pop('credito_a_utilizar', None)
-        agendamento = super().create(validated_data) # Cria o AulaAluno
-
-        if credito_a_utilizar:
-            credito_a_utilizar.data_invalidacao = timezone.now()
-            credito_a_utilizar.save()
-            agendamento.save()
-
-        return agendamento
-
-    def update(self, instance, validated_data):
-        validated_data.pop('credito_a_utilizar', None) 
-        return super().update(instance, validated_data)
-
 class ReposicaoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Reposicao
@@ -355,6 +501,32 @@ class ListaEsperaSerializer(serializers.ModelSerializer):
             'status'
         ]
 
+class PosicaoListaEsperaSerializer(ListaEsperaSerializer):
+    """
+    Posição do aluno logado em uma lista de espera, com a chance de promoção
+    estimada pelo histórico de cancelamentos do horário da aula.
+    """
+    aula_studio = serializers.StringRelatedField(source='aula.studio', read_only=True)
+    posicao = serializers.IntegerField(read_only=True)
+    total_na_fila = serializers.IntegerField(read_only=True)
+    media_cancelamentos = serializers.FloatField(read_only=True, allow_null=True)
+    probabilidade_promocao = serializers.FloatField(read_only=True, allow_null=True)
+
+    class Meta(ListaEsperaSerializer.Meta):
+        fields = [
+            'id',
+            'aula',
+            'aula_modalidade',
+            'aula_studio',
+            'aula_data_hora_inicio',
+            'data_inscricao',
+            'posicao',
+            'total_na_fila',
+            'media_cancelamentos',
+            'probabilidade_promocao',
+        ]
+
+
 class CreditoAulaSerializer(serializers.ModelSerializer):
     """
     Serializer para LEITURA (GET) dos créditos de aula do aluno (Tarefa da Issue #62).
@@ -386,6 +558,8 @@ class CreditoAulaSerializer(serializers.ModelSerializer):
             "id",
             "aluno",  
             "quantidade", 
+            "saldo",
+            "status",
             "data_validade",
             "matricula_id",      
             "plano_nome",
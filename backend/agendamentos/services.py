@@ -0,0 +1,1782 @@
+# agendamentos/services.py
+import hashlib
+import math
+import operator
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from functools import reduce
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (
+    Case, Count, DateTimeField, F, Max, OuterRef, PositiveBigIntegerField, Prefetch, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce, Concat, Greatest
+from rest_framework.exceptions import ValidationError
+
+from django.utils import timezone
+
+from notifications.models import Notification
+from usuarios.models import Usuario
+
+from .models import (
+    Aula,
+    AulaAluno,
+    AulaRecorrente,
+    BloqueioAgenda,
+    CreditoAula,
+    HorarioTrabalho,
+    ListaEspera,
+    Modalidade,
+    MovimentoCredito,
+    Reposicao,
+)
+
+
+def anotar_ocupacao(queryset):
+    """
+    Anota em um queryset de Aula a ocupação calculada na própria consulta:
+    - total_agendados: inscrições da aula (contador Aula.vagas_ocupadas);
+    - total_lista_espera: alunos AGUARDANDO na lista de espera;
+    - total_vagas_livres: capacidade restante (nunca negativa).
+
+    Evita um COUNT extra por aula ao serializar listagens.
+    """
+    return queryset.annotate(
+        total_agendados=F('vagas_ocupadas'),
+        total_lista_espera=Count(
+            'lista_espera',
+            filter=Q(lista_espera__status=ListaEspera.StatusEspera.AGUARDANDO),
+            distinct=True,
+        ),
+        # Greatest(...) - vagas evita subtração negativa em colunas UNSIGNED (MySQL).
+        total_vagas_livres=Greatest(F('capacidade_maxima'), F('vagas_ocupadas')) - F('vagas_ocupadas'),
+    )
+
+
+def aulas_para_leitura(queryset=None):
+    """
+    Retorna o queryset de Aula pronto para o AulaReadSerializer:
+    relacionamentos carregados via JOIN e ocupação anotada.
+    """
+    if queryset is None:
+        queryset = Aula.objects.all()
+    queryset = queryset.select_related(
+        'modalidade',
+        'studio',
+        'instrutor_principal__usuario',
+        'instrutor_substituto__usuario',
+    )
+    return anotar_ocupacao(queryset)
+
+
+def agendamentos_para_leitura(queryset):
+    """
+    Prepara um queryset de AulaAluno para o AgendamentoAlunoReadSerializer,
+    reaproveitando a ocupação anotada nas aulas aninhadas.
+    """
+    return queryset.select_related('aluno__usuario').prefetch_related(
+        'aluno__unidades',
+        Prefetch('aula', queryset=aulas_para_leitura()),
+    )
+
+
+def calcular_ocupacao(aula):
+    """
+    Retorna (agendados, lista_espera, vagas_livres) de uma aula.
+    Usa os valores anotados quando disponíveis; caso contrário,
+    calcula com uma única consulta agregada.
+    """
+    if hasattr(aula, 'total_agendados'):
+        return aula.total_agendados, aula.total_lista_espera, aula.total_vagas_livres
+
+    anotada = anotar_ocupacao(Aula.objects.filter(pk=aula.pk)).values(
+        'total_agendados', 'total_lista_espera', 'total_vagas_livres'
+    ).first() or {'total_agendados': 0, 'total_lista_espera': 0, 'total_vagas_livres': aula.capacidade_maxima}
+
+    aula.total_agendados = anotada['total_agendados']
+    aula.total_lista_espera = anotada['total_lista_espera']
+    aula.total_vagas_livres = anotada['total_vagas_livres']
+    return aula.total_agendados, aula.total_lista_espera, aula.total_vagas_livres
+
+
+# --- Filtros de período (sargáveis) ---
+
+def limites_do_periodo(data_inicio=None, data_fim=None):
+    """
+    Converte datas do calendário local em limites de datetime [inicio, fim),
+    no fuso do estúdio (settings.TIME_ZONE). Datas ausentes viram None.
+
+    Filtrar com `campo__gte=inicio, campo__lt=fim` compara a coluna
+    diretamente e permite o uso de índices, ao contrário de `campo__date`,
+    que envolve a coluna em uma conversão de fuso + DATE() no banco.
+    """
+    tz = timezone.get_current_timezone()
+    inicio = fim = None
+    if data_inicio is not None:
+        inicio = timezone.make_aware(datetime.combine(data_inicio, datetime.min.time()), tz)
+    if data_fim is not None:
+        fim = timezone.make_aware(datetime.combine(data_fim + timedelta(days=1), datetime.min.time()), tz)
+    return inicio, fim
+
+
+def filtrar_por_periodo(queryset, data_inicio=None, data_fim=None, campo='data_hora_inicio'):
+    """Filtra `campo` pelas datas locais informadas (ambas inclusivas)."""
+    inicio, fim = limites_do_periodo(data_inicio, data_fim)
+    if inicio is not None:
+        queryset = queryset.filter(**{f'{campo}__gte': inicio})
+    if fim is not None:
+        queryset = queryset.filter(**{f'{campo}__lt': fim})
+    return queryset
+
+
+# --- Busca de vagas disponíveis ---
+
+# Colunas da projeção compacta devolvida pela busca de vagas.
+CAMPOS_AULA_DISPONIVEL = (
+    'id', 'data_hora_inicio', 'data_hora_fim', 'duracao_minutos', 'tipo_aula',
+    'studio_id', 'studio_nome', 'modalidade_id', 'modalidade_nome',
+    'instrutor_nome', 'vagas_livres',
+)
+
+
+def buscar_aulas_disponiveis(data_inicio, data_fim, studios=None, modalidade=None,
+                             instrutor=None, hora_inicio=None, hora_fim=None):
+    """
+    Aulas futuras com vagas livres entre as datas informadas (inclusive),
+    já projetadas em dicionários com as colunas de CAMPOS_AULA_DISPONIVEL.
+
+    O período vira um intervalo de datetimes sobre data_hora_inicio, resolvido
+    pelo índice (studio, data_hora_inicio); a vaga livre é lida do contador
+    Aula.vagas_ocupadas, sem contar inscrições. Os filtros de horário do dia
+    (hora_inicio/hora_fim) usam o fuso local.
+    """
+    inicio, fim = limites_do_periodo(data_inicio, data_fim)
+    inicio = max(inicio, timezone.now())
+
+    queryset = Aula.objects.filter(
+        data_hora_inicio__gte=inicio,
+        data_hora_inicio__lt=fim,
+        vagas_ocupadas__lt=F('capacidade_maxima'),
+    )
+    if studios:
+        queryset = queryset.filter(studio_id__in=studios)
+    if modalidade:
+        queryset = queryset.filter(modalidade_id=modalidade)
+    if instrutor:
+        queryset = queryset.filter(Q(instrutor_principal_id=instrutor) | Q(instrutor_substituto_id=instrutor))
+    if hora_inicio:
+        queryset = queryset.filter(data_hora_inicio__time__gte=hora_inicio)
+    if hora_fim:
+        queryset = queryset.filter(data_hora_inicio__time__lte=hora_fim)
+
+    return queryset.annotate(
+        studio_nome=F('studio__nome'),
+        modalidade_nome=F('modalidade__nome'),
+        instrutor_nome=Concat(
+            'instrutor_principal__usuario__first_name',
+            Value(' '),
+            'instrutor_principal__usuario__last_name',
+        ),
+        vagas_livres=F('capacidade_maxima') - F('vagas_ocupadas'),
+    ).values(*CAMPOS_AULA_DISPONIVEL).order_by('data_hora_inicio', 'pk')
+
+
+# --- Calendário semanal (projeção colunar em cache) ---
+
+# Colunas da projeção do calendário, na ordem do values_list.
+CAMPOS_CALENDARIO = (
+    ('id', 'pk'),
+    ('inicio_minutos', 'data_hora_inicio'),
+    ('duracao_minutos', 'duracao_minutos'),
+    ('modalidade', 'modalidade_id'),
+    ('instrutor', 'instrutor_principal_id'),
+    ('instrutor_substituto', 'instrutor_substituto_id'),
+    ('capacidade', 'capacidade_maxima'),
+    ('vagas_ocupadas', 'vagas_ocupadas'),
+    ('tipo_aula', 'tipo_aula'),
+)
+
+# As escritas em Aula e AulaAluno invalidam o cache antes disso; o prazo
+# só limita por quanto tempo semanas que ninguém mais consulta ficam guardadas.
+CALENDARIO_CACHE_SEGUNDOS = 60 * 60
+
+
+def _chave_geracao_calendario(studio_id):
+    return f'calendario:geracao:{studio_id}'
+
+
+def invalidar_calendario(studios_ids):
+    """
+    Descarta o calendário em cache dos estúdios informados trocando a geração
+    que compõe as chaves (todas as semanas do estúdio de uma vez).
+
+    A troca é repetida após o commit: uma leitura concorrente feita durante a
+    transação poderia regravar em cache o estado anterior a ela.
+    """
+    chaves = [_chave_geracao_calendario(studio_id) for studio_id in set(studios_ids) if studio_id is not None]
+    if not chaves:
+        return
+
+    def _trocar_geracao():
+        cache.set_many({chave: time.time_ns() for chave in chaves}, timeout=None)
+
+    _trocar_geracao()
+    transaction.on_commit(_trocar_geracao)
+
+
+def invalidar_calendario_das_aulas(aulas_ids):
+    """Invalida o calendário dos estúdios das aulas informadas."""
+    invalidar_calendario(
+        Aula.objects.filter(pk__in=list(aulas_ids)).values_list('studio_id', flat=True).distinct()
+    )
+
+
+def montar_calendario_semanal(studio_id, ano, semana):
+    """
+    Projeção colunar das aulas de um estúdio em uma semana ISO.
+
+    Cada coluna de `aulas` é uma lista alinhada por posição. O início de cada
+    aula é dado em minutos desde `inicio` (segunda-feira 00:00, fuso local).
+    Os nomes de modalidades e instrutores vêm em tabelas de apoio indexadas
+    pelo ID. São feitas no máximo três consultas (aulas, modalidades e
+    usuários), sem objetos aninhados nem __str__ por linha.
+    """
+    segunda = date.fromisocalendar(ano, semana, 1)
+    inicio, fim = limites_do_periodo(segunda, segunda + timedelta(days=6))
+    linhas = (
+        Aula.objects.filter(studio_id=studio_id, data_hora_inicio__gte=inicio, data_hora_inicio__lt=fim)
+        .order_by('data_hora_inicio', 'pk')
+        .values_list(*(campo for _, campo in CAMPOS_CALENDARIO))
+    )
+    aulas = {nome: [] for nome, _ in CAMPOS_CALENDARIO}
+    colunas = [aulas[nome] for nome, _ in CAMPOS_CALENDARIO]
+    for linha in linhas:
+        for coluna, valor in zip(colunas, linha):
+            coluna.append(valor)
+    aulas['inicio_minutos'] = [
+        int((data_hora - inicio).total_seconds()) // 60 for data_hora in aulas['inicio_minutos']
+    ]
+
+    modalidades_ids = set(aulas['modalidade']) - {None}
+    instrutores_ids = (set(aulas['instrutor']) | set(aulas['instrutor_substituto'])) - {None}
+    modalidades = dict(
+        Modalidade.objects.filter(pk__in=modalidades_ids).values_list('pk', 'nome')
+    ) if modalidades_ids else {}
+    # Colaborador usa o usuário como chave primária: os nomes saem direto de Usuario.
+    instrutores = {
+        pk: f'{nome} {sobrenome}'.strip() or email
+        for pk, nome, sobrenome, email in Usuario.objects.filter(pk__in=instrutores_ids)
+        .values_list('pk', 'first_name', 'last_name', 'email')
+    } if instrutores_ids else {}
+
+    return {
+        'studio': studio_id,
+        'semana': f'{ano}-W{semana:02d}',
+        'inicio': inicio.isoformat(),
+        'aulas': aulas,
+        'modalidades': modalidades,
+        'instrutores': instrutores,
+    }
+
+
+def calendario_semanal(studio_id, ano, semana):
+    """Calendário da semana ISO do estúdio, servido do cache quando possível."""
+    geracao = cache.get_or_set(_chave_geracao_calendario(studio_id), time.time_ns, timeout=None)
+    return cache.get_or_set(
+        f'calendario:{studio_id}:{geracao}:{ano}-W{semana:02d}',
+        lambda: montar_calendario_semanal(studio_id, ano, semana),
+        timeout=CALENDARIO_CACHE_SEGUNDOS,
+    )
+
+
+# --- Feeds iCalendar (.ics) ---
+
+# Os feeds trazem as aulas a partir de N dias atrás e todas as futuras.
+FEED_ICS_DIAS_PASSADOS = 30
+
+
+def _inicio_janela_feed():
+    return timezone.now() - timedelta(days=FEED_ICS_DIAS_PASSADOS)
+
+
+def agendamentos_do_feed(usuario_id):
+    """Inscrições do aluno (Aluno usa o usuário como chave primária) na janela do feed."""
+    return AulaAluno.objects.filter(aluno_id=usuario_id, data_hora_inicio__gte=_inicio_janela_feed())
+
+
+def aulas_do_feed_instrutor(usuario_id):
+    """Aulas em que o colaborador é instrutor principal ou substituto, na janela do feed."""
+    return Aula.objects.filter(
+        Q(instrutor_principal_id=usuario_id) | Q(instrutor_substituto_id=usuario_id),
+        data_hora_inicio__gte=_inicio_janela_feed(),
+    )
+
+
+def validadores_feed(queryset, campo_modificacao):
+    """
+    Calcula (ETag, Last-Modified) de um feed com uma única consulta agregada,
+    sem montar o conteúdo.
+
+    Quantidade e maior ID mudam sempre que uma linha entra ou sai do feed
+    (IDs só crescem); a maior data de modificação das aulas cobre edições.
+    A data do dia entra no ETag porque a janela do feed avança sozinha.
+    O Last-Modified não enxerga remoções: o ETag é o validador confiável.
+    """
+    agregado = queryset.aggregate(total=Count('pk'), ultimo=Max('pk'), modificado=Max(campo_modificacao))
+    assinatura = f"{timezone.localdate()}:{agregado['total']}:{agregado['ultimo']}:{agregado['modificado']}"
+    etag = '"%s"' % hashlib.md5(assinatura.encode()).hexdigest()
+    return etag, agregado['modificado']
+
+
+def _ics_texto(valor):
+    """Escapa um valor TEXT do iCalendar (RFC 5545, 3.3.11)."""
+    return str(valor).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _ics_resumo(modalidade, studio):
+    return f'{modalidade or "Aula"} - {studio}' if studio else modalidade or 'Aula'
+
+
+def _ics_data_hora(valor):
+    return valor.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _ics_linha(linha):
+    """Termina a linha em CRLF, dobrando-a a cada 75 octetos (RFC 5545, 3.1)."""
+    partes, atual, tamanho = [], '', 0
+    for caractere in linha:
+        octetos = len(caractere.encode('utf-8'))
+        if tamanho + octetos > 75:
+            partes.append(atual)
+            atual, tamanho = ' ', 1
+        atual += caractere
+        tamanho += octetos
+    partes.append(atual)
+    return '\r\n'.join(partes) + '\r\n'
+
+
+def _ics_evento(uid, inicio, fim, resumo, local, carimbo):
+    linhas = [
+        'BEGIN:VEVENT',
+        f'UID:{uid}',
+        f'DTSTAMP:{carimbo}',
+        f'DTSTART:{_ics_data_hora(inicio)}',
+        f'DTEND:{_ics_data_hora(fim)}',
+        f'SUMMARY:{_ics_texto(resumo)}',
+    ]
+    if local:
+        linhas.append(f'LOCATION:{_ics_texto(local)}')
+    linhas.append('END:VEVENT')
+    return ''.join(_ics_linha(linha) for linha in linhas)
+
+
+def _gerar_ics(nome, eventos):
+    """Itera o VCALENDAR em blocos de texto: cabeçalho, um VEVENT por vez e rodapé."""
+    yield ''.join(_ics_linha(linha) for linha in (
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Studio Pilates//Agenda de Aulas//PT-BR',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_ics_texto(nome)}',
+    ))
+    yield from eventos
+    yield _ics_linha('END:VCALENDAR')
+
+
+def feed_ics_agendamentos(queryset, dominio):
+    """
+    Gera o .ics das inscrições de um aluno a partir de linhas de values(),
+    lidas do banco em blocos pelo iterator(), sem instanciar modelos.
+    """
+    carimbo = _ics_data_hora(timezone.now())
+    linhas = queryset.order_by('data_hora_inicio', 'pk').values_list(
+        'pk', 'aula__data_hora_inicio', 'aula__data_hora_fim', 'aula__duracao_minutos',
+        'aula__modalidade__nome', 'aula__studio__nome', 'aula__studio__endereco',
+    ).iterator(chunk_size=500)
+    eventos = (
+        _ics_evento(
+            uid=f'agendamento-{pk}@{dominio}',
+            inicio=inicio,
+            fim=fim or inicio + timedelta(minutes=duracao),
+            resumo=_ics_resumo(modalidade, studio),
+            local=endereco or studio,
+            carimbo=carimbo,
+        )
+        for pk, inicio, fim, duracao, modalidade, studio, endereco in linhas
+    )
+    return _gerar_ics('Minhas aulas', eventos)
+
+
+def feed_ics_instrutor(queryset, usuario_id, dominio):
+    """Gera o .ics das aulas de um instrutor; substituições são indicadas no título."""
+    carimbo = _ics_data_hora(timezone.now())
+    linhas = queryset.order_by('data_hora_inicio', 'pk').values_list(
+        'pk', 'data_hora_inicio', 'data_hora_fim', 'duracao_minutos', 'instrutor_principal_id',
+        'modalidade__nome', 'studio__nome', 'studio__endereco',
+    ).iterator(chunk_size=500)
+    eventos = (
+        _ics_evento(
+            uid=f'aula-{pk}@{dominio}',
+            inicio=inicio,
+            fim=fim or inicio + timedelta(minutes=duracao),
+            resumo=_ics_resumo(modalidade, studio) + ('' if principal_id == usuario_id else ' (substituição)'),
+            local=endereco or studio,
+            carimbo=carimbo,
+        )
+        for pk, inicio, fim, duracao, principal_id, modalidade, studio, endereco in linhas
+    )
+    return _gerar_ics('Aulas que ministro', eventos)
+
+
+# --- Contador de vagas (Aula.vagas_ocupadas) ---
+
+def incrementar_vagas(aula_id, quantidade=1):
+    """Soma `quantidade` ao contador de vagas ocupadas com um UPDATE atômico."""
+    Aula.objects.filter(pk=aula_id).update(vagas_ocupadas=F('vagas_ocupadas') + quantidade)
+
+
+def decrementar_vagas(aula_id, quantidade=1, cancelamento=False):
+    """
+    Subtrai `quantidade` do contador de vagas ocupadas, sem deixá-lo negativo.
+    Com `cancelamento`, conta as vagas liberadas em Aula.cancelamentos no mesmo UPDATE.
+    """
+    campos = {'vagas_ocupadas': Greatest(F('vagas_ocupadas'), Value(quantidade)) - quantidade}
+    if cancelamento:
+        campos['cancelamentos'] = F('cancelamentos') + quantidade
+    Aula.objects.filter(pk=aula_id, vagas_ocupadas__gt=0).update(**campos)
+
+
+def bloquear_aula(aula_id):
+    """
+    Trava a linha da aula (SELECT ... FOR UPDATE) até o fim da transação
+    e retorna a instância com o contador atualizado.
+    """
+    return Aula.objects.select_for_update().get(pk=aula_id)
+
+
+def reservar_vaga(aula_id):
+    """
+    Trava a aula e garante que ainda existe vaga livre.
+    Deve ser chamada dentro de transaction.atomic, antes de criar o AulaAluno:
+    o contador é incrementado pelo signal de criação enquanto a trava é mantida,
+    o que impede que duas inscrições concorrentes ocupem a mesma vaga.
+    """
+    aula = bloquear_aula(aula_id)
+    if aula.vagas_ocupadas >= aula.capacidade_maxima:
+        raise ValidationError({"detail": "Não há mais vagas disponíveis nesta aula."})
+    return aula
+
+
+def entrar_lista_espera(aula_id, aluno):
+    """
+    Inscreve o aluno na lista de espera de uma aula cheia, com a aula travada
+    como em reservar_vaga. O get_or_create torna a chamada segura para
+    repetições concorrentes da mesma requisição (unique_together aula, aluno).
+    Retorna (entrada, criada).
+    """
+    with transaction.atomic():
+        bloquear_aula(aula_id)
+        return ListaEspera.objects.get_or_create(aula_id=aula_id, aluno=aluno)
+
+
+def reconciliar_vagas(queryset=None):
+    """
+    Reconstrói Aula.vagas_ocupadas a partir das linhas de AulaAluno.
+    Atualiza apenas as aulas divergentes e retorna quantas foram corrigidas.
+    """
+    if queryset is None:
+        queryset = Aula.objects.all()
+
+    contagem = (
+        AulaAluno.objects.filter(aula=OuterRef('pk'))
+        .order_by()
+        .values('aula')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    divergentes = (
+        queryset.order_by()
+        .annotate(total_real=Coalesce(Subquery(contagem), 0))
+        .exclude(vagas_ocupadas=F('total_real'))
+        .values_list('pk', flat=True)
+    )
+    ids = list(divergentes)
+    if ids:
+        Aula.objects.filter(pk__in=ids).update(vagas_ocupadas=Coalesce(Subquery(contagem), 0))
+        invalidar_calendario_das_aulas(ids)
+    return len(ids)
+
+
+# --- Expediente dos estúdios (cache em memória) ---
+
+# Cada processo guarda o expediente dos estúdios já consultados. Os signals de
+# HorarioTrabalho e BloqueioAgenda invalidam a entrada no processo que fez a
+# alteração; o prazo limita por quanto tempo os demais processos a enxergam.
+EXPEDIENTE_CACHE_SEGUNDOS = 300
+
+_EXPEDIENTES = {}
+
+
+class ExpedienteStudio:
+    """
+    Janela de funcionamento por dia da semana ({dia_semana: (hora_inicio,
+    hora_fim)}) e conjunto de datas bloqueadas de um estúdio.
+    """
+
+    __slots__ = ('janelas', 'bloqueios', 'carregado_em')
+
+    def __init__(self, janelas, bloqueios):
+        self.janelas = janelas
+        self.bloqueios = bloqueios
+        self.carregado_em = time.monotonic()
+
+    def bloqueado(self, dia):
+        return dia in self.bloqueios
+
+    def dentro_do_horario(self, inicio, fim):
+        """Se [inicio, fim) (no fuso local) cabe inteiro na janela do dia da semana."""
+        janela = self.janelas.get(inicio.weekday())
+        return janela is not None and fim.date() == inicio.date() and janela[0] <= inicio.time() and fim.time() <= janela[1]
+
+    def motivo_recusa(self, inicio, fim):
+        """
+        Motivo pelo qual uma aula em [inicio, fim) não pode acontecer, ou None.
+        Estúdios sem nenhum HorarioTrabalho cadastrado não restringem o horário,
+        apenas as datas bloqueadas.
+        """
+        inicio, fim = timezone.localtime(inicio), timezone.localtime(fim)
+        if self.bloqueado(inicio.date()):
+            return "A agenda do estúdio está bloqueada nesta data."
+        if self.janelas and not self.dentro_do_horario(inicio, fim):
+            return "A aula está fora do horário de funcionamento do estúdio."
+        return None
+
+
+def carregar_expedientes(studios_ids):
+    """
+    Retorna {studio_id: ExpedienteStudio}. Estúdios fora do cache (ou com a
+    entrada vencida) são lidos juntos, com uma consulta por tabela.
+    """
+    agora = time.monotonic()
+    expedientes, faltantes = {}, []
+    for studio_id in set(studios_ids):
+        expediente = _EXPEDIENTES.get(studio_id)
+        if expediente is not None and agora - expediente.carregado_em < EXPEDIENTE_CACHE_SEGUNDOS:
+            expedientes[studio_id] = expediente
+        else:
+            faltantes.append(studio_id)
+
+    if faltantes:
+        janelas, bloqueios = defaultdict(dict), defaultdict(set)
+        for studio_id, dia_semana, hora_inicio, hora_fim in HorarioTrabalho.objects.filter(
+            studio_id__in=faltantes
+        ).values_list('studio_id', 'dia_semana', 'hora_inicio', 'hora_fim'):
+            janelas[studio_id][dia_semana] = (hora_inicio, hora_fim)
+        for studio_id, data in BloqueioAgenda.objects.filter(studio_id__in=faltantes).values_list('studio_id', 'data'):
+            bloqueios[studio_id].add(data)
+        for studio_id in faltantes:
+            expedientes[studio_id] = _EXPEDIENTES[studio_id] = ExpedienteStudio(
+                janelas.get(studio_id, {}), bloqueios.get(studio_id, set())
+            )
+    return expedientes
+
+
+def expediente_do_studio(studio_id):
+    return carregar_expedientes([studio_id])[studio_id]
+
+
+def invalidar_expediente(studio_id):
+    """Descarta o expediente em cache do estúdio, agora e após o commit."""
+    _EXPEDIENTES.pop(studio_id, None)
+    transaction.on_commit(lambda: _EXPEDIENTES.pop(studio_id, None))
+
+
+def limpar_expedientes():
+    _EXPEDIENTES.clear()
+
+
+def motivo_fora_do_expediente(studio_id, inicio, fim):
+    """Valida uma aula contra o expediente do estúdio; retorna o motivo da recusa ou None."""
+    if studio_id is None:
+        return None
+    return expediente_do_studio(studio_id).motivo_recusa(inicio, fim)
+
+
+def aulas_no_expediente(linhas):
+    """
+    Filtra linhas de values() com studio_id, data_hora_inicio e data_hora_fim,
+    descartando as aulas fora do expediente do estúdio.
+    """
+    for linha in linhas:
+        if not motivo_fora_do_expediente(linha['studio_id'], linha['data_hora_inicio'], linha['data_hora_fim']):
+            yield linha
+
+
+# --- Detecção de conflitos de horário (alunos) ---
+
+def intervalo_da_aula(aula):
+    """Retorna (inicio, fim) da aula, usando o fim armazenado quando existir."""
+    return aula.data_hora_inicio, aula.data_hora_fim or aula.calcular_data_hora_fim()
+
+
+def agendamentos_sobrepostos(inicio, fim, alunos_ids):
+    """
+    Queryset dos agendamentos AGENDADO dos alunos informados que se sobrepõem
+    ao intervalo [inicio, fim). O teste de sobreposição é feito no banco sobre
+    o índice (aluno, data_hora_fim, data_hora_inicio), limitado à janela da aula.
+    """
+    return AulaAluno.objects.filter(
+        aluno_id__in=alunos_ids,
+        status_presenca=AulaAluno.StatusPresenca.AGENDADO,
+        data_hora_fim__gt=inicio,
+        data_hora_inicio__lt=fim,
+    )
+
+
+def buscar_conflito_aluno(aluno, aula, excluir_agendamento=None):
+    """
+    Retorna o primeiro agendamento do aluno que conflita com a aula, ou None.
+    """
+    inicio, fim = intervalo_da_aula(aula)
+    conflitos = agendamentos_sobrepostos(inicio, fim, [aluno.pk]).exclude(aula_id=aula.pk)
+    if excluir_agendamento is not None:
+        conflitos = conflitos.exclude(pk=excluir_agendamento.pk)
+    return conflitos.select_related('aula__modalidade', 'aula__studio').order_by('data_hora_inicio').first()
+
+
+def alunos_em_conflito(aula, alunos_ids):
+    """
+    Modo em lote: verifica uma aula contra N alunos em uma única consulta.
+    Retorna o conjunto de IDs de alunos que já têm uma aula sobreposta.
+    """
+    alunos_ids = list(alunos_ids)
+    if not alunos_ids:
+        return set()
+    inicio, fim = intervalo_da_aula(aula)
+    return set(
+        agendamentos_sobrepostos(inicio, fim, alunos_ids)
+        .exclude(aula_id=aula.pk)
+        .values_list('aluno_id', flat=True)
+        .distinct()
+    )
+
+
+def mensagem_conflito(conflito, sujeito="Você já está"):
+    """Monta a mensagem de erro padrão de conflito de agendamento."""
+    return (
+        f"Conflito de agendamento. {sujeito} inscrito na aula '{conflito.aula}' que ocorre de "
+        f"{conflito.data_hora_inicio.strftime('%H:%M')} às {conflito.data_hora_fim.strftime('%H:%M')}."
+    )
+
+
+# --- Detecção de conflitos de horário (instrutores) ---
+
+def instrutores_da_aula(aula):
+    """IDs dos instrutores (principal e substituto) escalados na aula."""
+    return {i for i in (aula.instrutor_principal_id, aula.instrutor_substituto_id) if i is not None}
+
+
+def aulas_sobrepostas_instrutores(inicio, fim, instrutores_ids):
+    """
+    Queryset das aulas, em qualquer estúdio, em que algum dos instrutores
+    atua (como principal ou substituto) e que se sobrepõem a [inicio, fim).
+    Cada lado do OR usa seu índice (instrutor, data_hora_fim, data_hora_inicio),
+    limitado às aulas que terminam depois do início do intervalo.
+    """
+    instrutores_ids = list(instrutores_ids)
+    return Aula.objects.filter(
+        Q(instrutor_principal_id__in=instrutores_ids) | Q(instrutor_substituto_id__in=instrutores_ids),
+        data_hora_fim__gt=inicio,
+        data_hora_inicio__lt=fim,
+    )
+
+
+def buscar_conflito_instrutor(aula):
+    """Retorna a primeira aula que ocupa algum instrutor da aula no mesmo horário, ou None."""
+    instrutores = instrutores_da_aula(aula)
+    if not instrutores:
+        return None
+    inicio, fim = intervalo_da_aula(aula)
+    conflitos = aulas_sobrepostas_instrutores(inicio, fim, instrutores)
+    if aula.pk is not None:
+        conflitos = conflitos.exclude(pk=aula.pk)
+    return conflitos.select_related('modalidade', 'studio').order_by('data_hora_inicio').first()
+
+
+def mensagem_conflito_instrutor(conflito):
+    inicio = timezone.localtime(conflito.data_hora_inicio)
+    fim = timezone.localtime(conflito.data_hora_fim)
+    return (
+        f"Conflito de horário do instrutor, que já está escalado na aula '{conflito}' que ocorre de "
+        f"{inicio.strftime('%H:%M')} às {fim.strftime('%H:%M')}."
+    )
+
+
+def aulas_com_conflito_de_instrutor(aulas):
+    """
+    Modo em lote: verifica várias aulas novas (ex.: uma semana gerada) contra
+    todas as aulas já existentes dos seus instrutores com uma única consulta,
+    que cobre a janela inteira do lote; a sobreposição é testada em memória.
+
+    As aulas do lote também são comparadas entre si, em ordem cronológica: a
+    primeira a ocupar o instrutor fica com o horário. Retorna a lista das
+    aulas recusadas.
+    """
+    aulas = sorted(aulas, key=lambda aula: intervalo_da_aula(aula)[0])
+    todos_instrutores = set().union(*(instrutores_da_aula(aula) for aula in aulas)) if aulas else set()
+    if not todos_instrutores:
+        return []
+
+    inicio_lote = min(intervalo_da_aula(aula)[0] for aula in aulas)
+    fim_lote = max(intervalo_da_aula(aula)[1] for aula in aulas)
+    ocupados = defaultdict(list)
+    existentes = (
+        aulas_sobrepostas_instrutores(inicio_lote, fim_lote, todos_instrutores)
+        .exclude(pk__in=[aula.pk for aula in aulas if aula.pk is not None])
+        .values_list('instrutor_principal_id', 'instrutor_substituto_id', 'data_hora_inicio', 'data_hora_fim')
+    )
+    for principal_id, substituto_id, inicio, fim in existentes:
+        for instrutor_id in {principal_id, substituto_id} & todos_instrutores:
+            ocupados[instrutor_id].append((inicio, fim))
+
+    recusadas = []
+    for aula in aulas:
+        inicio, fim = intervalo_da_aula(aula)
+        instrutores = instrutores_da_aula(aula)
+        if any(
+            outro_fim > inicio and outro_inicio < fim
+            for instrutor_id in instrutores
+            for outro_inicio, outro_fim in ocupados[instrutor_id]
+        ):
+            recusadas.append(aula)
+            continue
+        for instrutor_id in instrutores:
+            ocupados[instrutor_id].append((inicio, fim))
+    return recusadas
+
+
+# --- Gerador de aulas recorrentes ---
+
+def gerar_aulas_recorrentes(data_inicio, data_fim, recorrencias=None):
+    """
+    Expande as aulas recorrentes (AulaRecorrente) em instâncias de Aula para
+    as datas entre data_inicio e data_fim (inclusive), com bulk_create.
+
+    - Ignora dias sem HorarioTrabalho no estúdio ou fora da janela de funcionamento;
+    - Ignora datas com BloqueioAgenda;
+    - Ignora aulas cujo instrutor já está em outra aula no mesmo horário
+      (verificadas em lote, com uma consulta para o período inteiro);
+    - É idempotente: aulas já geradas para a mesma recorrência e horário são puladas.
+
+    Retorna um dicionário com as estatísticas da execução.
+    """
+    if recorrencias is None:
+        recorrencias = AulaRecorrente.objects.filter(ativa=True)
+    recorrencias = list(recorrencias)
+
+    estatisticas = {'criadas': 0, 'existentes': 0, 'fora_do_horario': 0, 'bloqueadas': 0, 'conflito_instrutor': 0}
+    if not recorrencias or data_fim < data_inicio:
+        return estatisticas
+
+    expedientes = carregar_expedientes({r.studio_id for r in recorrencias})
+
+    fuso = timezone.get_current_timezone()
+    inicio_periodo = timezone.make_aware(datetime.combine(data_inicio, datetime.min.time()), fuso)
+    fim_periodo = timezone.make_aware(datetime.combine(data_fim + timedelta(days=1), datetime.min.time()), fuso)
+    existentes = set(
+        Aula.objects.filter(
+            recorrencia__in=recorrencias,
+            data_hora_inicio__gte=inicio_periodo,
+            data_hora_inicio__lt=fim_periodo,
+        ).values_list('recorrencia_id', 'data_hora_inicio')
+    )
+
+    por_dia_semana = defaultdict(list)
+    for recorrencia in recorrencias:
+        por_dia_semana[recorrencia.dia_semana].append(recorrencia)
+
+    novas_aulas = []
+    dia = data_inicio
+    while dia <= data_fim:
+        for recorrencia in por_dia_semana.get(dia.weekday(), []):
+            expediente = expedientes[recorrencia.studio_id]
+            if expediente.bloqueado(dia):
+                estatisticas['bloqueadas'] += 1
+                continue
+
+            inicio = timezone.make_aware(datetime.combine(dia, recorrencia.horario), fuso)
+            fim = inicio + timedelta(minutes=recorrencia.duracao_minutos)
+            # A grade recorrente exige horário cadastrado para o dia, ao contrário das aulas avulsas.
+            if not expediente.dentro_do_horario(inicio, fim):
+                estatisticas['fora_do_horario'] += 1
+                continue
+
+            if (recorrencia.pk, inicio) in existentes:
+                estatisticas['existentes'] += 1
+                continue
+
+            novas_aulas.append(Aula(
+                studio_id=recorrencia.studio_id,
+                modalidade_id=recorrencia.modalidade_id,
+                instrutor_principal_id=recorrencia.instrutor_principal_id,
+                instrutor_substituto_id=recorrencia.instrutor_substituto_id,
+                data_hora_inicio=inicio,
+                data_hora_fim=fim,  # bulk_create não chama Aula.save()
+                duracao_minutos=recorrencia.duracao_minutos,
+                capacidade_maxima=recorrencia.capacidade_maxima,
+                tipo_aula=recorrencia.tipo_aula,
+                recorrencia=recorrencia,
+            ))
+        dia += timedelta(days=1)
+
+    recusadas = aulas_com_conflito_de_instrutor(novas_aulas)
+    if recusadas:
+        estatisticas['conflito_instrutor'] = len(recusadas)
+        recusadas = set(map(id, recusadas))
+        novas_aulas = [aula for aula in novas_aulas if id(aula) not in recusadas]
+
+    with transaction.atomic():
+        # ignore_conflicts protege contra execuções concorrentes (constraint única).
+        Aula.objects.bulk_create(novas_aulas, batch_size=500, ignore_conflicts=True)
+        # bulk_create não dispara o post_save que invalida o calendário.
+        invalidar_calendario({aula.studio_id for aula in novas_aulas})
+    estatisticas['criadas'] = len(novas_aulas)
+    return estatisticas
+
+
+# --- Créditos de aula (livro-razão) ---
+
+def filtro_creditos_validos(data_referencia):
+    """
+    Lotes DISPONIVEL e ainda válidos em `data_referencia`, resolvidos pelo
+    índice (aluno, status, data_validade): igualdade em aluno e status e
+    intervalo na validade. A validade continua no filtro porque os lotes
+    vencidos só passam a EXPIRADA na varredura diária (expirar_creditos).
+    """
+    return Q(status=CreditoAula.StatusCredito.DISPONIVEL, data_validade__gte=data_referencia)
+
+
+def buscar_credito_disponivel(aluno, data_referencia):
+    """
+    Retorna o lote com saldo do aluno que vence primeiro, ou None.
+    Uma única consulta, resolvida pelo índice (aluno, status, data_validade).
+    """
+    return (
+        CreditoAula.objects.filter(filtro_creditos_validos(data_referencia), aluno=aluno)
+        .order_by('data_validade', 'pk')
+        .first()
+    )
+
+
+def _decremento_saldo():
+    # A ordem das chaves importa: o MySQL aplica as atribuições do UPDATE da
+    # esquerda para a direita, então data_invalidacao precisa ler o saldo antes
+    # do decremento. O lote é marcado como invalidado e UTILIZADA quando o saldo
+    # se esgota. Só vale para lotes DISPONIVEL (o default apaga a data).
+    return {
+        'data_invalidacao': Case(
+            When(saldo=1, then=Value(timezone.now())),
+            default=Value(None),
+            output_field=DateTimeField(),
+        ),
+        'status': Case(
+            When(saldo=1, then=Value(CreditoAula.StatusCredito.UTILIZADA)),
+            default=F('status'),
+        ),
+        'saldo': F('saldo') - 1,
+    }
+
+
+def consumir_credito(credito, agendamento=None, usuario=None):
+    """
+    Debita um crédito do lote com um UPDATE atômico condicionado ao saldo e
+    registra o consumo no livro-razão. Deve rodar dentro da transação do
+    agendamento: se outro agendamento esgotou o lote antes, levanta
+    ValidationError e a transação é desfeita.
+    """
+    debitado = CreditoAula.objects.filter(
+        pk=credito.pk, saldo__gte=1, status=CreditoAula.StatusCredito.DISPONIVEL
+    ).update(**_decremento_saldo())
+    if not debitado:
+        raise ValidationError({"detail": "O crédito selecionado não possui mais saldo disponível. Tente novamente."})
+
+    MovimentoCredito.objects.create(
+        credito_id=credito.pk,
+        aluno_id=credito.aluno_id,
+        tipo=MovimentoCredito.Tipo.CONSUMO,
+        quantidade=-1,
+        agendamento=agendamento,
+        registrado_por=usuario,
+    )
+
+
+def consumir_creditos_em_lote(agendamentos):
+    """
+    Versão em lote de `consumir_credito` para agendamentos criados com
+    bulk_create. Agendamentos que usam o mesmo lote debitam juntos: cada lote
+    perde, em um único UPDATE (CASE por lote), tantos créditos quantos
+    agendamentos o usaram, com a mesma guarda de saldo e invalidação de
+    consumir_credito. Se algum lote não cobrir o débito, levanta
+    ValidationError e a transação é desfeita.
+    """
+    agendamentos = [agendamento for agendamento in agendamentos if agendamento.credito_utilizado_id]
+    if not agendamentos:
+        return
+    por_lote = Counter(agendamento.credito_utilizado_id for agendamento in agendamentos)
+    agora = timezone.now()
+    debitados = CreditoAula.objects.filter(
+        reduce(operator.or_, (Q(pk=pk, saldo__gte=quantidade) for pk, quantidade in por_lote.items())),
+        status=CreditoAula.StatusCredito.DISPONIVEL,
+    ).update(
+        # Mesma ordem de _decremento_saldo: data_invalidacao e status leem o saldo anterior.
+        data_invalidacao=Case(
+            *(When(pk=pk, saldo=quantidade, then=Value(agora)) for pk, quantidade in por_lote.items()),
+            default=Value(None),
+            output_field=DateTimeField(),
+        ),
+        status=Case(
+            *(
+                When(pk=pk, saldo=quantidade, then=Value(CreditoAula.StatusCredito.UTILIZADA))
+                for pk, quantidade in por_lote.items()
+            ),
+            default=F('status'),
+        ),
+        saldo=Case(
+            *(When(pk=pk, then=F('saldo') - quantidade) for pk, quantidade in por_lote.items()),
+            default=F('saldo'),
+            output_field=PositiveBigIntegerField(),
+        ),
+    )
+    if debitados != len(por_lote):
+        raise ValidationError({"detail": "O crédito selecionado não possui mais saldo disponível. Tente novamente."})
+    MovimentoCredito.objects.bulk_create(
+        MovimentoCredito(
+            credito_id=agendamento.credito_utilizado_id,
+            aluno_id=agendamento.aluno_id,
+            tipo=MovimentoCredito.Tipo.CONSUMO,
+            quantidade=-1,
+            agendamento_id=agendamento.pk,
+        )
+        for agendamento in agendamentos
+    )
+
+
+def estornar_credito(credito_id, aluno_id, usuario=None):
+    """
+    Devolve um crédito ao lote (cancelamento de agendamento) e registra o
+    estorno. O saldo nunca ultrapassa a quantidade concedida.
+    """
+    estornado = CreditoAula.objects.filter(pk=credito_id, saldo__lt=F('quantidade')).update(
+        data_invalidacao=None,
+        invalidado_por=None,
+        status=CreditoAula.StatusCredito.DISPONIVEL,
+        saldo=F('saldo') + 1,
+    )
+    if estornado:
+        MovimentoCredito.objects.create(
+            credito_id=credito_id,
+            aluno_id=aluno_id,
+            tipo=MovimentoCredito.Tipo.ESTORNO,
+            quantidade=1,
+            registrado_por=usuario,
+        )
+
+
+def estornar_creditos_em_lote(agendamentos, usuario=None):
+    """
+    Estorna os créditos de vários agendamentos cancelados de uma vez.
+
+    `agendamentos` é uma lista de (agendamento_id, aluno_id, credito_id). Os
+    lotes são travados e lidos juntos, o novo saldo de cada um é gravado com
+    um único UPDATE (CASE por lote) e os estornos entram no livro-razão com
+    bulk_create. Como em estornar_credito, o saldo nunca passa da quantidade
+    concedida. Retorna quantos créditos foram devolvidos.
+    """
+    por_lote = Counter(credito_id for _, _, credito_id in agendamentos if credito_id)
+    if not por_lote:
+        return 0
+    lotes = {
+        pk: (saldo, quantidade)
+        for pk, saldo, quantidade in CreditoAula.objects.select_for_update()
+        .filter(pk__in=list(por_lote))
+        .values_list('pk', 'saldo', 'quantidade')
+    }
+    devolvidos = {
+        pk: min(por_lote[pk], quantidade - saldo)
+        for pk, (saldo, quantidade) in lotes.items()
+        if saldo < quantidade
+    }
+    if not devolvidos:
+        return 0
+
+    CreditoAula.objects.filter(pk__in=list(devolvidos)).update(
+        data_invalidacao=None,
+        invalidado_por=None,
+        status=CreditoAula.StatusCredito.DISPONIVEL,
+        saldo=Case(*(When(pk=pk, then=Value(lotes[pk][0] + n)) for pk, n in devolvidos.items())),
+    )
+    restantes = dict(devolvidos)
+    movimentos = []
+    for _, aluno_id, credito_id in agendamentos:
+        if restantes.get(credito_id):
+            restantes[credito_id] -= 1
+            movimentos.append(MovimentoCredito(
+                credito_id=credito_id,
+                aluno_id=aluno_id,
+                tipo=MovimentoCredito.Tipo.ESTORNO,
+                quantidade=1,
+                registrado_por=usuario,
+            ))
+    MovimentoCredito.objects.bulk_create(movimentos)
+    return len(movimentos)
+
+
+def invalidar_credito(credito_id, usuario=None):
+    """Zera o saldo de um lote, registrando a expiração do que restava."""
+    with transaction.atomic():
+        credito = CreditoAula.objects.select_for_update().get(pk=credito_id)
+        if credito.saldo:
+            MovimentoCredito.objects.create(
+                credito=credito,
+                aluno_id=credito.aluno_id,
+                tipo=MovimentoCredito.Tipo.EXPIRACAO,
+                quantidade=-credito.saldo,
+                registrado_por=usuario,
+            )
+        credito.saldo = 0
+        credito.status = CreditoAula.StatusCredito.EXPIRADA
+        credito.data_invalidacao = timezone.now()
+        credito.invalidado_por = usuario
+        credito.save(update_fields=['saldo', 'status', 'data_invalidacao', 'invalidado_por'])
+    return credito
+
+
+def saldo_creditos(aluno, data_referencia=None):
+    """
+    Saldo disponível do aluno, total e agrupado por data de validade,
+    somando o saldo em cache dos lotes (sem percorrer o livro-razão).
+    """
+    data_referencia = data_referencia or timezone.localdate()
+    por_validade = list(
+        CreditoAula.objects.filter(filtro_creditos_validos(data_referencia), aluno=aluno)
+        .values('data_validade')
+        .annotate(saldo_total=Sum('saldo'))
+        .order_by('data_validade')
+    )
+    return {
+        'total': sum(grupo['saldo_total'] for grupo in por_validade),
+        'por_validade': [
+            {'data_validade': grupo['data_validade'], 'saldo': grupo['saldo_total']}
+            for grupo in por_validade
+        ],
+    }
+
+
+# --- Chamada (presença em lote) ---
+
+# Validade, em dias a partir da data da aula, do crédito de reposição
+# concedido por uma falta com reposição (AUSENTE_COM_REPO).
+VALIDADE_REPOSICAO_DIAS = 30
+
+
+def conceder_reposicoes(agendamentos, usuario=None):
+    """
+    Concede um crédito de reposição (lote de 1 crédito ligado ao agendamento
+    de origem) para cada agendamento informado que ainda não tenha um.
+    Usa bulk_create, então o saldo e a concessão no livro-razão são gravados
+    aqui, já que o save() e o post_save não são disparados.
+    """
+    ids = [agendamento.pk for agendamento in agendamentos]
+    if not ids:
+        return 0
+    # Reposições revogadas (EXPIRADA) não contam: a falta pode voltar a ter reposição.
+    ja_concedidos = set(
+        CreditoAula.objects.filter(agendamento_origem_id__in=ids)
+        .exclude(status=CreditoAula.StatusCredito.EXPIRADA)
+        .values_list('agendamento_origem_id', flat=True)
+    )
+    lotes = [
+        CreditoAula(
+            aluno_id=agendamento.aluno_id,
+            quantidade=1,
+            saldo=1,
+            agendamento_origem_id=agendamento.pk,
+            adicionado_por=usuario,
+            data_validade=(
+                timezone.localtime(agendamento.data_hora_inicio).date()
+                + timedelta(days=VALIDADE_REPOSICAO_DIAS)
+            ),
+        )
+        for agendamento in agendamentos
+        if agendamento.pk not in ja_concedidos
+    ]
+    if not lotes:
+        return 0
+    CreditoAula.objects.bulk_create(lotes)
+    novos = CreditoAula.objects.filter(
+        agendamento_origem_id__in=[lote.agendamento_origem_id for lote in lotes],
+        status=CreditoAula.StatusCredito.DISPONIVEL,
+    ).values_list('pk', 'aluno_id')
+    MovimentoCredito.objects.bulk_create(
+        MovimentoCredito(
+            credito_id=credito_id,
+            aluno_id=aluno_id,
+            tipo=MovimentoCredito.Tipo.CONCESSAO,
+            quantidade=1,
+            registrado_por=usuario,
+        )
+        for credito_id, aluno_id in novos
+    )
+    return len(lotes)
+
+
+def revogar_reposicoes(agendamentos_ids, usuario=None):
+    """
+    Invalida as reposições ainda não utilizadas dos agendamentos informados
+    (falta corrigida na chamada), como o `invalidar_credito`: o lote é zerado,
+    marcado EXPIRADA e o saldo vira uma EXPIRACAO no livro-razão. Nada é
+    apagado, e reposições já consumidas são mantidas.
+    """
+    if not agendamentos_ids:
+        return 0
+    lotes = list(
+        CreditoAula.objects.select_for_update().filter(
+            agendamento_origem_id__in=agendamentos_ids,
+            saldo=F('quantidade'),
+            status=CreditoAula.StatusCredito.DISPONIVEL,
+        )
+    )
+    if not lotes:
+        return 0
+    CreditoAula.objects.filter(pk__in=[lote.pk for lote in lotes]).update(
+        saldo=0,
+        status=CreditoAula.StatusCredito.EXPIRADA,
+        data_invalidacao=timezone.now(),
+        invalidado_por=usuario,
+    )
+    MovimentoCredito.objects.bulk_create(
+        MovimentoCredito(
+            credito_id=lote.pk,
+            aluno_id=lote.aluno_id,
+            tipo=MovimentoCredito.Tipo.EXPIRACAO,
+            quantidade=-lote.saldo,
+            registrado_por=usuario,
+        )
+        for lote in lotes
+    )
+    return len(lotes)
+
+
+def registrar_chamada(aula, presencas, usuario=None):
+    """
+    Aplica a chamada de uma aula em uma única transação.
+
+    `presencas` mapeia aluno_id -> status_presenca. Todos os alunos precisam
+    estar inscritos na aula; caso contrário nada é gravado. Os status são
+    gravados com um bulk_update e as reposições de AUSENTE_COM_REPO são
+    concedidas (ou revogadas, se a falta for corrigida) em lote.
+    """
+    with transaction.atomic():
+        agendamentos = {
+            agendamento.aluno_id: agendamento
+            for agendamento in AulaAluno.objects.select_for_update().filter(
+                aula_id=aula.pk, aluno_id__in=list(presencas)
+            )
+        }
+        nao_inscritos = sorted(set(presencas) - set(agendamentos))
+        if nao_inscritos:
+            raise ValidationError({
+                "presencas": f"Os alunos {nao_inscritos} não estão inscritos nesta aula."
+            })
+
+        alterados, com_reposicao, reposicoes_revogadas = [], [], []
+        for aluno_id, status_presenca in presencas.items():
+            agendamento = agendamentos[aluno_id]
+            if agendamento.status_presenca == status_presenca:
+                continue
+            if status_presenca == AulaAluno.StatusPresenca.AUSENTE_COM_REPO:
+                com_reposicao.append(agendamento)
+            elif agendamento.status_presenca == AulaAluno.StatusPresenca.AUSENTE_COM_REPO:
+                reposicoes_revogadas.append(agendamento.pk)
+            agendamento.status_presenca = status_presenca
+            alterados.append(agendamento)
+
+        AulaAluno.objects.bulk_update(alterados, ['status_presenca'])
+        concedidas = conceder_reposicoes(com_reposicao, usuario)
+        revogadas = revogar_reposicoes(reposicoes_revogadas, usuario)
+
+    return {
+        'atualizados': len(alterados),
+        'reposicoes_concedidas': concedidas,
+        'reposicoes_revogadas': revogadas,
+    }
+
+
+# --- Agendamento em série ---
+
+def agendar_serie(aluno, aulas_ids, usuario=None):
+    """
+    Inscreve o aluno em várias aulas de uma vez (ex.: o mesmo horário semanal
+    durante um semestre).
+
+    Vagas, inscrições existentes, conflitos de horário e créditos de todas as
+    aulas são resolvidos com um número fixo de consultas, e os agendamentos são
+    criados com bulk_create. Cada aula é processada em ordem cronológica, e
+    cada falha é reportada individualmente sem impedir as demais.
+
+    Retorna uma lista de {'aula', 'status', 'motivo'} na ordem das aulas.
+    """
+    aulas_ids = list(dict.fromkeys(aulas_ids))
+    resultados = {}
+
+    with transaction.atomic():
+        aulas = list(
+            Aula.objects.select_for_update()
+            .filter(pk__in=aulas_ids)
+            .order_by('data_hora_inicio', 'pk')
+        )
+        encontradas = [aula.pk for aula in aulas]
+        aulas_encontradas = set(encontradas)
+        for aula_id in set(aulas_ids) - aulas_encontradas:
+            resultados[aula_id] = "Aula não encontrada."
+
+        if aulas:
+            intervalos = {aula.pk: intervalo_da_aula(aula) for aula in aulas}
+            inicio_serie = min(inicio for inicio, _ in intervalos.values())
+            fim_serie = max(fim for _, fim in intervalos.values())
+
+            ja_inscrito = set(
+                AulaAluno.objects.filter(aluno_id=aluno.pk, aula_id__in=list(intervalos))
+                .values_list('aula_id', flat=True)
+            )
+            # Uma consulta cobre a janela inteira da série; a sobreposição com
+            # cada aula é verificada em memória.
+            ocupados = list(
+                agendamentos_sobrepostos(inicio_serie, fim_serie, [aluno.pk])
+                .values_list('data_hora_inicio', 'data_hora_fim')
+            )
+            lotes = list(
+                CreditoAula.objects.select_for_update()
+                .filter(
+                    filtro_creditos_validos(timezone.localtime(inicio_serie).date()),
+                    aluno_id=aluno.pk,
+                )
+                .order_by('data_validade', 'pk')
+            )
+            saldo_lote = {lote.pk: lote.saldo for lote in lotes}
+
+        agora = timezone.now()
+        novos_agendamentos = []
+        for aula in aulas:
+            inicio, fim = intervalos[aula.pk]
+            if aula.pk in ja_inscrito:
+                resultados[aula.pk] = "Aluno já inscrito nesta aula."
+                continue
+            if inicio <= agora:
+                resultados[aula.pk] = "A aula já começou."
+                continue
+            motivo = motivo_fora_do_expediente(aula.studio_id, inicio, fim)
+            if motivo:
+                resultados[aula.pk] = motivo
+                continue
+            if aula.vagas_ocupadas >= aula.capacidade_maxima:
+                resultados[aula.pk] = "Não há mais vagas disponíveis nesta aula."
+                continue
+            if any(outro_fim > inicio and outro_inicio < fim for outro_inicio, outro_fim in ocupados):
+                resultados[aula.pk] = "Conflito de horário com outra aula do aluno."
+                continue
+
+            credito = None
+            if aula.tipo_aula == Aula.TipoAula.REGULAR:
+                data_aula = timezone.localtime(inicio).date()
+                credito = next(
+                    (lote for lote in lotes if saldo_lote[lote.pk] > 0 and lote.data_validade >= data_aula),
+                    None,
+                )
+                if credito is None:
+                    resultados[aula.pk] = "Sem créditos disponíveis ou válidos para esta aula."
+                    continue
+                saldo_lote[credito.pk] -= 1
+
+            ocupados.append((inicio, fim))
+            novos_agendamentos.append(AulaAluno(
+                aula_id=aula.pk,
+                aluno_id=aluno.pk,
+                status_presenca=AulaAluno.StatusPresenca.AGENDADO,
+                credito_utilizado=credito,
+                data_hora_inicio=inicio,
+                data_hora_fim=fim,
+            ))
+            resultados[aula.pk] = None
+
+        if novos_agendamentos:
+            agendadas = [agendamento.aula_id for agendamento in novos_agendamentos]
+            # bulk_create não dispara o post_save: contadores e créditos são
+            # atualizados aqui, cada um com uma única consulta.
+            AulaAluno.objects.bulk_create(novos_agendamentos)
+            Aula.objects.filter(pk__in=agendadas).update(vagas_ocupadas=F('vagas_ocupadas') + 1)
+            invalidar_calendario({aula.studio_id for aula in aulas})
+
+            consumidos = [lote for lote in lotes if saldo_lote[lote.pk] != lote.saldo]
+            for lote in consumidos:
+                lote.saldo = saldo_lote[lote.pk]
+                if lote.saldo == 0:
+                    lote.data_invalidacao = agora
+                    lote.status = CreditoAula.StatusCredito.UTILIZADA
+            CreditoAula.objects.bulk_update(consumidos, ['saldo', 'status', 'data_invalidacao'])
+
+            agendamentos_ids = dict(
+                AulaAluno.objects.filter(aluno_id=aluno.pk, aula_id__in=agendadas).values_list('aula_id', 'pk')
+            )
+            MovimentoCredito.objects.bulk_create(
+                MovimentoCredito(
+                    credito_id=agendamento.credito_utilizado_id,
+                    aluno_id=aluno.pk,
+                    tipo=MovimentoCredito.Tipo.CONSUMO,
+                    quantidade=-1,
+                    agendamento_id=agendamentos_ids[agendamento.aula_id],
+                    registrado_por=usuario,
+                )
+                for agendamento in novos_agendamentos
+                if agendamento.credito_utilizado_id
+            )
+
+    ordem = encontradas + [aula_id for aula_id in aulas_ids if aula_id not in aulas_encontradas]
+    return [
+        {
+            'aula': aula_id,
+            'status': 'FALHOU' if resultados[aula_id] else 'AGENDADO',
+            'motivo': resultados[aula_id],
+        }
+        for aula_id in ordem
+    ]
+
+
+# --- Promoção da lista de espera ---
+
+def promover_lista_espera(aula_id):
+    """
+    Motor único de promoção da lista de espera de uma aula.
+
+    Trava a aula, busca em lote as inscrições AGUARDANDO, os créditos válidos e
+    os conflitos de horário de todos os candidatos e inscreve, por ordem de
+    chegada, tantos alunos quantas forem as vagas livres. Candidatos sem crédito
+    válido são avisados e removidos da lista; candidatos com conflito de horário
+    permanecem aguardando. O número de consultas não depende do tamanho da lista.
+
+    Retorna a lista de IDs dos alunos promovidos.
+    """
+    with transaction.atomic():
+        try:
+            aula = bloquear_aula(aula_id)
+        except Aula.DoesNotExist:
+            return []
+
+        vagas_livres = aula.capacidade_maxima - aula.vagas_ocupadas
+        if vagas_livres <= 0:
+            return []
+
+        inscricoes_espera = list(
+            ListaEspera.objects.filter(
+                aula_id=aula.pk, status=ListaEspera.StatusEspera.AGUARDANDO
+            ).order_by('data_inscricao', 'pk')
+        )
+        if not inscricoes_espera:
+            return []
+
+        candidatos_ids = [inscricao.aluno_id for inscricao in inscricoes_espera]
+
+        creditos_por_aluno = {}
+        creditos = CreditoAula.objects.filter(
+            filtro_creditos_validos(timezone.localtime(aula.data_hora_inicio).date()),
+            aluno_id__in=candidatos_ids,
+        ).select_for_update().order_by('data_validade', 'pk')
+        for credito in creditos:
+            creditos_por_aluno.setdefault(credito.aluno_id, credito)
+
+        em_conflito = alunos_em_conflito(aula, candidatos_ids)
+        inicio, fim = intervalo_da_aula(aula)
+
+        promovidos, sem_credito, entradas_removidas = [], [], []
+        novos_agendamentos = []
+        for inscricao in inscricoes_espera:
+            if len(promovidos) >= vagas_livres:
+                break
+            aluno_id = inscricao.aluno_id
+            credito = creditos_por_aluno.get(aluno_id)
+            if aula.tipo_aula == Aula.TipoAula.REGULAR and credito is None:
+                sem_credito.append(aluno_id)
+                entradas_removidas.append(inscricao.pk)
+                continue
+            if aluno_id in em_conflito:
+                continue
+
+            novos_agendamentos.append(AulaAluno(
+                aula_id=aula.pk,
+                aluno_id=aluno_id,
+                status_presenca=AulaAluno.StatusPresenca.AGENDADO,
+                credito_utilizado=credito if aula.tipo_aula == Aula.TipoAula.REGULAR else None,
+                data_hora_inicio=inicio,
+                data_hora_fim=fim,
+            ))
+            promovidos.append(aluno_id)
+            entradas_removidas.append(inscricao.pk)
+
+        agendamentos_ids = {}
+        if novos_agendamentos:
+            # bulk_create não dispara o post_save: o contador é atualizado aqui.
+            AulaAluno.objects.bulk_create(novos_agendamentos)
+            incrementar_vagas(aula.pk, len(novos_agendamentos))
+            invalidar_calendario([aula.studio_id])
+            # Nem todo banco devolve as PKs no bulk_create; busca-as de uma vez.
+            agendamentos_ids = dict(
+                AulaAluno.objects.filter(aula_id=aula.pk, aluno_id__in=promovidos).values_list('aluno_id', 'pk')
+            )
+            for agendamento in novos_agendamentos:
+                agendamento.pk = agendamentos_ids[agendamento.aluno_id]
+            consumir_creditos_em_lote(novos_agendamentos)
+        if entradas_removidas:
+            ListaEspera.objects.filter(pk__in=entradas_removidas).delete()
+
+        if promovidos or sem_credito:
+            nome_modalidade = aula.modalidade.nome if aula.modalidade_id else "sua aula"
+            data_aula = timezone.localtime(aula.data_hora_inicio).strftime('%d/%m')
+            tipo_agendamento = ContentType.objects.get_for_model(AulaAluno)
+            tipo_aula = ContentType.objects.get_for_model(Aula)
+
+            notificacoes = [
+                Notification(
+                    recipient_id=aluno_id,
+                    message=f"Conseguimos! Você foi inscrito(a) automaticamente na aula de {nome_modalidade} do dia {data_aula}.",
+                    level=Notification.NotificationLevel.SUCCESS,
+                    content_type=tipo_agendamento,
+                    object_id=agendamentos_ids.get(aluno_id),
+                )
+                for aluno_id in promovidos
+            ]
+            notificacoes += [
+                Notification(
+                    recipient_id=aluno_id,
+                    message=f"Uma vaga surgiu na aula de {nome_modalidade}, mas não conseguimos te inscrever por falta de créditos válidos. Adquira um novo plano para não perder a próxima chance!",
+                    level=Notification.NotificationLevel.WARNING,
+                    content_type=tipo_aula,
+                    object_id=aula.pk,
+                )
+                for aluno_id in sem_credito
+            ]
+            Notification.objects.bulk_create(notificacoes)
+
+    return promovidos
+
+
+# --- Cancelamento de aulas em lote ---
+
+_cancelamento_em_lote = ContextVar('cancelamento_em_lote', default=False)
+
+
+def em_cancelamento_em_lote():
+    """Se a thread atual está dentro de cancelar_aulas (os signals por linha devem ser ignorados)."""
+    return _cancelamento_em_lote.get()
+
+
+@contextmanager
+def _suspender_sinais_de_cancelamento():
+    token = _cancelamento_em_lote.set(True)
+    try:
+        yield
+    finally:
+        _cancelamento_em_lote.reset(token)
+
+
+def cancelar_aulas(queryset, usuario=None, motivo=""):
+    """
+    Cancela (apaga) de uma vez as aulas do queryset que ainda não começaram.
+
+    Substitui a cascata de signals por linha (aviso por aula, estorno,
+    contador de vagas e promoção da lista de espera por inscrição) por
+    operações em conjunto: os créditos voltam com um único UPDATE, os alunos
+    são avisados com um bulk_create e as aulas e inscrições são apagadas
+    com os signals de agendamento suspensos.
+
+    Retorna as estatísticas da operação.
+    """
+    selecionadas = list(queryset.filter(data_hora_inicio__gt=timezone.now()).values_list('pk', flat=True))
+    with transaction.atomic():
+        # Trava as aulas para que nenhuma inscrição nova entre durante o cancelamento.
+        aulas = list(
+            Aula.objects.filter(pk__in=selecionadas)
+            .select_for_update(of=('self',))
+            .order_by('data_hora_inicio', 'pk')
+            .values_list('pk', 'studio_id', 'data_hora_inicio', 'modalidade__nome')
+        )
+        aulas_ids = [aula[0] for aula in aulas]
+        inscricoes = list(
+            AulaAluno.objects.filter(aula_id__in=aulas_ids)
+            .order_by('aula_id', 'pk')
+            .values_list('pk', 'aluno_id', 'credito_utilizado_id', 'aula_id')
+        )
+
+        estornados = estornar_creditos_em_lote(
+            [(pk, aluno_id, credito_id) for pk, aluno_id, credito_id, _ in inscricoes], usuario=usuario
+        )
+
+        complemento = f" Motivo: {motivo}" if motivo else ""
+        mensagens = {
+            pk: (
+                f"Aviso: A aula de {modalidade or 'sua modalidade'} no dia "
+                f"{timezone.localtime(inicio).strftime('%d/%m às %H:%M')} foi cancelada."
+                f" Seu crédito de aula foi estornado.{complemento}"
+            )
+            for pk, _, inicio, modalidade in aulas
+        }
+        Notification.objects.bulk_create(
+            Notification(
+                recipient_id=aluno_id,
+                message=mensagens[aula_id],
+                level=Notification.NotificationLevel.WARNING,
+            )
+            for _, aluno_id, _, aula_id in inscricoes
+        )
+
+        with _suspender_sinais_de_cancelamento():
+            Aula.objects.filter(pk__in=aulas_ids).delete()
+        invalidar_calendario({studio_id for _, studio_id, _, _ in aulas})
+
+    return {
+        'aulas_canceladas': len(aulas_ids),
+        'agendamentos_cancelados': len(inscricoes),
+        'creditos_estornados': estornados,
+        'alunos_notificados': len({aluno_id for _, aluno_id, _, _ in inscricoes}),
+    }
+
+
+# --- Expiração de créditos e reposições vencidos ---
+
+# Linhas expiradas por transação. Cada lote é gravado e confirmado antes do
+# próximo, então uma varredura interrompida não perde o que já foi feito e a
+# seguinte recomeça só com o que ainda está pendente.
+TAMANHO_LOTE_EXPIRACAO = 500
+
+
+def _estatisticas_expiracao():
+    return defaultdict(lambda: {'creditos': 0, 'saldo_expirado': 0, 'reposicoes': 0})
+
+
+def _proximo_lote(queryset, ultimo_pk, tamanho_lote):
+    """
+    Trava e devolve os ids do próximo lote, em ordem de pk a partir de
+    `ultimo_pk`. Linhas travadas por um agendamento em andamento são puladas
+    (SKIP LOCKED) e ficam para a próxima varredura.
+    """
+    return list(
+        queryset.select_for_update(skip_locked=True)
+        .filter(pk__gt=ultimo_pk)
+        .order_by('pk')
+        .values_list('pk', flat=True)[:tamanho_lote]
+    )
+
+
+def expirar_creditos(data_referencia=None, tamanho_lote=TAMANHO_LOTE_EXPIRACAO, estatisticas=None):
+    """
+    Invalida os lotes de crédito vencidos antes de `data_referencia` (hoje,
+    por padrão) que ainda estão DISPONIVEL: o saldo restante vira uma
+    EXPIRACAO no livro-razão e o lote é zerado e marcado EXPIRADA com um
+    UPDATE ... WHERE id IN (...) por lote. O estúdio de cada lote vem da aula do agendamento de
+    origem (reposição) ou da matrícula que o gerou.
+
+    Retorna as estatísticas por estúdio (None para lotes sem estúdio).
+    """
+    data_referencia = data_referencia or timezone.localdate()
+    estatisticas = _estatisticas_expiracao() if estatisticas is None else estatisticas
+    vencidos = CreditoAula.objects.filter(
+        status=CreditoAula.StatusCredito.DISPONIVEL, data_validade__lt=data_referencia
+    )
+    ultimo_pk = 0
+    while True:
+        with transaction.atomic():
+            ids = _proximo_lote(vencidos, ultimo_pk, tamanho_lote)
+            if not ids:
+                break
+            ultimo_pk = ids[-1]
+            lotes = list(
+                CreditoAula.objects.filter(pk__in=ids).values_list(
+                    'pk', 'aluno_id', 'saldo',
+                    Coalesce('agendamento_origem__aula__studio_id', 'matricula_origem__studio_id'),
+                )
+            )
+            CreditoAula.objects.filter(pk__in=ids).update(
+                saldo=0, status=CreditoAula.StatusCredito.EXPIRADA, data_invalidacao=timezone.now()
+            )
+            MovimentoCredito.objects.bulk_create(
+                MovimentoCredito(
+                    credito_id=pk,
+                    aluno_id=aluno_id,
+                    tipo=MovimentoCredito.Tipo.EXPIRACAO,
+                    quantidade=-saldo,
+                )
+                for pk, aluno_id, saldo, _ in lotes
+                if saldo
+            )
+        for _, _, saldo, studio_id in lotes:
+            estatisticas[studio_id]['creditos'] += 1
+            estatisticas[studio_id]['saldo_expirado'] += saldo
+    return estatisticas
+
+
+def expirar_reposicoes(data_referencia=None, tamanho_lote=TAMANHO_LOTE_EXPIRACAO, estatisticas=None):
+    """
+    Move para EXPIRADA as reposições DISPONIVEL vencidas antes de
+    `data_referencia`, em lotes de UPDATE ... WHERE id IN (...). Retorna as
+    estatísticas por estúdio da aula de origem.
+    """
+    data_referencia = data_referencia or timezone.localdate()
+    estatisticas = _estatisticas_expiracao() if estatisticas is None else estatisticas
+    vencidas = Reposicao.objects.filter(
+        status=Reposicao.StatusReposicao.DISPONIVEL, data_expiracao__lt=data_referencia
+    )
+    ultimo_pk = 0
+    while True:
+        with transaction.atomic():
+            ids = _proximo_lote(vencidas, ultimo_pk, tamanho_lote)
+            if not ids:
+                break
+            ultimo_pk = ids[-1]
+            por_studio = Counter(
+                Reposicao.objects.filter(pk__in=ids).values_list('agendamento_origem__aula__studio_id', flat=True)
+            )
+            Reposicao.objects.filter(pk__in=ids).update(status=Reposicao.StatusReposicao.EXPIRADA)
+        for studio_id, total in por_studio.items():
+            estatisticas[studio_id]['reposicoes'] += total
+    return estatisticas
+
+
+def expirar_vencidos(data_referencia=None, tamanho_lote=TAMANHO_LOTE_EXPIRACAO):
+    """Expira créditos e reposições vencidos, somando as estatísticas por estúdio."""
+    estatisticas = _estatisticas_expiracao()
+    expirar_creditos(data_referencia, tamanho_lote, estatisticas)
+    expirar_reposicoes(data_referencia, tamanho_lote, estatisticas)
+    return dict(estatisticas)
+
+
+# --- Posição na lista de espera ---
+
+# Semanas de aulas passadas consideradas no histórico de cancelamentos.
+HISTORICO_CANCELAMENTOS_SEMANAS = 12
+
+
+def posicoes_lista_espera(aluno_id):
+    """
+    Inscrições AGUARDANDO do aluno em aulas futuras, cada uma anotada com
+    `posicao` (1 = próximo a ser promovido) e `total_na_fila`.
+
+    As posições saem de uma única consulta com ROW_NUMBER() particionado por
+    aula, calculado só sobre as filas em que o aluno está. O ORM aplicaria o
+    filtro do aluno antes da janela, e não depois, por isso a consulta é
+    escrita à mão. A aula, a modalidade e o estúdio vêm em um prefetch, e o
+    histórico de cancelamentos em uma consulta agregada: no máximo três
+    consultas, com ou sem entradas em aulas recorrentes.
+    """
+    espera = ListaEspera._meta.db_table
+    aulas = Aula._meta.db_table
+    aguardando = ListaEspera.StatusEspera.AGUARDANDO
+    sql = f"""
+        SELECT id, aula_id, aluno_id, data_inscricao, status, posicao, total_na_fila
+        FROM (
+            SELECT e.id, e.aula_id, e.aluno_id, e.data_inscricao, e.status,
+                   ROW_NUMBER() OVER (PARTITION BY e.aula_id ORDER BY e.data_inscricao, e.id) AS posicao,
+                   COUNT(*) OVER (PARTITION BY e.aula_id) AS total_na_fila
+            FROM {espera} e
+            WHERE e.status = %s AND e.aula_id IN (
+                SELECT m.aula_id
+                FROM {espera} m
+                INNER JOIN {aulas} a ON a.id = m.aula_id
+                WHERE m.aluno_id = %s AND a.data_hora_inicio > %s
+            )
+        ) fila
+        WHERE fila.aluno_id = %s
+        ORDER BY fila.data_inscricao, fila.id
+    """
+    entradas = list(
+        ListaEspera.objects.raw(sql, [aguardando, aluno_id, timezone.now(), aluno_id]).prefetch_related(
+            Prefetch('aula', queryset=Aula.objects.select_related('modalidade', 'studio'))
+        )
+    )
+    medias = medias_cancelamentos([entrada.aula for entrada in entradas])
+    for entrada in entradas:
+        media = medias.get(entrada.aula_id)
+        entrada.media_cancelamentos = media
+        vagas_livres = max(entrada.aula.capacidade_maxima - entrada.aula.vagas_ocupadas, 0)
+        entrada.probabilidade_promocao = (
+            None if media is None else _probabilidade_de_ao_menos(entrada.posicao - vagas_livres, media)
+        )
+    return entradas
+
+
+def medias_cancelamentos(aulas):
+    """
+    Média de cancelamentos por aula no mesmo horário nas últimas
+    HISTORICO_CANCELAMENTOS_SEMANAS semanas, por aula. O horário de uma aula
+    gerada é a sua AulaRecorrente. O de uma aula avulsa é o par estúdio e
+    modalidade. Aulas sem histórico ficam de fora. Uma única consulta agregada
+    devolve soma e contagem por horário; a média é fechada aqui.
+    """
+    recorrencias = {aula.recorrencia_id for aula in aulas if aula.recorrencia_id}
+    avulsas = [aula for aula in aulas if not aula.recorrencia_id]
+    if not recorrencias and not avulsas:
+        return {}
+
+    horarios = Q(recorrencia_id__in=recorrencias)
+    if avulsas:
+        horarios |= Q(
+            recorrencia__isnull=True,
+            studio_id__in={aula.studio_id for aula in avulsas},
+            modalidade_id__in={aula.modalidade_id for aula in avulsas},
+        )
+    agora = timezone.now()
+    historico = (
+        Aula.objects.filter(
+            horarios,
+            data_hora_inicio__lt=agora,
+            data_hora_inicio__gte=agora - timedelta(weeks=HISTORICO_CANCELAMENTOS_SEMANAS),
+        )
+        .order_by()
+        .values('recorrencia_id', 'studio_id', 'modalidade_id')
+        .annotate(total=Sum('cancelamentos'), quantidade=Count('id'))
+        .values_list('recorrencia_id', 'studio_id', 'modalidade_id', 'total', 'quantidade')
+    )
+
+    # Uma recorrência pode aparecer em mais de uma linha (estúdio ou
+    # modalidade alterados), então soma e contagem são acumuladas por horário.
+    acumulado = {}
+    for recorrencia_id, studio_id, modalidade_id, total, quantidade in historico:
+        chave = recorrencia_id or (studio_id, modalidade_id)
+        soma, contagem = acumulado.get(chave, (0, 0))
+        acumulado[chave] = (soma + total, contagem + quantidade)
+
+    medias = {}
+    for aula in aulas:
+        chave = aula.recorrencia_id or (aula.studio_id, aula.modalidade_id)
+        if chave in acumulado:
+            soma, contagem = acumulado[chave]
+            medias[aula.pk] = soma / contagem
+    return medias
+
+
+def _probabilidade_de_ao_menos(cancelamentos, media):
+    """
+    P(N >= cancelamentos) para N ~ Poisson(media): a chance de surgirem ao
+    menos `cancelamentos` desistências até a aula.
+    """
+    if cancelamentos <= 0:
+        return 1.0
+    termo = acumulada = math.exp(-media)
+    for k in range(1, cancelamentos):
+        termo *= media / k
+        acumulada += termo
+    return round(max(0.0, 1.0 - acumulada), 4)
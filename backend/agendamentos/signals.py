@@ -1,110 +1,91 @@
 # agendamentos/signals.py
-from django.db import transaction
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Aula, AulaAluno, ListaEspera, CreditoAula # Importe Aula
+from .models import Aula, AulaAluno, CreditoAula, MovimentoCredito, HorarioTrabalho, BloqueioAgenda
 from django.utils import timezone
-from datetime import timedelta
-
-def verificar_conflito_horario(aluno, nova_aula):
-    """
-    Verifica se a nova_aula conflita com alguma aula já agendada pelo aluno.
-    """
-    inicio_nova_aula = nova_aula.data_hora_inicio
-    fim_nova_aula = inicio_nova_aula + timedelta(minutes=nova_aula.duracao_minutos)
-
-    agendamentos_existentes = AulaAluno.objects.filter(
-        aluno=aluno,
-        status_presenca='AGENDADO'
-    ).select_related('aula')
-
-    for agendamento in agendamentos_existentes:
-        inicio_existente = agendamento.aula.data_hora_inicio
-        fim_existente = inicio_existente + timedelta(minutes=agendamento.aula.duracao_minutos)
-        if inicio_nova_aula < fim_existente and fim_nova_aula > inicio_existente:
-            return True
-    return False
-
-@transaction.atomic
-def processar_lista_espera(aula_id):
+from .services import (
+    incrementar_vagas,
+    decrementar_vagas,
+    estornar_credito,
+    invalidar_calendario,
+    invalidar_calendario_das_aulas,
+    invalidar_expediente,
+    em_cancelamento_em_lote,
+)
+from .tarefas import agendar_promocao_lista_espera
+
+@receiver(post_save, sender=AulaAluno)
+def on_aula_aluno_criada(sender, instance, created, **kwargs):
     """
-    Processa a lista de espera para uma aula específica, matriculando alunos se houver vagas.
+    Gatilho para quando um agendamento é criado.
+    Ocupa uma vaga no contador desnormalizado da aula.
     """
-    try:
-        aula = Aula.objects.select_for_update().get(id=aula_id)
-    except Aula.DoesNotExist:
-        return
-
-    vagas_ocupadas = AulaAluno.objects.filter(aula=aula).count()
-    vagas_disponiveis = aula.capacidade_maxima - vagas_ocupadas
-
-    if vagas_disponiveis <= 0:
-        return
-
-    lista_espera_entries = ListaEspera.objects.filter(
-        aula=aula,
-        status=ListaEspera.StatusEspera.AGUARDANDO
-    ).order_by('data_inscricao')[:vagas_disponiveis]
-
-    for entry in lista_espera_entries:
-        aluno = entry.aluno
-
-        credito_valido = CreditoAula.objects.filter(
-            aluno=aluno,
-            data_invalidacao__isnull=True,
-            data_validade__gte=aula.data_hora_inicio.date()
-        ).order_by('data_validade').first()
-
-        if not credito_valido:
-            continue  
-
-        
-        if verificar_conflito_horario(aluno, aula):
-            continue 
-
-        
-        agendamento = AulaAluno.objects.create(
-            aula=aula,
-            aluno=aluno,
-            status_presenca=AulaAluno.StatusPresenca.AGENDADO,
-            credito_utilizado=credito_valido
-        )
-
-        
-        credito_valido.data_invalidacao = agendamento.aula.data_hora_inicio
-        credito_valido.save()
-
-        
-        entry.delete()
+    if created and instance.aula_id:
+        incrementar_vagas(instance.aula_id)
+        invalidar_calendario_das_aulas([instance.aula_id])
 
 @receiver(post_delete, sender=AulaAluno)
 def on_aula_aluno_cancelada(sender, instance, **kwargs):
     """
     Gatilho para quando um agendamento é cancelado (deletado).
-    Libera o crédito e processa a lista de espera.
+    Libera a vaga e o crédito e enfileira a promoção da lista de espera.
+    No cancelamento de aulas em lote, tudo isso é feito pelo próprio serviço.
     """
-    
-    if instance.credito_utilizado:
-        credito = instance.credito_utilizado
-        credito.data_invalidacao = None
-        credito.invalidado_por = None
-        credito.save()
+    if em_cancelamento_em_lote():
+        return
+    if instance.aula_id:
+        # Só conta como cancelamento a desistência antes do início da aula.
+        cancelamento = instance.data_hora_inicio is None or instance.data_hora_inicio > timezone.now()
+        decrementar_vagas(instance.aula_id, cancelamento=cancelamento)
+        invalidar_calendario_das_aulas([instance.aula_id])
+
+    if instance.credito_utilizado_id:
+        estornar_credito(instance.credito_utilizado_id, instance.aluno_id)
 
-    try:
-        aula_obj = Aula.objects.get(id=instance.aula_id)
-        processar_lista_espera(aula_obj.id)
-    except Aula.DoesNotExist:
-        pass
+    if instance.aula_id:
+        agendar_promocao_lista_espera(instance.aula_id)
 
 @receiver(post_save, sender=Aula)
-def on_aula_capacidade_aumentada(sender, instance, created, **kwargs):
+@receiver(post_delete, sender=Aula)
+def on_aula_alterada(sender, instance, **kwargs):
+    """
+    Invalida o calendário semanal do estúdio da aula e, se ela mudou de
+    estúdio, também o do estúdio de origem.
     """
-    Gatilho para quando a capacidade de uma aula é aumentada.
+    if em_cancelamento_em_lote():
+        return
+    invalidar_calendario([instance.studio_id, getattr(instance, '_studio_id_carregado', None)])
+
+@receiver(post_save, sender=HorarioTrabalho)
+@receiver(post_delete, sender=HorarioTrabalho)
+@receiver(post_save, sender=BloqueioAgenda)
+@receiver(post_delete, sender=BloqueioAgenda)
+def on_expediente_alterado(sender, instance, **kwargs):
+    """Descarta o expediente em cache do estúdio (janelas de horário e bloqueios)."""
+    invalidar_expediente(instance.studio_id)
+
+@receiver(post_save, sender=CreditoAula)
+def on_credito_concedido(sender, instance, created, **kwargs):
+    """
+    Registra a concessão de um lote de créditos no livro-razão.
+    Um lote criado já invalidado recebe também a expiração correspondente,
+    para que a soma dos movimentos continue igual ao saldo.
     """
     if not created:
-        try:
-            old_instance = Aula.objects.get(pk=instance.pk)
-            if instance.capacidade_maxima > old_instance.capacidade_maxima:
-                processar_lista_espera(instance.id)
-        except Aula.DoesNotExist:
-            pass 
+        return
+    movimentos = [MovimentoCredito(
+        credito=instance,
+        aluno_id=instance.aluno_id,
+        tipo=MovimentoCredito.Tipo.CONCESSAO,
+        quantidade=instance.quantidade,
+        registrado_por_id=instance.adicionado_por_id,
+    )]
+    if instance.saldo < instance.quantidade:
+        movimentos.append(MovimentoCredito(
+            credito=instance,
+            aluno_id=instance.aluno_id,
+            tipo=MovimentoCredito.Tipo.EXPIRACAO,
+            quantidade=instance.saldo - instance.quantidade,
+            registrado_por_id=instance.invalidado_por_id,
+        ))
+    MovimentoCredito.objects.bulk_create(movimentos)
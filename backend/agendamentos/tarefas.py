@@ -0,0 +1,22 @@
+# agendamentos/tarefas.py
+from core.tarefas import enfileirar, tarefa
+
+from .services import promover_lista_espera
+
+
+@tarefa("agendamentos.promover_lista_espera")
+def promover_lista_espera_tarefa(aula_id):
+    promover_lista_espera(aula_id)
+
+
+def agendar_promocao_lista_espera(aula_id):
+    """
+    Enfileira a promoção da lista de espera da aula. Cancelamentos seguidos
+    da mesma aula se fundem em uma única tarefa pendente, já que a promoção
+    recalcula as vagas livres no momento em que roda.
+    """
+    enfileirar(
+        "agendamentos.promover_lista_espera",
+        chave=f"promover_lista_espera:{aula_id}",
+        aula_id=aula_id,
+    )
@@ -1,14 +1,95 @@
 # agendamentos/tests.py
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.test import APITestCase
 from django.utils import timezone
+from io import StringIO
+from types import SimpleNamespace
 import datetime
+import os
 
 from usuarios.models import Usuario, Perfil
 from alunos.models import Aluno
 from studios.models import Studio, FuncaoOperacional
-from agendamentos.models import Modalidade, Aula, CreditoAula, AulaAluno, Colaborador
+from agendamentos.models import (
+    Modalidade, Aula, CreditoAula, AulaAluno, Colaborador, AulaRecorrente, HorarioTrabalho,
+    BloqueioAgenda, ListaEspera, MovimentoCredito, Reposicao,
+)
+from agendamentos.serializers import AgendamentoAlunoSerializer, AulaWriteSerializer
+from agendamentos.services import (
+    agendar_serie, alunos_em_conflito, buscar_conflito_aluno, consumir_credito,
+    consumir_creditos_em_lote, expirar_vencidos, filtrar_por_periodo, gerar_aulas_recorrentes,
+    intervalo_da_aula, limpar_expedientes, motivo_fora_do_expediente, promover_lista_espera,
+    saldo_creditos,
+)
+from core.models import RespostaIdempotente
+from core.tarefas import executar_pendentes
+from notifications.models import Notification
+
+
+# --- Fixtures compartilhadas pelos testes ---
+
+def no_horario(data, hora, minuto=0):
+    """Datetime local (aware) da data e hora informadas."""
+    return timezone.make_aware(datetime.datetime.combine(data, datetime.time(hora, minuto)))
+
+
+def criar_usuario(cpf, **campos):
+    """Usuário com e-mail derivado do CPF e a senha padrão dos testes."""
+    email = f"{cpf}@teste.com"
+    return Usuario.objects.create_user(username=email, email=email, password="password123", cpf=cpf, **campos)
+
+
+def criar_aluno(cpf, creditos=0, validade=None, **campos):
+    """
+    Aluno de teste; com `creditos` > 0 recebe um lote com essa quantidade,
+    válido até `validade` (padrão: daqui a 30 dias).
+    """
+    aluno = Aluno.objects.create(
+        usuario=criar_usuario(cpf, **campos), dataNascimento="1990-01-01", contato="11999999999",
+    )
+    if creditos:
+        CreditoAula.objects.create(
+            aluno=aluno,
+            quantidade=creditos,
+            data_validade=validade or timezone.localdate() + datetime.timedelta(days=30),
+        )
+    return aluno
+
+
+def criar_colaborador(cpf, **campos):
+    """Colaborador (ex.: instrutor) sem perfis nem estúdios."""
+    return Colaborador.objects.create(
+        usuario=criar_usuario(cpf, **campos),
+        data_nascimento=timezone.localdate() - datetime.timedelta(days=365 * 30),
+    )
+
+
+def criar_recepcionista(cpf, studio):
+    """Colaborador com perfil de recepcionista no estúdio; devolve o usuário."""
+    perfil, _ = Perfil.objects.get_or_create(nome="RECEPCIONISTA")
+    funcao, _ = FuncaoOperacional.objects.get_or_create(nome="Recepcionista")
+    recepcionista = criar_colaborador(cpf)
+    recepcionista.perfis.add(perfil)
+    recepcionista.unidades.add(studio, through_defaults={'permissao': funcao})
+    return recepcionista.usuario
+
+
+def criar_aula(studio, modalidade, inicio=None, **campos):
+    """Aula no estúdio; sem `inicio`, começa daqui a um dia."""
+    return Aula.objects.create(
+        studio=studio,
+        modalidade=modalidade,
+        data_hora_inicio=inicio or timezone.now() + datetime.timedelta(days=1),
+        **campos,
+    )
 
 
 class AgendamentoAPITestCase(APITestCase):
@@ -302,3 +383,1338 @@ class AgendamentoAPITestCase(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(AulaAluno.objects.filter(pk=agendamento_aluno.pk).exists())
+
+
+class OcupacaoAulaTestCase(APITestCase):
+    """
+    Testes para a ocupação anotada na listagem de aulas.
+    """
+
+    def setUp(self):
+        self.studio = Studio.objects.create(nome="Studio Ocupação")
+        self.modalidade = Modalidade.objects.create(nome="Pilates Solo")
+        self.alunos = [criar_aluno(f"5555555555{i}") for i in range(3)]
+        self.url = reverse("agendamentoaula-list")
+
+    def _criar_aulas(self, quantidade):
+        for i in range(quantidade):
+            aula = criar_aula(
+                self.studio, self.modalidade,
+                timezone.now() + datetime.timedelta(days=1, hours=i), capacidade_maxima=2,
+            )
+            for aluno in self.alunos[:2]:
+                AulaAluno.objects.create(aula=aula, aluno=aluno)
+
+    def test_listagem_retorna_ocupacao_anotada(self):
+        self._criar_aulas(1)
+        self.client.force_authenticate(user=self.alunos[2].usuario)
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        aula = response.data["results"][0]
+        self.assertEqual(aula["vagas_preenchidas"], 2)
+        self.assertEqual(aula["vagas_disponiveis"], 0)
+        self.assertEqual(aula["lista_espera_total"], 0)
+
+    def test_vagas_preenchidas_contam_inscricoes_em_qualquer_status(self):
+        self._criar_aulas(1)
+        AulaAluno.objects.filter(aluno=self.alunos[0]).update(status_presenca=AulaAluno.StatusPresenca.PRESENTE)
+        self.client.force_authenticate(user=self.alunos[2].usuario)
+        response = self.client.get(self.url)
+
+        aula = response.data["results"][0]
+        self.assertEqual(aula["vagas_preenchidas"], 2)
+        self.assertEqual(aula["vagas_disponiveis"], 0)
+
+    def test_numero_de_queries_nao_cresce_com_as_aulas(self):
+        self.client.force_authenticate(user=self.alunos[2].usuario)
+        self._criar_aulas(2)
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as poucas:
+            self.client.get(self.url)
+
+        self._criar_aulas(6)
+        with CaptureQueriesContext(connection) as muitas:
+            response = self.client.get(self.url)
+
+        self.assertEqual(len(response.data["results"]), 8)
+        self.assertEqual(len(poucas), len(muitas))
+
+
+class ContadorVagasTestCase(APITestCase):
+    """
+    Testes para o contador desnormalizado Aula.vagas_ocupadas.
+    """
+
+    def setUp(self):
+        self.studio = Studio.objects.create(nome="Studio Contador")
+        self.modalidade = Modalidade.objects.create(nome="Pilates Contador")
+        self.aula = criar_aula(self.studio, self.modalidade, capacidade_maxima=1)
+        self.alunos = [criar_aluno(f"6666666666{i}", creditos=1) for i in range(2)]
+
+    def test_contador_acompanha_criacao_e_cancelamento(self):
+        agendamento = AulaAluno.objects.create(aula=self.aula, aluno=self.alunos[0])
+        self.aula.refresh_from_db()
+        self.assertEqual(self.aula.vagas_ocupadas, 1)
+
+        agendamento.delete()
+        self.aula.refresh_from_db()
+        self.assertEqual(self.aula.vagas_ocupadas, 0)
+
+    def test_agendamento_rejeitado_quando_contador_indica_aula_cheia(self):
+        self.client.force_authenticate(user=self.alunos[0].usuario)
+        response = self.client.post(reverse("aulaaluno-list"), data={"aula": self.aula.pk})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.client.force_authenticate(user=self.alunos[1].usuario)
+        response = self.client.post(reverse("aulaaluno-list"), data={"aula": self.aula.pk})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.aula.refresh_from_db()
+        self.assertEqual(self.aula.vagas_ocupadas, 1)
+        self.assertEqual(AulaAluno.objects.filter(aula=self.aula).count(), 1)
+
+    def test_save_da_aula_nao_sobrescreve_contador(self):
+        AulaAluno.objects.create(aula=self.aula, aluno=self.alunos[0])
+        self.aula.capacidade_maxima = 5
+        self.aula.save()
+        self.aula.refresh_from_db()
+        self.assertEqual(self.aula.vagas_ocupadas, 1)
+
+    def test_reconciliar_vagas_reconstroi_contador(self):
+        AulaAluno.objects.create(aula=self.aula, aluno=self.alunos[0])
+        Aula.objects.filter(pk=self.aula.pk).update(vagas_ocupadas=7)
+
+        call_command("reconciliar_vagas", stdout=open(os.devnull, "w"))
+
+        self.aula.refresh_from_db()
+        self.assertEqual(self.aula.vagas_ocupadas, 1)
+
+
+class ConflitoHorarioTestCase(APITestCase):
+    """
+    Testes para a detecção de conflitos de horário entre agendamentos de alunos.
+    """
+
+    def setUp(self):
+        self.studio = Studio.objects.create(nome="Studio Conflito")
+        self.modalidade = Modalidade.objects.create(nome="Pilates Conflito")
+        inicio = timezone.now() + datetime.timedelta(days=2)
+        self.aula_a = criar_aula(self.studio, self.modalidade, inicio, duracao_minutos=60)
+        self.aula_sobreposta = criar_aula(
+            self.studio, self.modalidade, inicio + datetime.timedelta(minutes=30), duracao_minutos=60,
+        )
+        self.aula_seguinte = criar_aula(
+            self.studio, self.modalidade, inicio + datetime.timedelta(minutes=60), duracao_minutos=60,
+        )
+        self.alunos = [criar_aluno(f"7777777777{i}") for i in range(2)]
+        AulaAluno.objects.create(aula=self.aula_a, aluno=self.alunos[0])
+
+    def test_intervalo_copiado_para_inscricao(self):
+        agendamento = AulaAluno.objects.get(aula=self.aula_a, aluno=self.alunos[0])
+        self.assertEqual(agendamento.data_hora_fim, self.aula_a.data_hora_inicio + datetime.timedelta(minutes=60))
+
+        self.aula_a.duracao_minutos = 90
+        self.aula_a.save()
+        agendamento.refresh_from_db()
+        self.assertEqual(agendamento.data_hora_fim, self.aula_a.data_hora_inicio + datetime.timedelta(minutes=90))
+
+    def test_conflito_detectado_apenas_em_sobreposicao(self):
+        self.assertIsNotNone(buscar_conflito_aluno(self.alunos[0], self.aula_sobreposta))
+        self.assertIsNone(buscar_conflito_aluno(self.alunos[0], self.aula_seguinte))
+        self.assertIsNone(buscar_conflito_aluno(self.alunos[1], self.aula_sobreposta))
+
+    def test_modo_em_lote_verifica_varios_alunos_em_uma_consulta(self):
+        ids = [aluno.pk for aluno in self.alunos]
+        with self.assertNumQueries(1):
+            conflitantes = alunos_em_conflito(self.aula_sobreposta, ids)
+        self.assertEqual(conflitantes, {self.alunos[0].pk})
+
+
+class GeradorAulasRecorrentesTestCase(APITestCase):
+    """
+    Testes para o gerador de aulas a partir da grade recorrente.
+    """
+
+    def setUp(self):
+        self.studio = Studio.objects.create(nome="Studio Recorrente")
+        self.modalidade = Modalidade.objects.create(nome="Pilates Recorrente")
+        # Segunda a sexta, das 08:00 às 20:00.
+        for dia in range(5):
+            HorarioTrabalho.objects.create(
+                studio=self.studio, dia_semana=dia,
+                hora_inicio=datetime.time(8, 0), hora_fim=datetime.time(20, 0),
+            )
+        self.segunda = datetime.date(2030, 1, 7)
+        BloqueioAgenda.objects.create(
+            studio=self.studio, data=self.segunda + datetime.timedelta(days=7), descricao="Feriado"
+        )
+        self.recorrencia_segunda = AulaRecorrente.objects.create(
+            studio=self.studio, modalidade=self.modalidade,
+            dia_semana=0, horario=datetime.time(9, 0),
+        )
+        # Sábado: o estúdio não funciona.
+        AulaRecorrente.objects.create(
+            studio=self.studio, modalidade=self.modalidade,
+            dia_semana=5, horario=datetime.time(9, 0),
+        )
+        # Terça às 19:30 termina depois do fechamento.
+        AulaRecorrente.objects.create(
+            studio=self.studio, modalidade=self.modalidade,
+            dia_semana=1, horario=datetime.time(19, 30),
+        )
+
+    def tearDown(self):
+        # O expediente fica em cache no processo; o rollback do teste não o invalida.
+        limpar_expedientes()
+
+    def test_gera_aulas_respeitando_horarios_e_bloqueios(self):
+        fim = self.segunda + datetime.timedelta(days=20)
+        estatisticas = gerar_aulas_recorrentes(self.segunda, fim)
+
+        self.assertEqual(estatisticas["criadas"], 2)
+        self.assertEqual(estatisticas["bloqueadas"], 1)
+        self.assertEqual(estatisticas["fora_do_horario"], 6)
+        aulas = Aula.objects.filter(recorrencia=self.recorrencia_segunda)
+        self.assertEqual(aulas.count(), 2)
+        self.assertTrue(all(aula.data_hora_fim for aula in aulas))
+
+    def test_geracao_e_idempotente(self):
+        fim = self.segunda + datetime.timedelta(days=20)
+        gerar_aulas_recorrentes(self.segunda, fim)
+        estatisticas = gerar_aulas_recorrentes(self.segunda, fim)
+
+        self.assertEqual(estatisticas["criadas"], 0)
+        self.assertEqual(estatisticas["existentes"], 2)
+        self.assertEqual(Aula.objects.filter(studio=self.studio).count(), 2)
+
+
+class PromocaoListaEsperaTestCase(APITestCase):
+    """
+    Testes para o motor único de promoção da lista de espera.
+    """
+
+    def setUp(self):
+        self.studio = Studio.objects.create(nome="Studio Espera")
+        self.modalidade = Modalidade.objects.create(nome="Pilates Espera")
+        self.aula = criar_aula(
+            self.studio, self.modalidade, timezone.now() + datetime.timedelta(days=3), capacidade_maxima=1,
+        )
+        self.contador = 0
+
+    def _criar_aluno(self, com_credito=True):
+        self.contador += 1
+        return criar_aluno(f"8{self.contador:010d}", creditos=1 if com_credito else 0)
+
+    def _entrar_lista(self, aluno):
+        return ListaEspera.objects.create(aula=self.aula, aluno=aluno)
+
+    @override_settings(TAREFAS_WORKER_ATIVO=True)
+    def test_cancelamento_promove_proximo_com_credito(self):
+        inscrito = self._criar_aluno()
+        agendamento = AulaAluno.objects.create(aula=self.aula, aluno=inscrito)
+        sem_credito = self._criar_aluno(com_credito=False)
+        com_credito = self._criar_aluno()
+        self._entrar_lista(sem_credito)
+        self._entrar_lista(com_credito)
+
+        self.client.force_authenticate(user=inscrito.usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse("aulaaluno-detail", kwargs={"pk": agendamento.pk}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        # A requisição só libera a vaga; a promoção fica para o worker.
+        self.assertFalse(AulaAluno.objects.filter(aula=self.aula).exists())
+        executar_pendentes()
+
+        self.assertTrue(AulaAluno.objects.filter(aula=self.aula, aluno=com_credito).exists())
+        self.assertFalse(ListaEspera.objects.filter(aula=self.aula).exists())
+        self.assertEqual(Notification.objects.filter(recipient=sem_credito.usuario).count(), 1)
+        self.assertEqual(Notification.objects.filter(recipient=com_credito.usuario).count(), 1)
+        self.aula.refresh_from_db()
+        self.assertEqual(self.aula.vagas_ocupadas, 1)
+
+    def test_numero_de_queries_independe_do_tamanho_da_lista(self):
+        Aula.objects.filter(pk=self.aula.pk).update(capacidade_maxima=2)
+        for _ in range(2):
+            self._entrar_lista(self._criar_aluno())
+        with CaptureQueriesContext(connection) as lista_curta:
+            promover_lista_espera(self.aula.pk)
+
+        Aula.objects.filter(pk=self.aula.pk).update(capacidade_maxima=6)
+        for _ in range(4):
+            self._entrar_lista(self._criar_aluno())
+        with CaptureQueriesContext(connection) as lista_longa:
+            promovidos = promover_lista_espera(self.aula.pk)
+
+        self.assertEqual(len(promovidos), 4)
+        self.assertEqual(len(lista_curta), len(lista_longa))
+
+
+class LivroRazaoCreditosTestCase(APITestCase):
+    """
+    Testes para o livro-razão de créditos: um lote com várias unidades é
+    debitado a cada agendamento e creditado de volta no cancelamento.
+    """
+
+    def setUp(self):
+        self.studio = Studio.objects.create(nome="Studio Ledger")
+        self.modalidade = Modalidade.objects.create(nome="Pilates Ledger")
+        self.aluno = criar_aluno("99999999999", creditos=3)
+        self.credito = CreditoAula.objects.get(aluno=self.aluno)
+        self.aulas = [
+            criar_aula(
+                self.studio, self.modalidade, timezone.now() + datetime.timedelta(days=dia), capacidade_maxima=5,
+            )
+            for dia in (1, 2, 3)
+        ]
+        self.client.force_authenticate(user=self.aluno.usuario)
+
+    def _agendar(self, aula):
+        return self.client.post(reverse("aulaaluno-list"), data={"aula": aula.pk})
+
+    def _soma_movimentos(self):
+        return self.credito.movimentos.aggregate(total=Sum("quantidade"))["total"]
+
+    def test_lote_e_debitado_por_agendamento_ate_se_esgotar(self):
+        for aula in self.aulas[:2]:
+            self.assertEqual(self._agendar(aula).status_code, status.HTTP_201_CREATED)
+
+        self.credito.refresh_from_db()
+        self.assertEqual(self.credito.saldo, 1)
+        self.assertIsNone(self.credito.data_invalidacao)
+        self.assertEqual(self._soma_movimentos(), 1)
+        self.assertEqual(
+            self.credito.movimentos.filter(tipo=MovimentoCredito.Tipo.CONSUMO).count(), 2
+        )
+
+        self.assertEqual(self._agendar(self.aulas[2]).status_code, status.HTTP_201_CREATED)
+        self.credito.refresh_from_db()
+        self.assertEqual(self.credito.saldo, 0)
+        self.assertEqual(self.credito.status, CreditoAula.StatusCredito.UTILIZADA)
+        self.assertIsNotNone(self.credito.data_invalidacao)
+        self.assertEqual(self._soma_movimentos(), 0)
+
+    def test_lote_criado_invalidado_nasce_expirado(self):
+        lote = CreditoAula.objects.create(
+            aluno=self.aluno,
+            quantidade=2,
+            data_validade=timezone.localdate() + datetime.timedelta(days=30),
+            data_invalidacao=timezone.now(),
+        )
+
+        self.assertEqual(lote.saldo, 0)
+        self.assertEqual(lote.status, CreditoAula.StatusCredito.EXPIRADA)
+        self.assertEqual(
+            dict(lote.movimentos.values_list("tipo", "quantidade")),
+            {MovimentoCredito.Tipo.CONCESSAO: 2, MovimentoCredito.Tipo.EXPIRACAO: -2},
+        )
+
+    def test_cancelamento_estorna_para_o_mesmo_lote(self):
+        self._agendar(self.aulas[0])
+        agendamento = AulaAluno.objects.get(aluno=self.aluno, aula=self.aulas[0])
+        self.assertEqual(agendamento.credito_utilizado, self.credito)
+
+        response = self.client.delete(reverse("aulaaluno-detail", kwargs={"pk": agendamento.pk}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.credito.refresh_from_db()
+        self.assertEqual(self.credito.saldo, 3)
+        self.assertEqual(self.credito.status, CreditoAula.StatusCredito.DISPONIVEL)
+        self.assertEqual(self._soma_movimentos(), 3)
+        self.assertTrue(self.credito.movimentos.filter(tipo=MovimentoCredito.Tipo.ESTORNO).exists())
+
+    def _agendamentos_em_lote(self, aulas):
+        agendamentos = []
+        for aula in aulas:
+            inicio, fim = intervalo_da_aula(aula)
+            agendamentos.append(AulaAluno(
+                aula=aula, aluno=self.aluno, credito_utilizado=self.credito,
+                data_hora_inicio=inicio, data_hora_fim=fim,
+            ))
+        # bulk_create não dispara o signal que consome o crédito.
+        AulaAluno.objects.bulk_create(agendamentos)
+        for agendamento in agendamentos:
+            agendamento.pk = AulaAluno.objects.get(aula=agendamento.aula, aluno=self.aluno).pk
+        return agendamentos
+
+    def test_consumo_em_lote_debita_cada_agendamento_do_mesmo_lote(self):
+        consumir_creditos_em_lote(self._agendamentos_em_lote(self.aulas[:2]))
+
+        self.credito.refresh_from_db()
+        self.assertEqual(self.credito.saldo, 1)
+        self.assertIsNone(self.credito.data_invalidacao)
+        self.assertEqual(self._soma_movimentos(), self.credito.saldo)
+
+    def test_consumo_em_lote_sem_saldo_suficiente_levanta_erro(self):
+        CreditoAula.objects.filter(pk=self.credito.pk).update(saldo=1)
+        agendamentos = self._agendamentos_em_lote(self.aulas[:2])
+        with self.assertRaises(ValidationError), transaction.atomic():
+            consumir_creditos_em_lote(agendamentos)
+
+        self.credito.refresh_from_db()
+        self.assertEqual(self.credito.saldo, 1)
+        self.assertFalse(self.credito.movimentos.filter(quantidade__lt=0).exists())
+
+    def test_saldo_agrupado_por_validade(self):
+        validade_longa = timezone.now().date() + datetime.timedelta(days=60)
+        CreditoAula.objects.create(aluno=self.aluno, quantidade=4, data_validade=validade_longa)
+        CreditoAula.objects.create(
+            aluno=self.aluno, quantidade=2, data_validade=timezone.now().date() - datetime.timedelta(days=1)
+        )
+
+        saldo = saldo_creditos(self.aluno)
+        self.assertEqual(saldo["total"], 7)
+        self.assertEqual(
+            saldo["por_validade"],
+            [
+                {"data_validade": self.credito.data_validade, "saldo": 3},
+                {"data_validade": validade_longa, "saldo": 4},
+            ],
+        )
+
+
+class ChamadaAulaTestCase(APITestCase):
+    """
+    Testes para a chamada em lote (POST /aulas/{id}/chamada/).
+    """
+
+    def setUp(self):
+        self.studio = Studio.objects.create(nome="Studio Chamada")
+        self.modalidade = Modalidade.objects.create(nome="Pilates Chamada")
+        self.user_recepcionista = criar_recepcionista("10101010101", self.studio)
+        self.aula = criar_aula(
+            self.studio, self.modalidade, timezone.now() - datetime.timedelta(hours=2), capacidade_maxima=10,
+        )
+        self.alunos = [criar_aluno(f"2020202020{i}") for i in range(4)]
+        for aluno in self.alunos:
+            AulaAluno.objects.create(aula=self.aula, aluno=aluno)
+        self.url = reverse("agendamentoaula-chamada", kwargs={"pk": self.aula.pk})
+        self.client.force_authenticate(user=self.user_recepcionista)
+
+    def _presencas(self, *status_por_aluno):
+        return {
+            "presencas": [
+                {"aluno": aluno.pk, "status_presenca": status_presenca}
+                for aluno, status_presenca in status_por_aluno
+            ]
+        }
+
+    def test_chamada_grava_todos_e_concede_reposicoes(self):
+        P = AulaAluno.StatusPresenca
+        response = self.client.post(self.url, self._presencas(
+            (self.alunos[0], P.PRESENTE),
+            (self.alunos[1], P.PRESENTE),
+            (self.alunos[2], P.AUSENTE_COM_REPO),
+            (self.alunos[3], P.AUSENTE_SEM_REPO),
+        ), format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["atualizados"], 4)
+        self.assertEqual(response.data["reposicoes_concedidas"], 1)
+        self.assertEqual(
+            dict(AulaAluno.objects.filter(aula=self.aula).values_list("aluno_id", "status_presenca")),
+            {
+                self.alunos[0].pk: P.PRESENTE,
+                self.alunos[1].pk: P.PRESENTE,
+                self.alunos[2].pk: P.AUSENTE_COM_REPO,
+                self.alunos[3].pk: P.AUSENTE_SEM_REPO,
+            },
+        )
+        reposicao = CreditoAula.objects.get(agendamento_origem__aluno=self.alunos[2])
+        self.assertEqual(reposicao.saldo, 1)
+        self.assertEqual(reposicao.movimentos.count(), 1)
+
+        # Repetir a chamada não duplica a reposição; corrigir a falta a revoga.
+        self.client.post(self.url, self._presencas((self.alunos[2], P.AUSENTE_COM_REPO)), format="json")
+        self.assertEqual(CreditoAula.objects.filter(aluno=self.alunos[2]).count(), 1)
+        response = self.client.post(self.url, self._presencas((self.alunos[2], P.PRESENTE)), format="json")
+        self.assertEqual(response.data["reposicoes_revogadas"], 1)
+        reposicao.refresh_from_db()
+        self.assertEqual(reposicao.saldo, 0)
+        self.assertEqual(reposicao.status, CreditoAula.StatusCredito.EXPIRADA)
+        self.assertIsNotNone(reposicao.data_invalidacao)
+        self.assertEqual(
+            list(reposicao.movimentos.order_by("pk").values_list("tipo", flat=True)),
+            [MovimentoCredito.Tipo.CONCESSAO, MovimentoCredito.Tipo.EXPIRACAO],
+        )
+        self.assertEqual(reposicao.movimentos.aggregate(total=Sum("quantidade"))["total"], 0)
+
+        # Voltar a marcar a falta com reposição concede um novo lote.
+        response = self.client.post(self.url, self._presencas((self.alunos[2], P.AUSENTE_COM_REPO)), format="json")
+        self.assertEqual(response.data["reposicoes_concedidas"], 1)
+        self.assertEqual(
+            CreditoAula.objects.filter(aluno=self.alunos[2], status=CreditoAula.StatusCredito.DISPONIVEL).count(), 1
+        )
+
+    def test_aluno_nao_inscrito_invalida_a_chamada_inteira(self):
+        P = AulaAluno.StatusPresenca
+        outro = criar_aluno("30303030303")
+        response = self.client.post(self.url, self._presencas(
+            (self.alunos[0], P.PRESENTE),
+            (outro, P.PRESENTE),
+        ), format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(
+            AulaAluno.objects.filter(aula=self.aula, status_presenca=P.PRESENTE).exists()
+        )
+
+    def test_aluno_repetido_e_rejeitado(self):
+        P = AulaAluno.StatusPresenca
+        response = self.client.post(self.url, self._presencas(
+            (self.alunos[0], P.PRESENTE),
+            (self.alunos[0], P.AUSENTE_SEM_REPO),
+        ), format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AgendamentoSerieTestCase(APITestCase):
+    """
+    Testes para o agendamento em série (POST /aulas-alunos/serie/).
+    """
+
+    def setUp(self):
+        self.studio = Studio.objects.create(nome="Studio Serie")
+        self.modalidade = Modalidade.objects.create(nome="Pilates Serie")
+        self.recorrencia = AulaRecorrente.objects.create(
+            studio=self.studio, modalidade=self.modalidade,
+            dia_semana=0, horario=datetime.time(9, 0),
+        )
+        self.aluno = criar_aluno(
+            "40404040404", creditos=3, validade=timezone.localdate() + datetime.timedelta(days=120),
+        )
+        self.credito = CreditoAula.objects.get(aluno=self.aluno)
+        inicio = timezone.now().replace(microsecond=0) + datetime.timedelta(days=1)
+        self.aulas = [
+            criar_aula(
+                self.studio, self.modalidade, inicio + datetime.timedelta(weeks=semana),
+                recorrencia=self.recorrencia, capacidade_maxima=2,
+            )
+            for semana in range(5)
+        ]
+        self.url = reverse("aulaaluno-serie")
+        self.client.force_authenticate(user=self.aluno.usuario)
+
+    def test_serie_agenda_o_que_pode_e_reporta_falhas_por_aula(self):
+        # Semana 1 lotada; semana 2 conflita com outra aula do aluno.
+        Aula.objects.filter(pk=self.aulas[1].pk).update(vagas_ocupadas=2)
+        outra = criar_aula(
+            self.studio, self.modalidade, self.aulas[2].data_hora_inicio,
+            capacidade_maxima=5, tipo_aula=Aula.TipoAula.EXPERIMENTAL,
+        )
+        AulaAluno.objects.create(aula=outra, aluno=self.aluno)
+
+        response = self.client.post(self.url, {"recorrencia": self.recorrencia.pk}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        status_por_aula = {r["aula"]: r["status"] for r in response.data["resultados"]}
+        self.assertEqual(status_por_aula, {
+            self.aulas[0].pk: "AGENDADO",
+            self.aulas[1].pk: "FALHOU",
+            self.aulas[2].pk: "FALHOU",
+            self.aulas[3].pk: "AGENDADO",
+            self.aulas[4].pk: "AGENDADO",
+        })
+        self.credito.refresh_from_db()
+        self.assertEqual(self.credito.saldo, 0)
+        self.assertIsNotNone(self.credito.data_invalidacao)
+        self.assertEqual(self.credito.movimentos.filter(quantidade=-1).count(), 3)
+        self.assertEqual(
+            list(Aula.objects.filter(pk__in=[a.pk for a in self.aulas]).order_by("data_hora_inicio").values_list("vagas_ocupadas", flat=True)),
+            [1, 2, 0, 1, 1],
+        )
+
+    def test_falta_de_credito_e_reportada_por_aula(self):
+        response = self.client.post(self.url, {"aulas": [a.pk for a in self.aulas]}, format="json")
+        self.assertEqual(response.data["agendados"], 3)
+        self.assertEqual(
+            [r["motivo"] is None for r in response.data["resultados"]],
+            [True, True, True, False, False],
+        )
+
+    def test_recepcionista_so_agenda_aulas_dos_seus_estudios(self):
+        outro_studio = Studio.objects.create(nome="Studio Serie B")
+        ids = [aula.pk for aula in self.aulas[:2]]
+
+        self.client.force_authenticate(user=criar_recepcionista("40404040405", outro_studio))
+        response = self.client.post(self.url, {"aluno": self.aluno.pk, "aulas": ids}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("aulas", response.data)
+        self.assertFalse(AulaAluno.objects.filter(aluno=self.aluno).exists())
+
+        self.client.force_authenticate(user=criar_recepcionista("40404040406", self.studio))
+        response = self.client.post(self.url, {"aluno": self.aluno.pk, "aulas": ids}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(response.data["agendados"], 2)
+
+    def test_numero_de_consultas_independe_do_tamanho_da_serie(self):
+        CreditoAula.objects.filter(pk=self.credito.pk).update(quantidade=10, saldo=10)
+        with CaptureQueriesContext(connection) as serie_curta:
+            agendar_serie(self.aluno, [self.aulas[0].pk])
+        with CaptureQueriesContext(connection) as serie_longa:
+            agendar_serie(self.aluno, [a.pk for a in self.aulas[1:]])
+        self.assertEqual(len(serie_curta), len(serie_longa))
+
+
+class BuscaDisponibilidadeTestCase(APITestCase):
+    """
+    Testes para a busca de vagas (GET /aulas/disponiveis/).
+    """
+
+    def setUp(self):
+        self.studio = Studio.objects.create(nome="Studio Busca")
+        self.outro_studio = Studio.objects.create(nome="Studio Outro")
+        self.modalidade = Modalidade.objects.create(nome="Pilates Busca")
+        self.user_aluno = criar_aluno("50505050505").usuario
+        self.amanha = timezone.localdate() + datetime.timedelta(days=1)
+
+        def aula(studio, hora, capacidade=3, ocupadas=0, dias=1):
+            data = timezone.localdate() + datetime.timedelta(days=dias)
+            nova = criar_aula(studio, self.modalidade, no_horario(data, hora), capacidade_maxima=capacidade)
+            Aula.objects.filter(pk=nova.pk).update(vagas_ocupadas=ocupadas)
+            return nova
+
+        self.manha = aula(self.studio, 8, ocupadas=1)
+        self.noite = aula(self.studio, 19)
+        self.lotada = aula(self.studio, 10, capacidade=2, ocupadas=2)
+        self.outro = aula(self.outro_studio, 9)
+        self.longe = aula(self.studio, 9, dias=20)
+        self.url = reverse("agendamentoaula-disponiveis")
+        self.client.force_authenticate(user=self.user_aluno)
+
+    def test_retorna_apenas_aulas_com_vaga_no_periodo(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [aula["id"] for aula in response.data],
+            [self.manha.pk, self.outro.pk, self.noite.pk],
+        )
+        self.assertEqual(response.data[0]["vagas_livres"], 2)
+        self.assertEqual(response.data[0]["studio_nome"], "Studio Busca")
+        self.assertNotIn("studio", response.data[0])
+
+    def test_filtra_por_estudio_e_faixa_de_horario(self):
+        response = self.client.get(self.url, {
+            "studio": f"{self.studio.pk}",
+            "hora_inicio": "07:00",
+            "hora_fim": "12:00",
+        })
+        self.assertEqual([aula["id"] for aula in response.data], [self.manha.pk])
+
+        response = self.client.get(self.url, {"studio": f"{self.studio.pk},{self.outro_studio.pk}", "hora_fim": "12:00"})
+        self.assertEqual([aula["id"] for aula in response.data], [self.manha.pk, self.outro.pk])
+
+    def test_periodo_invalido(self):
+        response = self.client.get(self.url, {"data_inicio": "2030-01-10", "data_fim": "2030-01-01"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FiltroPeriodoTestCase(APITestCase):
+    """
+    Testes para o filtro de período sargável (intervalo semiaberto de datetimes).
+    """
+
+    def setUp(self):
+        self.studio = Studio.objects.create(nome="Studio Periodo")
+        self.modalidade = Modalidade.objects.create(nome="Pilates Periodo")
+        self.dia = datetime.date(2030, 3, 4)
+
+    def _aula(self, data, hora, minuto=0):
+        return criar_aula(self.studio, self.modalidade, no_horario(data, hora, minuto))
+
+    def test_limites_seguem_o_dia_local(self):
+        ultima_do_dia = self._aula(self.dia, 23, 30)
+        primeira_do_dia = self._aula(self.dia, 0, 0)
+        self._aula(self.dia + datetime.timedelta(days=1), 0, 0)
+        self._aula(self.dia - datetime.timedelta(days=1), 23, 59)
+
+        queryset = filtrar_por_periodo(Aula.objects.all(), self.dia, self.dia)
+        self.assertEqual(
+            set(queryset.values_list("pk", flat=True)), {primeira_do_dia.pk, ultima_do_dia.pk}
+        )
+        # A coluna é comparada diretamente, sem conversão para DATE().
+        self.assertNotIn("date", str(queryset.query).lower().replace("data_hora", ""))
+
+    def test_listagem_de_aulas_usa_o_mesmo_periodo(self):
+        user = criar_usuario("60606060606")
+        aula = self._aula(self.dia, 23, 30)
+        self._aula(self.dia + datetime.timedelta(days=1), 0, 0)
+        self.client.force_authenticate(user=user)
+
+        response = self.client.get(
+            reverse("agendamentoaula-list"),
+            {"data_inicio": self.dia.isoformat(), "data_fim": self.dia.isoformat()},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in response.data["results"]], [aula.pk])
+
+    def test_listagem_de_aulas_filtra_por_studio(self):
+        user = criar_usuario("60606060607")
+        aula = self._aula(self.dia, 9)
+        outro_studio = Studio.objects.create(nome="Studio Periodo 2")
+        criar_aula(outro_studio, self.modalidade, aula.data_hora_inicio)
+        self.client.force_authenticate(user=user)
+
+        response = self.client.get(reverse("agendamentoaula-list"), {"studio": self.studio.pk})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in response.data["results"]], [aula.pk])
+
+    def test_agendamentos_do_aluno_filtram_por_periodo(self):
+        aluno = criar_aluno("60606060608")
+        user = aluno.usuario
+        dentro = AulaAluno.objects.create(aula=self._aula(self.dia, 23, 30), aluno=aluno)
+        AulaAluno.objects.create(aula=self._aula(self.dia + datetime.timedelta(days=1), 0, 0), aluno=aluno)
+        self.client.force_authenticate(user=user)
+
+        response = self.client.get(
+            reverse("aulaaluno-list"),
+            {"data_inicio": self.dia.isoformat(), "data_fim": self.dia.isoformat()},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in response.data["results"]], [dentro.pk])
+
+        response = self.client.get(reverse("aulaaluno-list"), {"data_inicio": "04/03/2030"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PaginacaoCursorTestCase(APITestCase):
+    """
+    Testes para a paginação por cursor da listagem de aulas.
+    """
+
+    def setUp(self):
+        self.studio = Studio.objects.create(nome="Studio Paginação")
+        self.modalidade = Modalidade.objects.create(nome="Pilates Paginação")
+        self.user = criar_usuario("70707070707")
+        self.client.force_authenticate(user=self.user)
+        inicio = timezone.now() + datetime.timedelta(days=1)
+        # Horários repetidos: o desempate por id precisa manter a ordem estável.
+        Aula.objects.bulk_create([
+            Aula(
+                studio=self.studio,
+                modalidade=self.modalidade,
+                data_hora_inicio=inicio + datetime.timedelta(hours=i // 3),
+                capacidade_maxima=5,
+            )
+            for i in range(25)
+        ])
+
+    def test_percorre_todas_as_paginas_sem_repetir_nem_pular(self):
+        url = reverse("agendamentoaula-list")
+        params = {"page_size": 7}
+        vistos = []
+        paginas = 0
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 7)
+            vistos.extend(response.data["results"])
+            url, params = response.data["next"], None
+            paginas += 1
+
+        self.assertEqual(paginas, 4)
+        esperado = list(
+            Aula.objects.order_by("data_hora_inicio", "id").values_list("id", flat=True)
+        )
+        self.assertEqual([item["id"] for item in vistos], esperado)
+
+    def test_page_size_respeita_o_maximo(self):
+        response = self.client.get(reverse("agendamentoaula-list"), {"page_size": 10000})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 25)
+        self.assertIsNone(response.data["next"])
+
+
+class CalendarioSemanalTestCase(APITestCase):
+    """
+    Testes para o calendário semanal em projeção colunar e seu cache.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.studio = Studio.objects.create(nome="Studio Calendário")
+        self.modalidade = Modalidade.objects.create(nome="Pilates Calendário")
+        self.instrutor = criar_colaborador("80808080808", first_name="Ana", last_name="Souza")
+        self.aluno = criar_aluno("80808080809")
+        self.client.force_authenticate(user=self.aluno.usuario)
+
+        # Semana ISO 2030-W10: segunda-feira, 4 de março de 2030.
+        self.segunda = datetime.date(2030, 3, 4)
+        self.aula = self._aula(self.segunda + datetime.timedelta(days=1), 9, 30)
+        self._aula(self.segunda + datetime.timedelta(days=7), 9, 30)  # semana seguinte
+        self.url = reverse("agendamentoaula-calendario")
+        self.params = {"studio": self.studio.pk, "semana": "2030-W10"}
+
+    def _aula(self, data, hora, minuto=0):
+        return criar_aula(
+            self.studio,
+            self.modalidade,
+            no_horario(data, hora, minuto),
+            instrutor_principal=self.instrutor,
+            duracao_minutos=50,
+            capacidade_maxima=4,
+        )
+
+    def test_retorna_colunas_e_tabelas_de_apoio(self):
+        response = self.client.get(self.url, self.params)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        aulas = response.data["aulas"]
+        self.assertEqual(aulas["id"], [self.aula.pk])
+        self.assertEqual(aulas["inicio_minutos"], [24 * 60 + 9 * 60 + 30])
+        self.assertEqual(aulas["duracao_minutos"], [50])
+        self.assertEqual(aulas["instrutor"], [self.instrutor.pk])
+        self.assertEqual(aulas["capacidade"], [4])
+        self.assertEqual(aulas["vagas_ocupadas"], [0])
+        self.assertEqual(response.data["modalidades"], {self.modalidade.pk: "Pilates Calendário"})
+        self.assertEqual(response.data["instrutores"], {self.instrutor.pk: "Ana Souza"})
+        self.assertEqual(response.data["semana"], "2030-W10")
+
+    def test_segunda_chamada_sai_do_cache(self):
+        self.client.get(self.url, self.params)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(self.url, self.params)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any("agendamentos_aula" in q["sql"] for q in consultas.captured_queries))
+
+    def test_inscricao_invalida_o_cache(self):
+        self.client.get(self.url, self.params)
+        with self.captureOnCommitCallbacks(execute=True):
+            AulaAluno.objects.create(aula=self.aula, aluno=self.aluno)
+
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.data["aulas"]["vagas_ocupadas"], [1])
+
+    def test_aula_movida_para_outra_semana_sai_do_calendario(self):
+        self.client.get(self.url, self.params)
+        self.aula.data_hora_inicio += datetime.timedelta(days=14)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.aula.save()
+
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.data["aulas"]["id"], [])
+
+    def test_semana_invalida(self):
+        response = self.client.get(self.url, {"studio": self.studio.pk, "semana": "2030-W60"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FeedCalendarioTestCase(APITestCase):
+    """
+    Testes para os feeds iCalendar (.ics) com token, streaming e respostas 304.
+    """
+
+    def setUp(self):
+        self.studio = Studio.objects.create(nome="Studio Feed", endereco="Rua das Flores, 10")
+        self.modalidade = Modalidade.objects.create(nome="Pilates Feed")
+        self.instrutor = criar_colaborador("90909090901", first_name="Bruno")
+        self.aluno = criar_aluno("90909090902")
+        self.aula = criar_aula(
+            self.studio, self.modalidade, timezone.now() + datetime.timedelta(days=2),
+            instrutor_principal=self.instrutor,
+        )
+        self.agendamento = AulaAluno.objects.create(aula=self.aula, aluno=self.aluno)
+
+        self.client.force_authenticate(user=self.aluno.usuario)
+        urls = self.client.get(reverse("token-calendario")).data
+        self.client.force_authenticate(user=None)
+        self.url_aluno = urls["agendamentos"]
+
+    def _conteudo(self, response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_feed_do_aluno_transmite_o_calendario(self):
+        response = self.client.get(self.url_aluno)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response["Content-Type"].startswith("text/calendar"))
+        conteudo = self._conteudo(response)
+        self.assertTrue(conteudo.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertIn(f"UID:agendamento-{self.agendamento.pk}@", conteudo)
+        self.assertIn("SUMMARY:Pilates Feed - Studio Feed", conteudo)
+        self.assertIn("LOCATION:Rua das Flores\\, 10", conteudo)
+        self.assertTrue(conteudo.endswith("END:VCALENDAR\r\n"))
+
+    def test_etag_repetido_recebe_304_ate_o_feed_mudar(self):
+        etag = self.client.get(self.url_aluno)["ETag"]
+
+        response = self.client.get(self.url_aluno, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.agendamento.delete()
+        response = self.client.get(self.url_aluno, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("BEGIN:VEVENT", self._conteudo(response))
+
+    def test_feed_do_instrutor_marca_substituicoes(self):
+        self.client.force_authenticate(user=self.instrutor.usuario)
+        url = self.client.get(reverse("token-calendario")).data["instrutor"]
+        self.client.force_authenticate(user=None)
+        outro = criar_colaborador("90909090903")
+        substituicao = Aula.objects.create(
+            studio=self.studio,
+            modalidade=self.modalidade,
+            instrutor_principal=outro,
+            instrutor_substituto=self.instrutor,
+            data_hora_inicio=timezone.now() + datetime.timedelta(days=3),
+        )
+
+        conteudo = self._conteudo(self.client.get(url))
+        self.assertIn(f"UID:aula-{self.aula.pk}@", conteudo)
+        self.assertIn(f"UID:aula-{substituicao.pk}@", conteudo)
+        self.assertIn("SUMMARY:Pilates Feed - Studio Feed (substituição)", conteudo)
+
+    def test_novo_token_invalida_a_url_antiga(self):
+        self.client.force_authenticate(user=self.aluno.usuario)
+        nova_url = self.client.post(reverse("token-calendario")).data["agendamentos"]
+        self.client.force_authenticate(user=None)
+
+        self.assertEqual(self.client.get(self.url_aluno).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(nova_url).status_code, status.HTTP_200_OK)
+
+
+class ExpedienteStudioTestCase(APITestCase):
+    """
+    Testes para a validação de aulas e agendamentos contra o expediente do estúdio.
+    """
+
+    def setUp(self):
+        limpar_expedientes()
+        self.studio = Studio.objects.create(nome="Studio Expediente")
+        self.modalidade = Modalidade.objects.create(nome="Pilates Expediente")
+        self.dia = timezone.localdate() + datetime.timedelta(days=2)
+        HorarioTrabalho.objects.create(
+            studio=self.studio, dia_semana=self.dia.weekday(),
+            hora_inicio=datetime.time(8, 0), hora_fim=datetime.time(12, 0),
+        )
+
+    def tearDown(self):
+        limpar_expedientes()
+
+    def _inicio(self, hora, dia=None):
+        return no_horario(dia or self.dia, hora)
+
+    def _dados_aula(self, hora):
+        return {
+            "studio": self.studio.pk,
+            "modalidade": self.modalidade.pk,
+            "data_hora_inicio": self._inicio(hora).isoformat(),
+            "duracao_minutos": 60,
+        }
+
+    def test_criacao_de_aula_respeita_o_horario(self):
+        self.assertTrue(AulaWriteSerializer(data=self._dados_aula(9)).is_valid())
+        # 11:30 + 60 min termina depois do fechamento (12:00).
+        dados = self._dados_aula(11)
+        dados["duracao_minutos"] = 90
+        serializer = AulaWriteSerializer(data=dados)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("data_hora_inicio", serializer.errors)
+        # Dia sem HorarioTrabalho: o estúdio não abre.
+        dados = self._dados_aula(9)
+        dados["data_hora_inicio"] = self._inicio(9, self.dia + datetime.timedelta(days=1)).isoformat()
+        self.assertFalse(AulaWriteSerializer(data=dados).is_valid())
+
+    def test_expediente_fica_em_cache_ate_ser_alterado(self):
+        inicio = self._inicio(9)
+        fim = inicio + datetime.timedelta(hours=1)
+        self.assertIsNone(motivo_fora_do_expediente(self.studio.pk, inicio, fim))
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                motivo_fora_do_expediente(self.studio.pk, inicio, fim)
+
+        BloqueioAgenda.objects.create(studio=self.studio, data=self.dia, descricao="Feriado")
+        self.assertIsNotNone(motivo_fora_do_expediente(self.studio.pk, inicio, fim))
+
+    def test_busca_e_agendamento_ignoram_aulas_fora_do_expediente(self):
+        aluno = criar_aluno("91919191919")
+        usuario = aluno.usuario
+        dentro = criar_aula(
+            self.studio, self.modalidade, self._inicio(9), tipo_aula=Aula.TipoAula.EXPERIMENTAL,
+        )
+        # Criada antes de o estúdio passar a fechar neste dia.
+        bloqueada = criar_aula(
+            self.studio, self.modalidade, self._inicio(9, self.dia + datetime.timedelta(days=7)),
+            tipo_aula=Aula.TipoAula.EXPERIMENTAL,
+        )
+        BloqueioAgenda.objects.create(
+            studio=self.studio, data=self.dia + datetime.timedelta(days=7), descricao="Feriado"
+        )
+
+        self.client.force_authenticate(user=usuario)
+        response = self.client.get(
+            reverse("agendamentoaula-disponiveis"),
+            {"data_inicio": self.dia.isoformat(), "data_fim": (self.dia + datetime.timedelta(days=7)).isoformat()},
+        )
+        self.assertEqual([aula["id"] for aula in response.data], [dentro.pk])
+
+        resultado = {item["aula"]: item["status"] for item in agendar_serie(aluno, [dentro.pk, bloqueada.pk])}
+        self.assertEqual(resultado, {dentro.pk: "AGENDADO", bloqueada.pk: "FALHOU"})
+
+
+class ConflitoInstrutorTestCase(APITestCase):
+    """
+    Testes para a detecção de conflitos de horário de instrutores.
+    """
+
+    def setUp(self):
+        self.studio = Studio.objects.create(nome="Studio Instrutor A")
+        self.outro_studio = Studio.objects.create(nome="Studio Instrutor B")
+        self.modalidade = Modalidade.objects.create(nome="Pilates Instrutor")
+        self.instrutor = criar_colaborador("92929292929")
+        self.segunda = datetime.date(2030, 1, 7)
+        self.aula = criar_aula(
+            self.studio, self.modalidade, no_horario(self.segunda, 9), instrutor_principal=self.instrutor,
+        )
+
+    def tearDown(self):
+        limpar_expedientes()
+
+    def _dados(self, hora, minuto=0, **extra):
+        dados = {
+            "studio": self.outro_studio.pk,
+            "modalidade": self.modalidade.pk,
+            "data_hora_inicio": no_horario(self.segunda, hora, minuto).isoformat(),
+            "duracao_minutos": 60,
+        }
+        dados.update(extra)
+        return dados
+
+    def test_rejeita_sobreposicao_mesmo_em_outro_estudio(self):
+        serializer = AulaWriteSerializer(data=self._dados(9, 30, instrutor_substituto=self.instrutor.pk))
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("non_field_errors", serializer.errors)
+
+        # Começa exatamente quando a outra termina: não há sobreposição.
+        self.assertTrue(AulaWriteSerializer(data=self._dados(10, instrutor_principal=self.instrutor.pk)).is_valid())
+
+    def test_edicao_nao_conflita_com_a_propria_aula(self):
+        serializer = AulaWriteSerializer(
+            self.aula,
+            data={"data_hora_inicio": no_horario(self.segunda, 9, 15).isoformat()},
+            partial=True,
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_gerador_valida_a_semana_inteira_em_lote(self):
+        for studio in (self.studio, self.outro_studio):
+            for dia in range(5):
+                HorarioTrabalho.objects.create(
+                    studio=studio, dia_semana=dia,
+                    hora_inicio=datetime.time(7, 0), hora_fim=datetime.time(21, 0),
+                )
+        # Segunda 09:00 já está ocupada pela aula avulsa.
+        AulaRecorrente.objects.create(
+            studio=self.outro_studio, modalidade=self.modalidade, instrutor_principal=self.instrutor,
+            dia_semana=0, horario=datetime.time(9, 0),
+        )
+        # Duas grades do mesmo instrutor na terça às 18:00: só a primeira entra.
+        for studio in (self.studio, self.outro_studio):
+            AulaRecorrente.objects.create(
+                studio=studio, modalidade=self.modalidade, instrutor_substituto=self.instrutor,
+                dia_semana=1, horario=datetime.time(18, 0),
+            )
+
+        estatisticas = gerar_aulas_recorrentes(self.segunda, self.segunda + datetime.timedelta(days=6))
+
+        self.assertEqual(estatisticas["criadas"], 1)
+        self.assertEqual(estatisticas["conflito_instrutor"], 2)
+        self.assertEqual(
+            Aula.objects.filter(instrutor_substituto=self.instrutor).count(), 1
+        )
+
+
+class CancelamentoLoteTestCase(APITestCase):
+    """
+    Testes para o cancelamento de aulas em lote (POST /aulas/cancelar-em-lote/).
+    """
+
+    def setUp(self):
+        self.studio = Studio.objects.create(nome="Studio Cancelamento")
+        self.modalidade = Modalidade.objects.create(nome="Pilates Cancelamento")
+        self.user_recepcionista = criar_recepcionista("93939393930", self.studio)
+
+        self.feriado = timezone.localdate() + datetime.timedelta(days=5)
+        self.aulas = [
+            criar_aula(self.studio, self.modalidade, no_horario(self.feriado, hora), capacidade_maxima=5)
+            for hora in (8, 10)
+        ]
+        self.outro_dia = criar_aula(
+            self.studio, self.modalidade, no_horario(self.feriado + datetime.timedelta(days=1), 8),
+        )
+
+        self.alunos = []
+        for i in range(3):
+            aluno = criar_aluno(
+                f"9393939393{i + 1}", creditos=2, validade=self.feriado + datetime.timedelta(days=30),
+            )
+            credito = CreditoAula.objects.get(aluno=aluno)
+            # Cada aluno usa o mesmo lote nas duas aulas do feriado.
+            for aula in self.aulas:
+                agendamento = AulaAluno.objects.create(aula=aula, aluno=aluno, credito_utilizado=credito)
+                consumir_credito(credito, agendamento)
+            self.alunos.append(aluno)
+        self.url = reverse("agendamentoaula-cancelar-em-lote")
+        self.client.force_authenticate(user=self.user_recepcionista)
+
+    def test_cancela_periodo_estorna_e_notifica_em_lote(self):
+        # Número fixo de consultas: nada é feito por aula nem por inscrição.
+        with self.assertNumQueries(18):
+            response = self.client.post(self.url, {
+                "data_inicio": self.feriado.isoformat(),
+                "data_fim": self.feriado.isoformat(),
+                "motivo": "Feriado",
+            }, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            "aulas_canceladas": 2,
+            "agendamentos_cancelados": 6,
+            "creditos_estornados": 6,
+            "alunos_notificados": 3,
+        })
+        self.assertFalse(Aula.objects.filter(pk__in=[aula.pk for aula in self.aulas]).exists())
+        self.assertTrue(Aula.objects.filter(pk=self.outro_dia.pk).exists())
+        for aluno in self.alunos:
+            credito = CreditoAula.objects.get(aluno=aluno)
+            self.assertEqual(credito.saldo, 2)
+            self.assertIsNone(credito.data_invalidacao)
+            self.assertEqual(sum(credito.movimentos.values_list("quantidade", flat=True)), 2)
+            self.assertEqual(Notification.objects.filter(recipient=aluno.usuario).count(), 2)
+        self.assertIn("Motivo: Feriado", Notification.objects.first().message)
+
+    def test_exige_aulas_ou_periodo(self):
+        response = self.client.post(self.url, {"motivo": "Nada selecionado"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ExpiracaoCreditosTestCase(APITestCase):
+    """
+    Testes para a varredura de créditos e reposições vencidos (manage.py expirar_creditos).
+    """
+
+    def setUp(self):
+        self.hoje = timezone.localdate()
+        self.studio = Studio.objects.create(nome="Studio Expiração")
+        self.aluno = criar_aluno("94949494941")
+        aula = criar_aula(
+            self.studio,
+            Modalidade.objects.create(nome="Pilates Expiração"),
+            timezone.now() - datetime.timedelta(days=60),
+        )
+        origem = AulaAluno.objects.create(aula=aula, aluno=self.aluno)
+
+        self.vencidos = [
+            CreditoAula.objects.create(
+                aluno=self.aluno, quantidade=3, agendamento_origem=origem,
+                data_validade=self.hoje - datetime.timedelta(days=dias),
+            )
+            for dias in (1, 2, 3)
+        ]
+        self.sem_studio = CreditoAula.objects.create(
+            aluno=self.aluno, quantidade=2, data_validade=self.hoje - datetime.timedelta(days=1),
+        )
+        self.valido = CreditoAula.objects.create(aluno=self.aluno, quantidade=1, data_validade=self.hoje)
+
+        self.reposicao_vencida = Reposicao.objects.create(
+            aluno=self.aluno, agendamento_origem=origem, data_expiracao=self.hoje - datetime.timedelta(days=1),
+        )
+        self.reposicao_valida = Reposicao.objects.create(
+            aluno=self.aluno, agendamento_origem=origem, data_expiracao=self.hoje,
+        )
+
+    def test_expira_em_lotes_e_agrupa_por_studio(self):
+        estatisticas = expirar_vencidos(tamanho_lote=2)
+
+        self.assertEqual(estatisticas, {
+            self.studio.pk: {'creditos': 3, 'saldo_expirado': 9, 'reposicoes': 1},
+            None: {'creditos': 1, 'saldo_expirado': 2, 'reposicoes': 0},
+        })
+        for credito in [*self.vencidos, self.sem_studio]:
+            credito.refresh_from_db()
+            self.assertEqual(credito.saldo, 0)
+            self.assertEqual(credito.status, CreditoAula.StatusCredito.EXPIRADA)
+            self.assertIsNotNone(credito.data_invalidacao)
+            self.assertEqual(sum(credito.movimentos.values_list("quantidade", flat=True)), 0)
+        self.valido.refresh_from_db()
+        self.assertEqual(self.valido.saldo, 1)
+        self.assertEqual(self.valido.status, CreditoAula.StatusCredito.DISPONIVEL)
+        self.assertIsNone(self.valido.data_invalidacao)
+
+        self.reposicao_vencida.refresh_from_db()
+        self.reposicao_valida.refresh_from_db()
+        self.assertEqual(self.reposicao_vencida.status, Reposicao.StatusReposicao.EXPIRADA)
+        self.assertEqual(self.reposicao_valida.status, Reposicao.StatusReposicao.DISPONIVEL)
+
+        # Uma nova varredura não encontra mais nada para expirar.
+        self.assertEqual(expirar_vencidos(), {})
+
+    def test_comando_relata_por_studio(self):
+        saida = StringIO()
+        call_command("expirar_creditos", "--lote", "1", stdout=saida)
+
+        self.assertIn("Studio Expiração: 3 lote(s) de crédito (9 crédito(s)), 1 reposição(ões).", saida.getvalue())
+        self.assertIn("Sem estúdio: 1 lote(s) de crédito (2 crédito(s)), 0 reposição(ões).", saida.getvalue())
+        self.assertIn("4 lote(s) de crédito e 1 reposição(ões) expirados.", saida.getvalue())
+
+
+class IdempotenciaAgendamentoTestCase(APITestCase):
+    """
+    Testes para as repetições de agendamento e cancelamento com o cabeçalho Idempotency-Key.
+    """
+
+    def setUp(self):
+        self.studio = Studio.objects.create(nome="Studio Idempotência")
+        self.aluno = criar_aluno("95959595951", creditos=2)
+        self.aula = criar_aula(
+            self.studio, Modalidade.objects.create(nome="Pilates Idempotência"), capacidade_maxima=3,
+        )
+        self.credito = CreditoAula.objects.get(aluno=self.aluno)
+        self.url = reverse("aulaaluno-list")
+        self.client.force_authenticate(user=self.aluno.usuario)
+
+    def test_repeticao_devolve_a_resposta_gravada(self):
+        primeira = self.client.post(self.url, {"aula": self.aula.pk}, format="json", HTTP_IDEMPOTENCY_KEY="agendar-1")
+        self.assertEqual(primeira.status_code, status.HTTP_201_CREATED)
+
+        # A repetição é uma única consulta pelo índice (usuario, chave).
+        with self.assertNumQueries(1):
+            repetida = self.client.post(self.url, {"aula": self.aula.pk}, format="json", HTTP_IDEMPOTENCY_KEY="agendar-1")
+
+        self.assertEqual(repetida.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(repetida.data, primeira.data)
+        self.assertEqual(repetida["Idempotent-Replayed"], "true")
+        self.assertEqual(AulaAluno.objects.filter(aula=self.aula, aluno=self.aluno).count(), 1)
+        self.credito.refresh_from_db()
+        self.assertEqual(self.credito.saldo, 1)
+
+    def test_chave_reutilizada_em_outra_requisicao(self):
+        self.client.post(self.url, {"aula": self.aula.pk}, format="json", HTTP_IDEMPOTENCY_KEY="agendar-2")
+        outra_aula = criar_aula(
+            self.studio, self.aula.modalidade, self.aula.data_hora_inicio + datetime.timedelta(hours=3),
+        )
+
+        response = self.client.post(self.url, {"aula": outra_aula.pk}, format="json", HTTP_IDEMPOTENCY_KEY="agendar-2")
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertFalse(AulaAluno.objects.filter(aula=outra_aula).exists())
+
+    def test_erro_libera_a_chave(self):
+        self.credito.delete()
+        response = self.client.post(self.url, {"aula": self.aula.pk}, format="json", HTTP_IDEMPOTENCY_KEY="agendar-3")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(RespostaIdempotente.objects.filter(chave="agendar-3").exists())
+
+    def test_cancelamento_repetido(self):
+        agendamento = AulaAluno.objects.create(aula=self.aula, aluno=self.aluno)
+        url = reverse("aulaaluno-detail", args=[agendamento.pk])
+
+        primeira = self.client.delete(url, HTTP_IDEMPOTENCY_KEY="cancelar-1")
+        repetida = self.client.delete(url, HTTP_IDEMPOTENCY_KEY="cancelar-1")
+
+        self.assertEqual(primeira.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(repetida.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_lista_espera_gravada_uma_vez_e_so_apos_a_validacao(self):
+        Aula.objects.filter(pk=self.aula.pk).update(capacidade_maxima=0)
+        dados = {"aula": self.aula.pk, "entrar_lista_espera": True}
+
+        # A validação não tem efeitos colaterais.
+        serializer = AgendamentoAlunoSerializer(data=dados, context={"request": SimpleNamespace(user=self.aluno.usuario)})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertFalse(ListaEspera.objects.filter(aula=self.aula).exists())
+
+        primeira = self.client.post(self.url, dados, format="json", HTTP_IDEMPOTENCY_KEY="espera-1")
+        repetida = self.client.post(self.url, dados, format="json", HTTP_IDEMPOTENCY_KEY="espera-1")
+
+        self.assertEqual(primeira.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(repetida.data, primeira.data)
+        self.assertEqual(ListaEspera.objects.filter(aula=self.aula, aluno=self.aluno).count(), 1)
+
+
+class PosicaoListaEsperaTestCase(APITestCase):
+    """
+    Testes para a posição do aluno nas listas de espera (GET /listas-espera/minhas-posicoes/).
+    """
+
+    def setUp(self):
+        self.studio = Studio.objects.create(nome="Studio Fila")
+        self.modalidade = Modalidade.objects.create(nome="Pilates Fila")
+        self.aula = criar_aula(
+            self.studio, self.modalidade, timezone.now() + datetime.timedelta(days=2), capacidade_maxima=1,
+        )
+        # Histórico do horário: em média 2 desistências por aula.
+        for semanas, cancelamentos in ((1, 1), (2, 3)):
+            passada = criar_aula(self.studio, self.modalidade, timezone.now() - datetime.timedelta(weeks=semanas))
+            Aula.objects.filter(pk=passada.pk).update(cancelamentos=cancelamentos)
+
+        self.alunos = []
+        for i in range(3):
+            aluno = criar_aluno(f"9696969696{i + 1}")
+            entrada = ListaEspera.objects.create(aula=self.aula, aluno=aluno)
+            ListaEspera.objects.filter(pk=entrada.pk).update(
+                data_inscricao=timezone.now() - datetime.timedelta(hours=10 - i)
+            )
+            self.alunos.append(aluno)
+        AulaAluno.objects.create(aula=self.aula, aluno=criar_aluno("96969696969"))
+        self.url = reverse("listaespera-minhas-posicoes")
+
+    def test_posicao_e_probabilidade(self):
+        self.client.force_authenticate(user=self.alunos[1].usuario)
+
+        # Posições (ROW_NUMBER), aulas e histórico de cancelamentos.
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        posicao = response.data[0]
+        self.assertEqual(posicao["aula"], self.aula.pk)
+        self.assertEqual(posicao["posicao"], 2)
+        self.assertEqual(posicao["total_na_fila"], 3)
+        self.assertEqual(posicao["media_cancelamentos"], 2.0)
+        # P(ao menos 2 desistências) com média 2: 1 - 3e^-2.
+        self.assertAlmostEqual(posicao["probabilidade_promocao"], 0.594, places=3)
+
+    def test_filas_recorrentes_e_avulsas_usam_uma_consulta_de_historico(self):
+        recorrencia = AulaRecorrente.objects.create(
+            studio=self.studio, modalidade=self.modalidade,
+            dia_semana=0, horario=datetime.time(9, 0),
+        )
+        for semanas, cancelamentos in ((1, 0), (2, 1)):
+            passada = criar_aula(
+                self.studio, self.modalidade, timezone.now() - datetime.timedelta(weeks=semanas),
+                recorrencia=recorrencia,
+            )
+            Aula.objects.filter(pk=passada.pk).update(cancelamentos=cancelamentos)
+        recorrente = criar_aula(
+            self.studio, self.modalidade, timezone.now() + datetime.timedelta(days=3),
+            capacidade_maxima=1, recorrencia=recorrencia,
+        )
+        AulaAluno.objects.create(aula=recorrente, aluno=criar_aluno("96969696968"))
+        ListaEspera.objects.create(aula=recorrente, aluno=self.alunos[1])
+        self.client.force_authenticate(user=self.alunos[1].usuario)
+
+        # Posições, aulas e um único agregado para os dois tipos de horário.
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+
+        medias = {posicao["aula"]: posicao["media_cancelamentos"] for posicao in response.data}
+        self.assertEqual(medias, {self.aula.pk: 2.0, recorrente.pk: 0.5})
+
+    def test_cancelamento_antes_da_aula_entra_no_historico(self):
+        AulaAluno.objects.get(aula=self.aula).delete()
+
+        self.aula.refresh_from_db()
+        self.assertEqual(self.aula.cancelamentos, 1)
+        self.assertEqual(self.aula.vagas_ocupadas, 0)
+
+    def test_exige_perfil_de_aluno(self):
+        self.client.force_authenticate(user=criar_usuario("96969696960"))
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
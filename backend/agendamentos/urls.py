@@ -6,9 +6,12 @@ from .views import (
     BloqueioAgendaViewSet,
     ModalidadeViewSet,
     AulaViewSet,
+    AulaRecorrenteViewSet,
     AulaAlunoViewSet,
     ReposicaoViewSet,
     ListaEsperaViewSet,
+    TokenCalendarioView,
+    feed_calendario,
 )
 
 router = DefaultRouter()
@@ -16,10 +19,13 @@ router.register(r'horarios-trabalho', HorarioTrabalhoViewSet, basename='horariot
 router.register(r'bloqueios-agenda', BloqueioAgendaViewSet, basename='bloqueioagenda')
 router.register(r'modalidades', ModalidadeViewSet, basename='modalidade')
 router.register(r'aulas', AulaViewSet, basename='agendamentoaula')
+router.register(r'aulas-recorrentes', AulaRecorrenteViewSet, basename='aularecorrente')
 router.register(r'aulas-alunos', AulaAlunoViewSet, basename='aulaaluno')
 router.register(r'reposicoes', ReposicaoViewSet, basename='reposicao')
 router.register(r'listas-espera', ListaEsperaViewSet, basename='listaespera')
 
 urlpatterns = [
+    path('calendario-ics/', TokenCalendarioView.as_view(), name='token-calendario'),
+    path('calendario-ics/<str:token>/<slug:tipo>.ics', feed_calendario, name='feed-calendario'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
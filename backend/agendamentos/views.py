@@ -3,10 +3,17 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.db import IntegrityError, transaction
 from django.db.models import Q
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from rest_framework.views import APIView
 from datetime import *
-from django.utils import timezone
+from itertools import islice
 from drf_spectacular.utils import extend_schema, extend_schema_view
 
 from .models import (
@@ -18,64 +25,63 @@ from .models import (
     Reposicao,
     ListaEspera,
     CreditoAula,
+    AulaRecorrente,
+    TokenCalendario,
+    gerar_token_calendario,
 )
 from .serializers import (
     HorarioTrabalhoSerializer, ModalidadeSerializer, ReposicaoSerializer, ListaEsperaSerializer,
-    AgendamentoAlunoSerializer, AgendamentoStaffSerializer, CreditoAula, AgendamentoAlunoReadSerializer,
+    AgendamentoAlunoSerializer, CreditoAula, AgendamentoAlunoReadSerializer,
     CreditoAulaSerializer, BloqueioAgendaReadSerializer, BloqueioAgendaWriteSerializer, AulaReadSerializer, AulaWriteSerializer,
-    AulaAlunoSerializer
+    AulaAlunoSerializer, AulaRecorrenteSerializer, GerarAulasRecorrentesSerializer, ChamadaSerializer,
+    AgendamentoSerieSerializer, BuscaDisponibilidadeSerializer, AulaDisponivelSerializer, CalendarioSemanalSerializer,
+    CancelamentoAulasSerializer, PosicaoListaEsperaSerializer,
 )
 from .permissions import CanUpdateAula, IsOwnerDoAgendamento
+from .services import (
+    aulas_para_leitura,
+    agendamentos_para_leitura,
+    bloquear_aula,
+    reservar_vaga,
+    entrar_lista_espera,
+    gerar_aulas_recorrentes,
+    consumir_credito,
+    invalidar_credito,
+    saldo_creditos,
+    registrar_chamada,
+    agendar_serie,
+    buscar_aulas_disponiveis,
+    filtrar_por_periodo,
+    aulas_no_expediente,
+    calendario_semanal,
+    agendamentos_do_feed,
+    aulas_do_feed_instrutor,
+    validadores_feed,
+    posicoes_lista_espera,
+    feed_ics_agendamentos,
+    feed_ics_instrutor,
+    cancelar_aulas,
+)
 from alunos.permissions import IsStaffAutorizado
 from alunos.models import Aluno
 from rest_framework.exceptions import PermissionDenied, ValidationError
-from core.permissions import StudioPermissionMixin, HasRole
-from notifications.models import Notification
-
-def processar_lista_espera(aula):
-    """
-    Cenário 4: Tenta inscrever o próximo aluno da lista de espera em uma aula.
-    """
-    if not aula.lista_espera.exists():
-        return
-
-    for inscricao_espera in aula.lista_espera.order_by('data_inscricao'):
-        aluno_em_espera = inscricao_espera.aluno
-        
-        credito_disponivel = CreditoAula.objects.filter(
-            aluno=aluno_em_espera,
-            data_invalidacao__isnull=True,
-            data_validade__gte=aula.data_hora_inicio.date()
-        ).first()
-
-        if credito_disponivel:
-            try:
-                novo_agendamento = AulaAluno.objects.create(
-                    aula=aula,
-                    aluno=aluno_em_espera,
-                    credito_utilizado=credito_disponivel
-                )
-                credito_disponivel.data_invalidacao = novo_agendamento.aula.data_hora_inicio # Use a data da aula para invalidar o crédito
-                credito_disponivel.save()
-
-                Notification.objects.create(
-                    recipient=aluno_em_espera.usuario,
-                    message=f"Conseguimos! Você foi inscrito(a) automaticamente na aula de {aula.modalidade.nome} do dia {aula.data_hora_inicio.strftime('%d/%m')}.",
-                    level=Notification.NotificationLevel.SUCCESS,
-                    content_object=novo_agendamento
-                )
-                inscricao_espera.delete()
-                return
-            except Exception:
-                pass
-        
-        Notification.objects.create(
-            recipient=aluno_em_espera.usuario,
-            message=f"Uma vaga surgiu na aula de {aula.modalidade.nome}, mas não conseguimos te inscrever por falta de créditos válidos. Adquira um novo plano para não perder a próxima chance!",
-            level=Notification.NotificationLevel.WARNING,
-            content_object=aula
-        )
-        inscricao_espera.delete()
+from core.idempotencia import idempotente
+from core.permissions import StudioPermissionMixin, HasRole, filtrar_por_studios_do_usuario
+from core.pagination import AulaPaginacao, AgendamentoPaginacao
+
+def _periodo_da_requisicao(request):
+    """Lê `?data_inicio=` e `?data_fim=` (YYYY-MM-DD) da requisição."""
+    datas = []
+    for campo in ('data_inicio', 'data_fim'):
+        valor = request.query_params.get(campo)
+        if not valor:
+            datas.append(None)
+            continue
+        try:
+            datas.append(datetime.strptime(valor, '%Y-%m-%d').date())
+        except ValueError:
+            raise ValidationError({campo: "Formato de data inválido. Use YYYY-MM-DD."})
+    return datas
 
 
 @extend_schema(tags=['Agendamentos - Horários de Trabalho'])
@@ -151,32 +157,23 @@ class ModalidadeViewSet(viewsets.ModelViewSet):
 )
 class AulaViewSet(StudioPermissionMixin, viewsets.ModelViewSet):
     queryset = Aula.objects.all().order_by('data_hora_inicio')
+    pagination_class = AulaPaginacao
     studio_filter_field = 'studio'
 
     def get_queryset(self):
         # Este método aplica o filtro por estúdio se o usuário for um colaborador.
         queryset = super().get_queryset().order_by('data_hora_inicio') 
 
-        queryset = queryset.prefetch_related('alunos_inscritos')
-
-        data_inicio_str = self.request.query_params.get('data_inicio')
-        data_fim_str = self.request.query_params.get('data_fim')
-
-        if data_inicio_str:
-            try:
-                data_inicio = datetime.strptime(data_inicio_str, '%Y-%m-%d').date()
-                queryset = queryset.filter(data_hora_inicio__date__gte=data_inicio)
-            except ValueError:
-                raise ValidationError({"data_inicio": "Formato de data inválido. Use YYYY-MM-DD."})
+        # Ocupação (vagas preenchidas, livres e lista de espera) calculada na própria consulta.
+        if self.action in ['list', 'retrieve']:
+            queryset = aulas_para_leitura(queryset)
 
-        if data_fim_str:
-            try:
-                data_fim = datetime.strptime(data_fim_str, '%Y-%m-%d').date()
-                queryset = queryset.filter(data_hora_inicio__date__lte=data_fim)
-            except ValueError:
-                raise ValidationError({"data_fim": "Formato de data inválido. Use YYYY-MM-DD."})
+        studio_id = self.request.query_params.get('studio')
+        if studio_id:
+            queryset = queryset.filter(studio_id=studio_id)
 
-        return queryset
+        # Intervalo semiaberto de datetimes: usa o índice (studio, data_hora_inicio).
+        return filtrar_por_periodo(queryset, *_periodo_da_requisicao(self.request))
 
     def get_serializer_class(self):
         if self.action in ['list', 'retrieve']:
@@ -192,6 +189,76 @@ class AulaViewSet(StudioPermissionMixin, viewsets.ModelViewSet):
             return [CanUpdateAula()]
         return [IsAuthenticated()]
 
+    @extend_schema(
+        summary="Busca aulas com vagas livres (projeção compacta)",
+        parameters=[BuscaDisponibilidadeSerializer],
+        responses={200: AulaDisponivelSerializer(many=True)},
+    )
+    @action(detail=False, methods=['get'], url_path='disponiveis', permission_classes=[IsAuthenticated])
+    def disponiveis(self, request):
+        """
+        Retorna apenas as aulas futuras com vagas livres, filtradas por período,
+        estúdio(s), modalidade, instrutor e faixa de horário do dia. Devolve só
+        os campos necessários para a tela de busca, sem objetos aninhados.
+        """
+        filtros = BuscaDisponibilidadeSerializer(data=request.query_params)
+        filtros.is_valid(raise_exception=True)
+        params = dict(filtros.validated_data)
+        limite = params.pop('limite')
+
+        aulas = buscar_aulas_disponiveis(**params)
+        if hasattr(request.user, 'colaborador'):
+            # Colaboradores continuam restritos aos estúdios em que atuam (StudioPermissionMixin).
+            aulas = aulas.filter(pk__in=self.get_queryset().values('pk'))
+        # Aulas que caíram fora do expediente (horário alterado, feriado cadastrado depois) não são oferecidas.
+        aulas = list(islice(aulas_no_expediente(aulas.iterator(chunk_size=limite)), limite))
+        serializer = AulaDisponivelSerializer(aulas, many=True)
+        return Response(serializer.data)
+
+    @extend_schema(
+        summary="Calendário semanal de um estúdio (projeção colunar)",
+        parameters=[CalendarioSemanalSerializer],
+    )
+    @action(detail=False, methods=['get'], url_path='calendario', permission_classes=[IsAuthenticated])
+    def calendario(self, request):
+        """
+        Retorna as aulas de um estúdio em uma semana ISO como colunas paralelas
+        (IDs, início em minutos desde a segunda-feira, duração, modalidade,
+        instrutores e vagas) mais tabelas de nomes de modalidades e instrutores.
+        A resposta fica em cache por estúdio e semana e é invalidada a cada
+        alteração de aulas ou inscrições do estúdio.
+        """
+        filtros = CalendarioSemanalSerializer(data=request.query_params)
+        filtros.is_valid(raise_exception=True)
+        studio = filtros.validated_data['studio']
+        ano, semana = filtros.validated_data['semana']
+
+        colaborador = getattr(request.user, 'colaborador', None)
+        if colaborador is not None:
+            # Mesma regra do StudioPermissionMixin: só ADMIN_MASTER vê estúdios que não são os seus.
+            perfis = set(colaborador.perfis.values_list('nome', flat=True))
+            if 'ADMIN_MASTER' not in perfis and not colaborador.unidades.filter(pk=studio.pk).exists():
+                raise PermissionDenied("Você não tem acesso ao calendário deste estúdio.")
+
+        return Response(calendario_semanal(studio.pk, ano, semana))
+
+    @extend_schema(
+        summary="Cancela várias aulas de uma vez (lista de IDs ou período)",
+        request=CancelamentoAulasSerializer,
+    )
+    @action(detail=False, methods=['post'], url_path='cancelar-em-lote', permission_classes=[IsStaffAutorizado])
+    def cancelar_em_lote(self, request):
+        """
+        Apaga as aulas selecionadas que ainda não começaram (ex.: um feriado
+        inteiro), estornando os créditos e avisando os alunos inscritos em
+        lote. Colaboradores só alcançam as aulas dos seus estúdios.
+        """
+        serializer = CancelamentoAulasSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        aulas = serializer.filtrar(self.get_queryset())
+        resultado = cancelar_aulas(aulas, usuario=request.user, motivo=serializer.validated_data.get('motivo', ''))
+        return Response(resultado, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['get'], url_path='lista-espera', permission_classes=[IsAuthenticated, HasRole.for_roles(['ADMIN_MASTER', 'ADMINISTRADOR', 'RECEPCIONISTA'])])
     def lista_espera(self, request, pk=None):
         aula = self.get_object()
@@ -210,11 +277,75 @@ class AulaViewSet(StudioPermissionMixin, viewsets.ModelViewSet):
         Apenas usuários da equipe (staff) podem acessar esta lista.
         """
         aula = self.get_object()
-        inscricoes = AulaAluno.objects.filter(aula=aula).order_by('aluno__usuario__username')
+        inscricoes = agendamentos_para_leitura(
+            AulaAluno.objects.filter(aula=aula).order_by('aluno__usuario__username')
+        )
         serializer = AgendamentoAlunoReadSerializer(inscricoes, many=True)
         return Response(serializer.data)
 
+    @extend_schema(
+        summary="Registra a chamada (presença) de todos os alunos da aula de uma vez",
+        request=ChamadaSerializer,
+    )
+    @action(detail=True, methods=['post'], url_path='chamada', permission_classes=[IsAuthenticated, CanUpdateAula])
+    def chamada(self, request, pk=None):
+        """
+        Recebe uma lista de pares (aluno, status_presenca) e grava todos em uma
+        única transação. Faltas com reposição (AUSENTE_COM_REPO) geram os
+        créditos de reposição em lote.
+        """
+        aula = self.get_object()
+        serializer = ChamadaSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        presencas = {
+            item['aluno']: item['status_presenca']
+            for item in serializer.validated_data['presencas']
+        }
+        resultado = registrar_chamada(aula, presencas, usuario=request.user)
+        return Response(resultado, status=status.HTTP_200_OK)
+
     
+@extend_schema(tags=['Agendamentos - Aulas Recorrentes'])
+@extend_schema_view(
+    list=extend_schema(summary="Lista as aulas recorrentes (grade semanal)"),
+    retrieve=extend_schema(summary="Busca uma aula recorrente pelo ID"),
+    create=extend_schema(summary="Cria uma nova aula recorrente"),
+    update=extend_schema(summary="Atualiza uma aula recorrente"),
+    partial_update=extend_schema(summary="Atualiza parcialmente uma aula recorrente"),
+    destroy=extend_schema(summary="Deleta uma aula recorrente"),
+)
+class AulaRecorrenteViewSet(StudioPermissionMixin, viewsets.ModelViewSet):
+    queryset = AulaRecorrente.objects.select_related('studio', 'modalidade')
+    serializer_class = AulaRecorrenteSerializer
+    studio_filter_field = 'studio'
+
+    def get_permissions(self):
+        return [HasRole.for_roles(['ADMIN_MASTER', 'ADMINISTRADOR', 'RECEPCIONISTA'])]
+
+    @extend_schema(
+        summary="Gera as aulas a partir da grade recorrente para um período",
+        request=GerarAulasRecorrentesSerializer,
+    )
+    @action(detail=False, methods=['post'], url_path='gerar')
+    def gerar(self, request):
+        """
+        Expande as aulas recorrentes ativas (filtradas pelo estúdio ou pelos IDs
+        informados) em aulas reais. Pode ser executado novamente sem duplicar aulas.
+        """
+        serializer = GerarAulasRecorrentesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        dados = serializer.validated_data
+
+        recorrencias = self.get_queryset().filter(ativa=True)
+        if dados.get('studio'):
+            recorrencias = recorrencias.filter(studio=dados['studio'])
+        if dados.get('recorrencias'):
+            recorrencias = recorrencias.filter(pk__in=dados['recorrencias'])
+
+        estatisticas = gerar_aulas_recorrentes(dados['data_inicio'], dados['data_fim'], recorrencias)
+        return Response(estatisticas, status=status.HTTP_201_CREATED)
+
+
 @extend_schema(tags=['Agendamentos - Inscrições (Aulas-Alunos)'])
 @extend_schema_view(
     list=extend_schema(summary="Lista todas as inscrições (agendamentos)"),
@@ -226,6 +357,7 @@ class AulaViewSet(StudioPermissionMixin, viewsets.ModelViewSet):
 )
 class AulaAlunoViewSet(StudioPermissionMixin, viewsets.ModelViewSet):
     queryset = AulaAluno.objects.all()
+    pagination_class = AgendamentoPaginacao
 
     studio_filter_field = 'aula__studio'
     permission_classes = [IsAuthenticated] 
@@ -240,26 +372,32 @@ class AulaAlunoViewSet(StudioPermissionMixin, viewsets.ModelViewSet):
         
         # Se o usuário for um Aluno, ele só pode ver seus próprios agendamentos
         if hasattr(user, 'aluno'):
-            return AulaAluno.objects.filter(aluno=user.aluno).order_by('aula__data_hora_inicio')
-        
-        # Se for um Colaborador, aplica a lógica do StudioPermissionMixin
-        queryset = super().get_queryset().order_by('aula__data_hora_inicio')
-        return queryset
+            queryset = AulaAluno.objects.filter(aluno=user.aluno).order_by('aula__data_hora_inicio')
+        else:
+            # Se for um Colaborador, aplica a lógica do StudioPermissionMixin
+            queryset = super().get_queryset().order_by('aula__data_hora_inicio')
+
+        if self.action in ['list', 'retrieve']:
+            queryset = agendamentos_para_leitura(queryset)
+        # A cópia de data_hora_inicio em AulaAluno dispensa o JOIN com Aula no filtro.
+        return filtrar_por_periodo(queryset, *_periodo_da_requisicao(self.request))
             
     def get_permissions(self):
-        if self.action == 'create': 
+        if self.action in ['create', 'serie']: 
             return [IsAuthenticated()]
         return [IsAuthenticated(), (IsOwnerDoAgendamento | IsStaffAutorizado)()]
 
+    @idempotente
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        if serializer.validated_data.get('_adicionado_lista_espera'):
+        lista_espera = serializer.validated_data.get('_lista_espera', False)
+        self.perform_create(serializer)
+        if lista_espera:
             return Response(
                 {"detail": "Aula cheia. Você foi adicionado à lista de espera."},
                 status=status.HTTP_201_CREATED
             )
-        self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
         
         # Após a criação, serializa a instância recém-criada com o serializer de leitura
@@ -270,22 +408,75 @@ class AulaAlunoViewSet(StudioPermissionMixin, viewsets.ModelViewSet):
         serializer.validated_data.pop('entrar_lista_espera', None)
         if not hasattr(self.request.user, 'aluno'):
             raise PermissionDenied("Você não possui um perfil de aluno para realizar este agendamento.")
+        if serializer.validated_data.pop('_lista_espera', False):
+            # Aula cheia: a validação não grava nada, a entrada na fila é feita aqui.
+            entrar_lista_espera(serializer.validated_data['aula'].pk, self.request.user.aluno)
+            return
         credito_a_utilizar = serializer.validated_data.pop('credito_a_utilizar', None)
-        agendamento = serializer.save(aluno=self.request.user.aluno) 
-        if credito_a_utilizar:        
-            agendamento.credito_utilizado = credito_a_utilizar
-            credito_a_utilizar.data_invalidacao = timezone.now()
-            credito_a_utilizar.invalidado_por = self.request.user 
-            credito_a_utilizar.save()
-            agendamento.save()
+        try:
+            with transaction.atomic():
+                # Trava a aula e revalida a vaga antes de inserir (evita overbooking concorrente).
+                reservar_vaga(serializer.validated_data['aula'].pk)
+                agendamento = serializer.save(aluno=self.request.user.aluno, credito_utilizado=credito_a_utilizar)
+                if credito_a_utilizar:
+                    # Débito atômico no saldo do lote + entrada no livro-razão.
+                    consumir_credito(credito_a_utilizar, agendamento, usuario=self.request.user)
+        except IntegrityError:
+            # Uma repetição concorrente (sem Idempotency-Key) inscreveu o aluno
+            # entre a validação e o INSERT: unique_together (aula, aluno).
+            raise ValidationError({"detail": "Você já está inscrito nesta aula."})
+
+    @idempotente
+    def destroy(self, request, *args, **kwargs):
+        return super().destroy(request, *args, **kwargs)
 
     def perform_destroy(self, instance):
         """
         Sobrescreve o método de deleção para acionar a lógica da lista de espera.
         """
-        aula = instance.aula
-        instance.delete()
-        processar_lista_espera(aula)
+        with transaction.atomic():
+            bloquear_aula(instance.aula_id)
+            # O signal de post_delete libera a vaga, estorna o crédito e promove a lista de espera.
+            instance.delete()
+
+    @extend_schema(
+        summary="Agenda um aluno em várias aulas de uma vez (série semanal)",
+        request=AgendamentoSerieSerializer,
+    )
+    @action(detail=False, methods=['post'], url_path='serie')
+    def serie(self, request):
+        """
+        Inscreve o aluno em todas as aulas de uma aula recorrente (ou de uma
+        lista de aulas) em uma única chamada. O resultado traz, para cada aula,
+        se o agendamento foi feito ou o motivo da falha.
+        """
+        serializer = AgendamentoSerieSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        aluno = serializer.validated_data.get('aluno')
+        if aluno is None:
+            if not hasattr(request.user, 'aluno'):
+                raise ValidationError({"aluno": "Informe o aluno a ser agendado."})
+            aluno = request.user.aluno
+        elif aluno != getattr(request.user, 'aluno', None) and not IsStaffAutorizado().has_permission(request, self):
+            raise PermissionDenied("Apenas o staff pode agendar outro aluno.")
+
+        # O colaborador só agenda nas aulas dos seus estúdios, como nas demais rotas.
+        aulas_ids = serializer.aulas_alvo()
+        permitidas = set(
+            filtrar_por_studios_do_usuario(Aula.objects.filter(pk__in=aulas_ids), request.user, 'studio')
+            .values_list('pk', flat=True)
+        )
+        fora_do_escopo = [aula_id for aula_id in aulas_ids if aula_id not in permitidas]
+        if fora_do_escopo:
+            raise ValidationError({"aulas": f"Aulas inexistentes ou fora dos seus estúdios: {fora_do_escopo}."})
+
+        resultados = agendar_serie(aluno, aulas_ids, usuario=request.user)
+        agendados = sum(1 for resultado in resultados if resultado['status'] == 'AGENDADO')
+        return Response(
+            {'agendados': agendados, 'falhas': len(resultados) - agendados, 'resultados': resultados},
+            status=status.HTTP_201_CREATED if agendados else status.HTTP_400_BAD_REQUEST,
+        )
 
             
 @extend_schema(tags=['Alunos - Créditos (Gestão Staff)'])
@@ -295,13 +486,13 @@ class CreditoAulaViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, IsStaffAutorizado] 
 
     def get_queryset(self):
-        aluno_cpf = self.kwargs.get("aluno_cpf")
+        aluno_cpf = self.kwargs.get("aluno_usuario__cpf")
         if aluno_cpf:
             return CreditoAula.objects.filter(aluno__usuario__cpf=aluno_cpf)
         return CreditoAula.objects.none() 
 
     def perform_create(self, serializer):
-        aluno_cpf = self.kwargs.get("aluno_cpf")
+        aluno_cpf = self.kwargs.get("aluno_usuario__cpf")
         aluno = get_object_or_404(Aluno, usuario__cpf=aluno_cpf)
         serializer.save(
             aluno=aluno,
@@ -309,19 +500,23 @@ class CreditoAulaViewSet(viewsets.ModelViewSet):
         )
 
     @action(detail=True, methods=["patch"], name="Invalidar Crédito")
-    def invalidar(self, request, pk=None, aluno_cpf=None):
+    def invalidar(self, request, pk=None, **kwargs):
         credito = self.get_object()
         if credito.data_invalidacao is not None:
             return Response(
                 {"detail": "Este crédito já foi invalidado."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        credito.invalidado_por = request.user.colaborador if hasattr(request.user, 'colaborador') else request.user
-        credito.data_invalidacao = timezone.now()
-        credito.save()
+        credito = invalidar_credito(credito.pk, usuario=request.user)
         serializer = self.get_serializer(credito)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @extend_schema(summary="Saldo de créditos do aluno, total e por data de validade")
+    @action(detail=False, methods=["get"], name="Saldo de Créditos")
+    def saldo(self, request, **kwargs):
+        aluno = get_object_or_404(Aluno, usuario__cpf=self.kwargs.get("aluno_usuario__cpf"))
+        return Response(saldo_creditos(aluno), status=status.HTTP_200_OK)
+
     def update(self, request, *args, **kwargs):
         return Response(
             {"detail": 'Método "PUT" não permitido.'},
@@ -365,4 +560,90 @@ class ListaEsperaViewSet(viewsets.ModelViewSet):
     queryset = ListaEspera.objects.all()
     serializer_class = ListaEsperaSerializer
     def get_permissions(self):
-        return [HasRole.for_roles(['ADMIN_MASTER', 'ADMINISTRADOR', 'RECEPCIONISTA'])]
\ No newline at end of file
+        if self.action == 'minhas_posicoes':
+            return [IsAuthenticated()]
+        return [HasRole.for_roles(['ADMIN_MASTER', 'ADMINISTRADOR', 'RECEPCIONISTA'])]
+
+    @extend_schema(
+        summary="Posição do aluno logado em cada lista de espera e a chance de promoção",
+        responses={200: PosicaoListaEsperaSerializer(many=True)},
+    )
+    @action(detail=False, methods=['get'], url_path='minhas-posicoes')
+    def minhas_posicoes(self, request):
+        """
+        Lista as aulas futuras em cuja lista de espera o aluno está, com a
+        posição na fila e a probabilidade histórica de conseguir a vaga.
+        """
+        if not hasattr(request.user, 'aluno'):
+            raise PermissionDenied("Apenas alunos possuem posições em listas de espera.")
+        serializer = PosicaoListaEsperaSerializer(posicoes_lista_espera(request.user.aluno.pk), many=True)
+        return Response(serializer.data)
+
+
+@extend_schema(tags=['Agendamentos - Calendário (iCalendar)'])
+class TokenCalendarioView(APIView):
+    """
+    URLs dos feeds iCalendar (.ics) do usuário logado, para assinar em
+    aplicativos de calendário. O POST gera um novo token e invalida as URLs antigas.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def _urls(self, request, token):
+        return {
+            tipo: request.build_absolute_uri(reverse('feed-calendario', args=[token.token, tipo]))
+            for tipo in ('agendamentos', 'instrutor')
+        }
+
+    @extend_schema(summary="Retorna as URLs dos feeds iCalendar do usuário")
+    def get(self, request):
+        token, _ = TokenCalendario.objects.get_or_create(usuario=request.user)
+        return Response(self._urls(request, token))
+
+    @extend_schema(summary="Gera um novo token para os feeds iCalendar")
+    def post(self, request):
+        token, criado = TokenCalendario.objects.get_or_create(usuario=request.user)
+        if not criado:
+            token.token = gerar_token_calendario()
+            token.save(update_fields=['token'])
+        return Response(self._urls(request, token), status=status.HTTP_201_CREATED)
+
+
+@require_safe
+def feed_calendario(request, token, tipo):
+    """
+    Feed iCalendar de um usuário, autenticado pelo token da URL: 'agendamentos'
+    (inscrições do aluno) ou 'instrutor' (aulas como principal ou substituto).
+
+    ETag e Last-Modified saem de uma consulta agregada; clientes que repetem a
+    consulta sem mudanças recebem 304 sem que o calendário seja montado. Caso
+    contrário, o .ics é transmitido em streaming a partir das linhas do banco.
+    """
+    usuario_id = get_object_or_404(TokenCalendario.objects.only('usuario_id'), token=token).usuario_id
+    if tipo == 'agendamentos':
+        queryset = agendamentos_do_feed(usuario_id)
+        etag, modificado = validadores_feed(queryset, 'aula__data_ultima_modificacao')
+    elif tipo == 'instrutor':
+        queryset = aulas_do_feed_instrutor(usuario_id)
+        etag, modificado = validadores_feed(queryset, 'data_ultima_modificacao')
+    else:
+        raise Http404
+
+    ultima_modificacao = int(modificado.timestamp()) if modificado else None
+    nao_modificado = get_conditional_response(request, etag=etag, last_modified=ultima_modificacao)
+    if nao_modificado is not None:
+        nao_modificado['ETag'] = etag
+        return nao_modificado
+
+    dominio = request.get_host().split(':')[0]
+    if tipo == 'agendamentos':
+        conteudo = feed_ics_agendamentos(queryset, dominio)
+    else:
+        conteudo = feed_ics_instrutor(queryset, usuario_id, dominio)
+
+    response = StreamingHttpResponse(conteudo, content_type='text/calendar; charset=utf-8')
+    response['ETag'] = etag
+    if ultima_modificacao:
+        response['Last-Modified'] = http_date(ultima_modificacao)
+    response['Cache-Control'] = 'private, max-age=900'
+    response['Content-Disposition'] = f'inline; filename="{tipo}.ics"'
+    return response
@@ -40,6 +40,8 @@ class AlunoSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'usuario': {'write_only': True, 'required': False}
         }
+        # Plano de consulta (core.plano_consulta): nome, e-mail e CPF vêm do usuário.
+        select_related = ['usuario']
 
     def create(self, validated_data):
         """Cria um novo perfil de Aluno associado a um Usuario."""
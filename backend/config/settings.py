@@ -183,6 +183,11 @@ REST_FRAMEWORK = {
 # Sem isso, o Swagger tenta carregar via HTTP e o navegador bloqueia (Mixed Content)
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
+# --- Fila de tarefas em segundo plano (core.tarefas) ---
+# Com True, as tarefas ficam na fila para o `python manage.py run_workers`.
+# Com False (padrão), cada requisição executa as tarefas logo após o commit.
+TAREFAS_WORKER_ATIVO = os.environ.get("TAREFAS_WORKER_ATIVO", "False") == "True"
+
 # --- Configuração de E-mail (para desenvolvimento) ---
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 
@@ -0,0 +1,14 @@
+from django.contrib import admin
+from .models import RespostaIdempotente, Tarefa
+
+@admin.register(Tarefa)
+class TarefaAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'status', 'tentativas', 'executar_apos', 'concluida_em')
+    list_filter = ('status', 'nome')
+    search_fields = ('nome', 'chave_dedup', 'ultimo_erro')
+
+
+@admin.register(RespostaIdempotente)
+class RespostaIdempotenteAdmin(admin.ModelAdmin):
+    list_display = ('chave', 'usuario', 'status_code', 'criada_em', 'expira_em')
+    search_fields = ('chave',)
@@ -0,0 +1,120 @@
+# core/idempotencia.py
+"""
+Chaves de idempotência para endpoints que os clientes repetem em redes
+instáveis (cabeçalho `Idempotency-Key`, como em APIs de pagamento).
+
+A primeira requisição com uma chave reserva a chave com um INSERT protegido
+pela constraint única (usuario, chave), sem travas. Depois, grava a resposta
+se ela for de sucesso ou libera a chave em caso contrário. Uma repetição custa
+uma consulta pelo índice único e devolve a resposta gravada, sem passar de
+novo pela validação nem pelos efeitos colaterais:
+
+    class AgendamentoViewSet(viewsets.ModelViewSet):
+        @idempotente
+        def create(self, request, *args, **kwargs):
+            ...
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .models import RespostaIdempotente
+
+CABECALHO = "Idempotency-Key"
+
+# Por quanto tempo uma resposta gravada pode ser repetida.
+VALIDADE_CHAVE = timedelta(hours=24)
+
+
+def _impressao(request):
+    """Hash do método, do caminho e do corpo já interpretado da requisição."""
+    corpo = json.dumps(request.data, sort_keys=True, default=str)
+    conteudo = f"{request.method} {request.path}\n{corpo}"
+    return hashlib.sha256(conteudo.encode()).hexdigest()
+
+
+def _resposta_gravada(registro, impressao):
+    if registro.impressao != impressao:
+        return Response(
+            {"detail": "Esta chave de idempotência já foi usada em outra requisição."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if registro.status_code is None:
+        return Response(
+            {"detail": "Uma requisição com esta chave de idempotência ainda está em processamento."},
+            status=status.HTTP_409_CONFLICT,
+        )
+    resposta = Response(registro.corpo, status=registro.status_code)
+    resposta["Idempotent-Replayed"] = "true"
+    return resposta
+
+
+def _reservar(usuario, chave, impressao):
+    """
+    Reserva a chave para esta requisição. Devolve (registro, None) se a
+    reserva deu certo, ou (None, resposta) se a chave já tem dono.
+    """
+    agora = timezone.now()
+    existente = RespostaIdempotente.objects.filter(usuario=usuario, chave=chave).first()
+    if existente and existente.expira_em > agora:
+        return None, _resposta_gravada(existente, impressao)
+    if existente:
+        # Chave vencida: some só se ninguém a renovou entretanto.
+        RespostaIdempotente.objects.filter(pk=existente.pk, expira_em__lte=agora).delete()
+    try:
+        with transaction.atomic():
+            return RespostaIdempotente.objects.create(
+                usuario=usuario, chave=chave, impressao=impressao, expira_em=agora + VALIDADE_CHAVE
+            ), None
+    except IntegrityError:
+        # Outra requisição com a mesma chave reservou primeiro.
+        return None, _resposta_gravada(RespostaIdempotente.objects.get(usuario=usuario, chave=chave), impressao)
+
+
+def idempotente(metodo):
+    """
+    Torna idempotente uma ação de viewset para os clientes que enviam o
+    cabeçalho `Idempotency-Key`. Sem o cabeçalho, a ação roda normalmente.
+    Só respostas 2xx são gravadas. Erros e exceções liberam a chave, e a
+    próxima tentativa é processada de novo.
+    """
+
+    @wraps(metodo)
+    def envoltorio(self, request, *args, **kwargs):
+        chave = request.headers.get(CABECALHO)
+        if not chave or not request.user.is_authenticated:
+            return metodo(self, request, *args, **kwargs)
+        if len(chave) > RespostaIdempotente._meta.get_field("chave").max_length:
+            raise ValidationError({"detail": f"O cabeçalho {CABECALHO} aceita no máximo 255 caracteres."})
+
+        registro, gravada = _reservar(request.user, chave, _impressao(request))
+        if gravada is not None:
+            return gravada
+
+        try:
+            resposta = metodo(self, request, *args, **kwargs)
+        except BaseException:
+            registro.delete()
+            raise
+        if status.is_success(resposta.status_code):
+            registro.status_code = resposta.status_code
+            registro.corpo = resposta.data
+            registro.save(update_fields=["status_code", "corpo"])
+        else:
+            registro.delete()
+        return resposta
+
+    return envoltorio
+
+
+def limpar_chaves_expiradas():
+    """Apaga as respostas gravadas cuja validade já passou. Retorna quantas foram apagadas."""
+    apagadas, _ = RespostaIdempotente.objects.filter(expira_em__lte=timezone.now()).delete()
+    return apagadas
@@ -0,0 +1,94 @@
+# core/management/commands/benchmark_consultas_aulas.py
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from agendamentos.models import Aula, AulaAluno, Modalidade
+from agendamentos.services import filtrar_por_periodo
+from studios.models import Studio
+
+
+class _Rollback(Exception):
+    """Desfaz os dados sintéticos ao final do benchmark."""
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara o plano de execução e o tempo das consultas de calendário de aulas: '
+        'filtro legado (__date) contra o intervalo de datetimes usado hoje.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--aulas', type=int, default=20000, help='Aulas sintéticas a criar (padrão: 20000). Use 0 para usar só os dados existentes.')
+        parser.add_argument('--repeticoes', type=int, default=20, help='Execuções de cada consulta para a média (padrão: 20).')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                studio = self._popular(options['aulas'])
+                self._comparar(studio, options['repeticoes'])
+                # Nada do que foi criado aqui deve permanecer no banco.
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _popular(self, total):
+        if not total:
+            return Studio.objects.first()
+        self.stdout.write(f'Criando {total} aulas sintéticas (descartadas ao final)...')
+        studios = [Studio.objects.create(nome=f'Benchmark {i}') for i in range(10)]
+        modalidade = Modalidade.objects.create(nome='Benchmark')
+        inicio = timezone.now() - timedelta(days=365)
+        aulas = []
+        for i in range(total):
+            data_hora_inicio = inicio + timedelta(hours=i % (24 * 730))
+            aulas.append(Aula(
+                studio=studios[i % len(studios)],
+                modalidade=modalidade,
+                data_hora_inicio=data_hora_inicio,
+                data_hora_fim=data_hora_inicio + timedelta(minutes=60),
+            ))
+        Aula.objects.bulk_create(aulas, batch_size=1000)
+        return studios[0]
+
+    def _comparar(self, studio, repeticoes):
+        hoje = timezone.localdate()
+        semana = (hoje, hoje + timedelta(days=6))
+
+        cenarios = [
+            (
+                'Calendário do estúdio (7 dias)',
+                Aula.objects.filter(studio=studio, data_hora_inicio__date__gte=semana[0], data_hora_inicio__date__lte=semana[1]),
+                filtrar_por_periodo(Aula.objects.filter(studio=studio), *semana),
+            ),
+            (
+                'Calendário geral (7 dias)',
+                Aula.objects.filter(data_hora_inicio__date__gte=semana[0], data_hora_inicio__date__lte=semana[1]),
+                filtrar_por_periodo(Aula.objects.all(), *semana),
+            ),
+        ]
+        for titulo, legado, atual in cenarios:
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{titulo}'))
+            self._relatar('Legado (__date)', legado, repeticoes)
+            self._relatar('Intervalo [início, fim)', atual, repeticoes)
+
+        self.stdout.write(self.style.MIGRATE_HEADING('\nAgendamentos ativos de um aluno'))
+        self._relatar(
+            'aluno + status_presenca',
+            AulaAluno.objects.filter(aluno_id=0, status_presenca=AulaAluno.StatusPresenca.AGENDADO),
+            repeticoes,
+        )
+
+    def _relatar(self, rotulo, queryset, repeticoes):
+        queryset = queryset.order_by().values_list('pk', flat=True)
+        plano = queryset.explain()
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            total = len(list(queryset.all()))
+        media_ms = (time.perf_counter() - inicio) * 1000 / repeticoes
+        self.stdout.write(f'  {rotulo}: {total} linha(s), {media_ms:.2f} ms em média')
+        for linha in plano.splitlines():
+            self.stdout.write(f'    {linha}')
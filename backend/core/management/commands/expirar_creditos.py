@@ -0,0 +1,40 @@
+# core/management/commands/expirar_creditos.py
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from agendamentos.services import TAMANHO_LOTE_EXPIRACAO, expirar_vencidos
+from studios.models import Studio
+
+
+class Command(BaseCommand):
+    help = (
+        'Expira os créditos de aula e as reposições vencidos, em lotes. '
+        'Pode ser agendado diariamente (cron) e reexecutado após uma interrupção.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', type=date.fromisoformat, help='Data de referência (AAAA-MM-DD). Padrão: hoje.')
+        parser.add_argument(
+            '--lote', type=int, default=TAMANHO_LOTE_EXPIRACAO,
+            help=f'Linhas expiradas por transação (padrão: {TAMANHO_LOTE_EXPIRACAO}).',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Iniciando expiração de créditos e reposições...'))
+        estatisticas = expirar_vencidos(options['data'], options['lote'])
+
+        nomes = Studio.objects.in_bulk([studio_id for studio_id in estatisticas if studio_id])
+        for studio_id, totais in sorted(estatisticas.items(), key=lambda item: item[0] or 0):
+            studio = nomes.get(studio_id)
+            rotulo = studio.nome if studio else 'Sem estúdio'
+            self.stdout.write(
+                f"  - {rotulo}: {totais['creditos']} lote(s) de crédito ({totais['saldo_expirado']} crédito(s)), "
+                f"{totais['reposicoes']} reposição(ões)."
+            )
+
+        creditos = sum(totais['creditos'] for totais in estatisticas.values())
+        reposicoes = sum(totais['reposicoes'] for totais in estatisticas.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Expiração concluída. {creditos} lote(s) de crédito e {reposicoes} reposição(ões) expirados.'
+        ))
@@ -0,0 +1,37 @@
+# core/management/commands/gerar_aulas_recorrentes.py
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from agendamentos.models import AulaRecorrente
+from agendamentos.services import gerar_aulas_recorrentes
+
+
+class Command(BaseCommand):
+    help = 'Gera as aulas de um período a partir da grade de aulas recorrentes dos estúdios.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data-inicio', type=str, help='Data inicial (YYYY-MM-DD). Padrão: hoje.')
+        parser.add_argument('--dias', type=int, default=90, help='Horizonte de geração em dias. Padrão: 90.')
+        parser.add_argument('--studio', type=int, help='Gera apenas as aulas deste estúdio (ID).')
+
+    def handle(self, *args, **options):
+        try:
+            data_inicio = date.fromisoformat(options['data_inicio']) if options['data_inicio'] else timezone.localdate()
+        except ValueError:
+            raise CommandError('Formato de data inválido. Use YYYY-MM-DD.')
+        data_fim = data_inicio + timedelta(days=options['dias'] - 1)
+
+        recorrencias = AulaRecorrente.objects.filter(ativa=True)
+        if options['studio']:
+            recorrencias = recorrencias.filter(studio_id=options['studio'])
+
+        self.stdout.write(self.style.SUCCESS(f'Gerando aulas de {data_inicio} a {data_fim}...'))
+        estatisticas = gerar_aulas_recorrentes(data_inicio, data_fim, recorrencias)
+
+        self.stdout.write(f"  - {estatisticas['criadas']} aulas criadas.")
+        self.stdout.write(f"  - {estatisticas['existentes']} aulas já existentes (ignoradas).")
+        self.stdout.write(f"  - {estatisticas['fora_do_horario']} ocorrências fora do horário de funcionamento.")
+        self.stdout.write(f"  - {estatisticas['bloqueadas']} ocorrências em datas bloqueadas.")
+        self.stdout.write(self.style.SUCCESS('Geração de aulas concluída.'))
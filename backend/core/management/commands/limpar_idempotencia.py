@@ -0,0 +1,12 @@
+# core/management/commands/limpar_idempotencia.py
+from django.core.management.base import BaseCommand
+
+from core.idempotencia import limpar_chaves_expiradas
+
+
+class Command(BaseCommand):
+    help = 'Apaga as respostas gravadas para chaves de idempotência (Idempotency-Key) já vencidas.'
+
+    def handle(self, *args, **options):
+        apagadas = limpar_chaves_expiradas()
+        self.stdout.write(self.style.SUCCESS(f'{apagadas} chave(s) de idempotência vencida(s) apagada(s).'))
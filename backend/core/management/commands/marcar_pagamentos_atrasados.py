@@ -0,0 +1,51 @@
+# core/management/commands/marcar_pagamentos_atrasados.py
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from core.tarefas import enfileirar
+from financeiro.services import TAMANHO_LOTE_ATRASO, marcar_atrasados
+from studios.models import Studio
+
+
+class Command(BaseCommand):
+    help = (
+        'Marca como ATRASADO os pagamentos e parcelas PENDENTE já vencidos, em lotes, '
+        'e avisa os alunos. Pode ser agendado diariamente (cron) e reexecutado após uma interrupção.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', type=date.fromisoformat, help='Data de referência (AAAA-MM-DD). Padrão: hoje.')
+        parser.add_argument(
+            '--lote', type=int, default=TAMANHO_LOTE_ATRASO,
+            help=f'Linhas marcadas por transação (padrão: {TAMANHO_LOTE_ATRASO}).',
+        )
+        parser.add_argument(
+            '--enfileirar', action='store_true',
+            help='Em vez de executar agora, enfileira a tarefa para o run_workers.',
+        )
+
+    def handle(self, *args, **options):
+        if options['enfileirar']:
+            data = options['data'].isoformat() if options['data'] else None
+            enfileirar('financeiro.marcar_atrasados', chave='financeiro.marcar_atrasados', data_referencia=data)
+            self.stdout.write(self.style.SUCCESS('Varredura de vencidos enfileirada.'))
+            return
+
+        self.stdout.write(self.style.SUCCESS('Iniciando marcação de pagamentos atrasados...'))
+        estatisticas = marcar_atrasados(options['data'], options['lote'])
+
+        nomes = Studio.objects.in_bulk([studio_id for studio_id in estatisticas if studio_id])
+        for studio_id, totais in sorted(estatisticas.items(), key=lambda item: item[0] or 0):
+            studio = nomes.get(studio_id)
+            rotulo = studio.nome if studio else 'Sem estúdio'
+            self.stdout.write(
+                f"  - {rotulo}: {totais['pagamentos']} pagamento(s) e {totais['parcelas']} parcela(s) "
+                f"em atraso, R$ {totais['valor']:.2f}."
+            )
+
+        pagamentos = sum(totais['pagamentos'] for totais in estatisticas.values())
+        parcelas = sum(totais['parcelas'] for totais in estatisticas.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Marcação concluída. {pagamentos} pagamento(s) e {parcelas} parcela(s) marcados como atrasados.'
+        ))
@@ -0,0 +1,24 @@
+# core/management/commands/reconciliar_vagas.py
+from django.core.management.base import BaseCommand
+
+from agendamentos.models import Aula
+from agendamentos.services import reconciliar_vagas
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o contador de vagas ocupadas (Aula.vagas_ocupadas) a partir das inscrições.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--studio', type=int, help='Reconcilia apenas as aulas deste estúdio (ID).')
+        parser.add_argument('--aula', type=int, nargs='+', help='Reconcilia apenas as aulas informadas (IDs).')
+
+    def handle(self, *args, **options):
+        queryset = Aula.objects.all()
+        if options['studio']:
+            queryset = queryset.filter(studio_id=options['studio'])
+        if options['aula']:
+            queryset = queryset.filter(pk__in=options['aula'])
+
+        self.stdout.write(self.style.SUCCESS('Iniciando reconciliação do contador de vagas...'))
+        corrigidas = reconciliar_vagas(queryset)
+        self.stdout.write(self.style.SUCCESS(f'Reconciliação concluída. {corrigidas} aula(s) corrigida(s).'))
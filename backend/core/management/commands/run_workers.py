@@ -0,0 +1,45 @@
+# core/management/commands/run_workers.py
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.tarefas import executar_tarefa_em_thread, recuperar_tarefas_travadas, reservar_tarefas
+
+
+class Command(BaseCommand):
+    help = 'Consome a fila de tarefas em segundo plano (core.Tarefa) com um pool de threads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Quantidade de threads do pool (padrão: 4).')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos de espera quando a fila está vazia (padrão: 2).')
+        parser.add_argument(
+            '--tempo-limite', type=int, default=600,
+            help='Segundos após os quais uma tarefa em execução é considerada travada e volta à fila (padrão: 600).',
+        )
+        parser.add_argument('--uma-vez', action='store_true', help='Esvazia a fila e encerra, em vez de ficar escutando.')
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        tempo_limite = timedelta(seconds=options['tempo_limite'])
+
+        self.stdout.write(self.style.SUCCESS(f'Iniciando workers com {threads} thread(s)...'))
+        processadas = falhas = 0
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            try:
+                while True:
+                    recuperar_tarefas_travadas(tempo_limite)
+                    lote = reservar_tarefas(threads * 2)
+                    if not lote:
+                        if options['uma_vez']:
+                            break
+                        time.sleep(options['intervalo'])
+                        continue
+                    resultados = list(pool.map(executar_tarefa_em_thread, lote))
+                    processadas += len(resultados)
+                    falhas += resultados.count(False)
+            except KeyboardInterrupt:
+                self.stdout.write('Interrompido, aguardando as tarefas em andamento...')
+
+        self.stdout.write(self.style.SUCCESS(f'Workers encerrados. {processadas} tarefa(s) processada(s), {falhas} com falha.'))
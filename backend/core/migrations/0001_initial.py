@@ -0,0 +1,69 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="Tarefa",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("nome", models.CharField(max_length=100)),
+                ("argumentos", models.JSONField(blank=True, default=dict)),
+                (
+                    "chave_dedup",
+                    models.CharField(
+                        blank=True, max_length=200, null=True, unique=True
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDENTE", "Pendente"),
+                            ("EXECUTANDO", "Executando"),
+                            ("CONCLUIDA", "Concluída"),
+                            ("FALHOU", "Falhou"),
+                        ],
+                        default="PENDENTE",
+                        max_length=10,
+                    ),
+                ),
+                ("tentativas", models.PositiveSmallIntegerField(default=0)),
+                ("max_tentativas", models.PositiveSmallIntegerField(default=5)),
+                (
+                    "executar_apos",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("iniciada_em", models.DateTimeField(blank=True, null=True)),
+                ("concluida_em", models.DateTimeField(blank=True, null=True)),
+                ("ultimo_erro", models.TextField(blank=True)),
+                ("criada_em", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Tarefa em Segundo Plano",
+                "verbose_name_plural": "Tarefas em Segundo Plano",
+                "ordering": ["executar_apos", "pk"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "executar_apos"], name="tarefa_fila_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:31
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RespostaIdempotente",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("chave", models.CharField(max_length=255)),
+                ("impressao", models.CharField(max_length=64)),
+                (
+                    "status_code",
+                    models.PositiveSmallIntegerField(blank=True, null=True),
+                ),
+                (
+                    "corpo",
+                    models.JSONField(
+                        blank=True,
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                        null=True,
+                    ),
+                ),
+                ("criada_em", models.DateTimeField(auto_now_add=True)),
+                ("expira_em", models.DateTimeField(db_index=True)),
+                (
+                    "usuario",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="respostas_idempotentes",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Resposta Idempotente",
+                "verbose_name_plural": "Respostas Idempotentes",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("usuario", "chave"),
+                        name="idempotencia_usuario_chave_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+# core/models.py
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+
+
+class Tarefa(models.Model):
+    """
+    Trabalho em segundo plano persistido no banco, consumido pelo comando
+    `run_workers`. Efeitos colaterais pesados (lista de espera, créditos,
+    notificações) são enfileirados aqui em vez de rodar dentro da requisição.
+    """
+
+    class Status(models.TextChoices):
+        PENDENTE = "PENDENTE", "Pendente"
+        EXECUTANDO = "EXECUTANDO", "Executando"
+        CONCLUIDA = "CONCLUIDA", "Concluída"
+        FALHOU = "FALHOU", "Falhou"
+
+    nome = models.CharField(max_length=100)
+    argumentos = models.JSONField(default=dict, blank=True)
+    # Enquanto a tarefa está pendente, a chave impede que o mesmo trabalho seja
+    # enfileirado duas vezes. Ela é liberada quando um worker assume a tarefa.
+    chave_dedup = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDENTE)
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    max_tentativas = models.PositiveSmallIntegerField(default=5)
+    executar_apos = models.DateTimeField(default=timezone.now)
+    iniciada_em = models.DateTimeField(null=True, blank=True)
+    concluida_em = models.DateTimeField(null=True, blank=True)
+    ultimo_erro = models.TextField(blank=True)
+    criada_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Tarefa em Segundo Plano"
+        verbose_name_plural = "Tarefas em Segundo Plano"
+        ordering = ["executar_apos", "pk"]
+        indexes = [
+            models.Index(fields=["status", "executar_apos"], name="tarefa_fila_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.nome} ({self.get_status_display()})"
+
+
+class RespostaIdempotente(models.Model):
+    """
+    Resposta gravada para uma chave de idempotência (cabeçalho
+    `Idempotency-Key`). Uma repetição da mesma requisição pelo mesmo usuário
+    devolve a resposta gravada sem executar a view de novo. Enquanto a
+    primeira requisição não termina, `status_code` fica nulo.
+    """
+
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="respostas_idempotentes"
+    )
+    chave = models.CharField(max_length=255)
+    # Hash do método, do caminho e do corpo: a mesma chave não pode ser usada
+    # em outra requisição.
+    impressao = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    corpo = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    criada_em = models.DateTimeField(auto_now_add=True)
+    expira_em = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Resposta Idempotente"
+        verbose_name_plural = "Respostas Idempotentes"
+        constraints = [
+            models.UniqueConstraint(fields=["usuario", "chave"], name="idempotencia_usuario_chave_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.chave} ({self.status_code or 'em processamento'})"
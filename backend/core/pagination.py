@@ -0,0 +1,55 @@
+# core/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class PaginacaoCursor(CursorPagination):
+    """
+    Paginação por cursor para listagens de alto volume.
+
+    O cursor do DRF guarda apenas o valor do *primeiro* campo da ordenação
+    mais um deslocamento entre as linhas que compartilham esse valor. A
+    consulta é `WHERE campo > valor ORDER BY ... OFFSET k LIMIT n`, com `k`
+    limitado ao tamanho do grupo de empates, nunca à posição da página.
+    Com ordenação só por `-id` isso é um keyset puro; com uma data como
+    primeiro campo, o `id` que fecha a ordenação apenas desempata de forma
+    determinística e não entra no filtro. O cliente navega pelos links
+    `next`/`previous` e pode ajustar o tamanho com `?page_size=`.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-id',)
+
+
+class AulaPaginacao(PaginacaoCursor):
+    # Horários se repetem entre estúdios: o deslocamento cobre só as aulas
+    # que começam no mesmo instante do cursor.
+    page_size = 100
+    max_page_size = 500
+    ordering = ('data_hora_inicio', 'id')
+
+
+class AgendamentoPaginacao(PaginacaoCursor):
+    # AulaAluno guarda uma cópia do início da aula, dispensando o JOIN na ordenação.
+    # Os inscritos de uma mesma aula empatam no cursor e são saltados por deslocamento.
+    ordering = ('data_hora_inicio', 'id')
+
+
+class PagamentoPaginacao(PaginacaoCursor):
+    # O id segue a ordem de criação; datas de vencimento se repetem demais para servir de cursor.
+    ordering = ('-id',)
+
+
+class VendaPaginacao(PaginacaoCursor):
+    ordering = ('-id',)
+
+
+class NotificacaoPaginacao(PaginacaoCursor):
+    page_size = 20
+    ordering = ('-created_at', '-id')
+
+
+class UsuarioPaginacao(PaginacaoCursor):
+    page_size = 100
+    max_page_size = 500
+    ordering = ('-date_joined', '-id')
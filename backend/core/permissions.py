@@ -34,6 +34,38 @@ class HasRole(BasePermission):
         """
         return cls(allowed_roles)
 
+def filtrar_por_studios_do_usuario(queryset, user, studio_filter_field):
+    """
+    Restringe `queryset` aos estúdios do colaborador logado, seguindo o
+    caminho `studio_filter_field` (ex.: 'studio', 'aula__studio'). ADMIN_MASTER
+    e usuários que não são colaboradores (ex.: alunos) recebem o queryset
+    original; colaboradores sem perfil reconhecido não recebem nada.
+    """
+    # Se o usuário não for um colaborador (ex: Aluno), retorna a queryset original.
+    # Alunos precisam ver todas as aulas para poderem se agendar.
+    if not user.is_authenticated or not hasattr(user, 'colaborador'):
+        return queryset
+
+    perfis = user.colaborador.perfis.values_list('nome', flat=True)
+
+    # 1. ADMIN_MASTER sempre vê tudo.
+    if 'ADMIN_MASTER' in perfis:
+        return queryset
+
+    # 2. Outros perfis de staff (Admin, Recep, etc.) têm os dados filtrados.
+    if any(p in ['ADMINISTRADOR', 'RECEPCIONISTA', 'INSTRUTOR', 'FISIOTERAPEUTA'] for p in perfis):
+        studios_do_colaborador = user.colaborador.unidades.all()
+
+        # Constrói o filtro dinamicamente. Ex: {'studio__in': studios_do_colaborador}
+        filter_kwargs = {f"{studio_filter_field}__in": studios_do_colaborador}
+
+        # Retorna a queryset filtrada e remove duplicatas se houver joins.
+        return queryset.filter(**filter_kwargs).distinct()
+
+    # Por segurança, se um colaborador não tiver um perfil que se encaixe nas regras, não retorna nada.
+    return queryset.none()
+
+
 class StudioPermissionMixin:
     """
     Mixin para filtrar querysets com base nos estúdios do colaborador logado.
@@ -48,36 +80,10 @@ class StudioPermissionMixin:
         """
         Sobrescreve o método get_queryset da ViewSet para aplicar a lógica de filtro.
         """
+        if not self.studio_filter_field:
+            # Gera um erro claro se o mixin for usado sem configurar o campo de filtro.
+            raise NotImplementedError(
+                f"{self.__class__.__name__} usa StudioPermissionMixin mas não definiu 'studio_filter_field'."
+            )
         # Pega a queryset original definida na ViewSet (ex: Aula.objects.all())
-        queryset = super().get_queryset()
-        user = self.request.user
-
-        # Se o usuário não for um colaborador (ex: Aluno), retorna a queryset original.
-        # Alunos precisam ver todas as aulas para poderem se agendar.
-        if not user.is_authenticated or not hasattr(user, 'colaborador'):
-            return queryset
-
-        perfis = user.colaborador.perfis.values_list('nome', flat=True)
-
-        # 1. ADMIN_MASTER sempre vê tudo.
-        if 'ADMIN_MASTER' in perfis:
-            return queryset
-
-        # 2. Outros perfis de staff (Admin, Recep, etc.) têm os dados filtrados.
-        if any(p in ['ADMINISTRADOR', 'RECEPCIONISTA', 'INSTRUTOR', 'FISIOTERAPEUTA'] for p in perfis):
-            if not self.studio_filter_field:
-                # Gera um erro claro se o mixin for usado sem configurar o campo de filtro.
-                raise NotImplementedError(
-                    f"{self.__class__.__name__} usa StudioPermissionMixin mas não definiu 'studio_filter_field'."
-                )
-
-            studios_do_colaborador = user.colaborador.unidades.all()
-            
-            # Constrói o filtro dinamicamente. Ex: {'studio__in': studios_do_colaborador}
-            filter_kwargs = {f"{self.studio_filter_field}__in": studios_do_colaborador}
-            
-            # Retorna a queryset filtrada e remove duplicatas se houver joins.
-            return queryset.filter(**filter_kwargs).distinct()
-
-        # Por segurança, se um colaborador não tiver um perfil que se encaixe nas regras, não retorna nada.
-        return queryset.none()
+        return filtrar_por_studios_do_usuario(super().get_queryset(), self.request.user, self.studio_filter_field)
@@ -0,0 +1,72 @@
+# core/plano_consulta.py
+"""
+Plano de consulta declarativo para serializers aninhados.
+
+Cada serializer declara no seu Meta apenas as relações que ele mesmo lê
+por campos com `source` pontilhado (ex.: `source='produto.nome'`):
+
+    class VendaProdutoNestedSerializer(serializers.ModelSerializer):
+        class Meta:
+            model = VendaProduto
+            fields = [...]
+            select_related = ['produto']
+
+O plano do serializer raiz é montado percorrendo os campos. Serializers
+aninhados e campos `many=True` de relação entram sozinhos, com o caminho
+prefixado pelo `source` do campo. Abaixo de uma relação "para muitos", todo
+o restante vira prefetch. As views com `PlanoConsultaMixin` aplicam o plano
+em `get_queryset`, e cada listagem fica com um número fixo de consultas.
+"""
+from rest_framework import serializers
+
+
+def _juntar(prefixo, caminho):
+    return f"{prefixo}__{caminho}" if prefixo else caminho
+
+
+def plano_de_consulta(serializer, prefixo="", em_lista=False):
+    """Devolve (select_related, prefetch_related) de uma instância de serializer."""
+    selects, prefetches = [], []
+    meta = getattr(serializer, "Meta", None)
+    for caminho in getattr(meta, "select_related", ()):
+        (prefetches if em_lista else selects).append(_juntar(prefixo, caminho))
+    for caminho in getattr(meta, "prefetch_related", ()):
+        prefetches.append(_juntar(prefixo, caminho))
+
+    for campo in serializer.fields.values():
+        if campo.write_only or campo.source == "*":
+            continue
+        caminho = _juntar(prefixo, campo.source.replace(".", "__"))
+        if isinstance(campo, serializers.ManyRelatedField):
+            prefetches.append(caminho)
+            continue
+        muitos = isinstance(campo, serializers.ListSerializer)
+        filho = campo.child if muitos else campo
+        if not isinstance(filho, serializers.BaseSerializer):
+            continue
+        (prefetches if muitos or em_lista else selects).append(caminho)
+        filho_selects, filho_prefetches = plano_de_consulta(filho, caminho, em_lista or muitos)
+        selects += filho_selects
+        prefetches += filho_prefetches
+
+    return list(dict.fromkeys(selects)), list(dict.fromkeys(prefetches))
+
+
+def aplicar_plano_de_consulta(queryset, serializer_class):
+    """Aplica ao queryset o plano de consulta do serializer."""
+    selects, prefetches = plano_de_consulta(serializer_class())
+    if selects:
+        queryset = queryset.select_related(*selects)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    return queryset
+
+
+class PlanoConsultaMixin:
+    """
+    Mixin de view: aplica o plano de consulta do serializer da ação atual
+    ao queryset devolvido por get_queryset.
+    """
+
+    def get_queryset(self):
+        return aplicar_plano_de_consulta(super().get_queryset(), self.get_serializer_class())
@@ -0,0 +1,165 @@
+# core/tarefas.py
+"""
+Fila de tarefas em segundo plano apoiada no próprio banco de dados.
+
+Os signals enfileiram o trabalho pesado com `enfileirar`, que só grava a
+tarefa depois do commit da transação da requisição. O comando
+`manage.py run_workers` consome a fila com um pool de threads. Sem worker
+configurado (`TAREFAS_WORKER_ATIVO` desligado), a própria requisição esvazia
+a fila logo após o commit, para que nenhuma tarefa fique esquecida.
+
+Cada app declara suas tarefas em um módulo `tarefas.py`, descoberto
+automaticamente na inicialização:
+
+    @tarefa("agendamentos.promover_lista_espera")
+    def promover(aula_id):
+        ...
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import Tarefa
+
+logger = logging.getLogger(__name__)
+
+_REGISTRO = {}
+
+# Intervalo base do backoff exponencial entre tentativas e seu teto.
+ATRASO_BASE_SEGUNDOS = 30
+ATRASO_MAXIMO_SEGUNDOS = 3600
+
+
+def tarefa(nome):
+    """Registra a função decorada como executora das tarefas `nome`."""
+
+    def decorador(func):
+        _REGISTRO[nome] = func
+        return func
+
+    return decorador
+
+
+def descobrir_tarefas():
+    """Importa o módulo `tarefas` de cada app instalado."""
+    autodiscover_modules("tarefas")
+
+
+def enfileirar(nome, chave=None, max_tentativas=5, **argumentos):
+    """
+    Enfileira uma tarefa para ser gravada após o commit da transação atual.
+
+    Se a transação sofrer rollback, nada é enfileirado. `chave` deduplica
+    tarefas: enquanto houver uma pendente com a mesma chave, novas chamadas
+    são descartadas. Os argumentos precisam ser serializáveis em JSON.
+
+    Sem worker configurado, as tarefas prontas são executadas ali mesmo,
+    no callback de on_commit.
+    """
+    if nome not in _REGISTRO:
+        raise LookupError(f"Tarefa '{nome}' não registrada.")
+
+    def _gravar():
+        Tarefa.objects.bulk_create(
+            [
+                Tarefa(
+                    nome=nome,
+                    argumentos=argumentos,
+                    chave_dedup=chave,
+                    max_tentativas=max_tentativas,
+                )
+            ],
+            ignore_conflicts=True,
+        )
+        if not getattr(settings, "TAREFAS_WORKER_ATIVO", False):
+            executar_pendentes()
+
+    transaction.on_commit(_gravar)
+
+
+def reservar_tarefas(limite):
+    """
+    Marca até `limite` tarefas prontas como EXECUTANDO e as devolve.
+
+    As linhas são travadas com SKIP LOCKED, então vários processos de worker
+    podem disputar a mesma fila sem pegar a mesma tarefa.
+    """
+    agora = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Tarefa.objects.select_for_update(skip_locked=True)
+            .filter(status=Tarefa.Status.PENDENTE, executar_apos__lte=agora)
+            .order_by("executar_apos", "pk")
+            .values_list("pk", flat=True)[:limite]
+        )
+        if not ids:
+            return []
+        Tarefa.objects.filter(pk__in=ids).update(
+            status=Tarefa.Status.EXECUTANDO,
+            iniciada_em=agora,
+            chave_dedup=None,
+            tentativas=F("tentativas") + 1,
+        )
+    return list(Tarefa.objects.filter(pk__in=ids).order_by("executar_apos", "pk"))
+
+
+def recuperar_tarefas_travadas(tempo_limite):
+    """Devolve à fila as tarefas EXECUTANDO há mais de `tempo_limite` (worker morto)."""
+    return Tarefa.objects.filter(
+        status=Tarefa.Status.EXECUTANDO,
+        iniciada_em__lt=timezone.now() - tempo_limite,
+    ).update(status=Tarefa.Status.PENDENTE, executar_apos=timezone.now())
+
+
+def executar_tarefa(tarefa_obj):
+    """Executa uma tarefa já reservada e registra o resultado. Retorna True em caso de sucesso."""
+    func = _REGISTRO.get(tarefa_obj.nome)
+    try:
+        if func is None:
+            raise LookupError(f"Tarefa '{tarefa_obj.nome}' não registrada.")
+        func(**tarefa_obj.argumentos)
+    except Exception as exc:
+        logger.exception("Falha na tarefa %s (#%s)", tarefa_obj.nome, tarefa_obj.pk)
+        if tarefa_obj.tentativas >= tarefa_obj.max_tentativas:
+            campos = {"status": Tarefa.Status.FALHOU, "concluida_em": timezone.now()}
+        else:
+            atraso = min(ATRASO_BASE_SEGUNDOS * 2 ** (tarefa_obj.tentativas - 1), ATRASO_MAXIMO_SEGUNDOS)
+            campos = {
+                "status": Tarefa.Status.PENDENTE,
+                "executar_apos": timezone.now() + timedelta(seconds=atraso),
+            }
+        Tarefa.objects.filter(pk=tarefa_obj.pk).update(ultimo_erro=repr(exc), **campos)
+        return False
+
+    Tarefa.objects.filter(pk=tarefa_obj.pk).update(
+        status=Tarefa.Status.CONCLUIDA, concluida_em=timezone.now(), ultimo_erro=""
+    )
+    return True
+
+
+def executar_tarefa_em_thread(tarefa_obj):
+    """Versão de `executar_tarefa` para o pool: fecha a conexão da thread ao final."""
+    try:
+        return executar_tarefa(tarefa_obj)
+    finally:
+        connections.close_all()
+
+
+def executar_pendentes(limite=100):
+    """
+    Esvazia a fila na thread atual, sem pool. Útil em testes e scripts.
+    Retorna a quantidade de tarefas processadas.
+    """
+    total = 0
+    while True:
+        lote = reservar_tarefas(limite)
+        if not lote:
+            return total
+        for tarefa_obj in lote:
+            executar_tarefa(tarefa_obj)
+        total += len(lote)
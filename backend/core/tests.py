@@ -0,0 +1,99 @@
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.models import Tarefa
+from core.tarefas import _REGISTRO, enfileirar, executar_pendentes, tarefa
+
+chamadas = []
+
+
+@tarefa("core.teste_registrar")
+def registrar(valor):
+    chamadas.append(valor)
+
+
+@tarefa("core.teste_falhar")
+def falhar():
+    raise RuntimeError("erro")
+
+
+@override_settings(TAREFAS_WORKER_ATIVO=True)
+class FilaTarefasTestCase(TestCase):
+    """
+    Testes para a fila de tarefas em segundo plano.
+    """
+
+    def setUp(self):
+        chamadas.clear()
+
+    def _tarefas(self):
+        # O banco de teste pode já ter tarefas de outros apps (ex.: enfileiradas
+        # pelas migrações); as asserções olham só para as destes testes.
+        return Tarefa.objects.filter(nome__startswith="core.teste_")
+
+    def test_tarefa_so_e_gravada_apos_o_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enfileirar("core.teste_registrar", valor=1)
+            self.assertFalse(self._tarefas().exists())
+        self.assertEqual(self._tarefas().count(), 1)
+
+        executar_pendentes()
+        self.assertEqual(chamadas, [1])
+        self.assertEqual(self._tarefas().get().status, Tarefa.Status.CONCLUIDA)
+
+    def test_rollback_descarta_a_tarefa(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    enfileirar("core.teste_registrar", valor=1)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertFalse(self._tarefas().exists())
+
+    def test_chave_deduplica_tarefas_pendentes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enfileirar("core.teste_registrar", chave="x", valor=1)
+            enfileirar("core.teste_registrar", chave="x", valor=2)
+        self.assertEqual(self._tarefas().count(), 1)
+
+        executar_pendentes()
+        # Depois de assumida pelo worker, a chave volta a aceitar tarefas.
+        with self.captureOnCommitCallbacks(execute=True):
+            enfileirar("core.teste_registrar", chave="x", valor=3)
+        executar_pendentes()
+        self.assertEqual(chamadas, [1, 3])
+
+    def test_falha_reagenda_com_backoff_ate_o_limite(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enfileirar("core.teste_falhar", max_tentativas=2)
+
+        with mock.patch("core.tarefas.logger"):
+            executar_pendentes()
+            tarefa_obj = self._tarefas().get()
+            self.assertEqual(tarefa_obj.status, Tarefa.Status.PENDENTE)
+            self.assertGreater(tarefa_obj.executar_apos, timezone.now())
+
+            self._tarefas().update(executar_apos=timezone.now())
+            executar_pendentes()
+        tarefa_obj.refresh_from_db()
+        self.assertEqual(tarefa_obj.status, Tarefa.Status.FALHOU)
+        self.assertEqual(tarefa_obj.tentativas, 2)
+        self.assertIn("RuntimeError", tarefa_obj.ultimo_erro)
+
+    @override_settings(TAREFAS_WORKER_ATIVO=False)
+    def test_sem_worker_executa_apos_o_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enfileirar("core.teste_registrar", valor=1)
+            self.assertEqual(chamadas, [])
+        self.assertEqual(chamadas, [1])
+        self.assertEqual(self._tarefas().get().status, Tarefa.Status.CONCLUIDA)
+
+    def test_nome_desconhecido_e_rejeitado(self):
+        self.assertNotIn("core.inexistente", _REGISTRO)
+        with self.assertRaises(LookupError):
+            enfileirar("core.inexistente")
@@ -10,6 +10,7 @@ from drf_spectacular.utils import extend_schema
 # Importar todos os modelos necessários
 from financeiro.models import Pagamento, Matricula, Produto, VendaProduto
 from agendamentos.models import Aula, ListaEspera, AulaAluno
+from agendamentos.services import filtrar_por_periodo
 from alunos.models import Aluno
 from usuarios.models import Usuario, Colaborador
 from studios.models import Studio
@@ -43,7 +44,7 @@ class DashboardAPIView(APIView):
         pagamentos_atrasados = Pagamento.objects.filter(status='ATRASADO').count()
 
         # --- DADOS DE AGENDAMENTOS ---
-        aulas_hoje = Aula.objects.filter(data_hora_inicio__date=today)
+        aulas_hoje = filtrar_por_periodo(Aula.objects.all(), today, today)
         total_vagas_hoje = aulas_hoje.aggregate(total=Sum('capacidade_maxima'))['total'] or 1
         total_inscritos_hoje = AulaAluno.objects.filter(aula__in=aulas_hoje).count()
         taxa_ocupacao = (total_inscritos_hoje / total_vagas_hoje) * 100 if total_vagas_hoje > 0 else 0
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("financeiro", "0009_historicalestoquestudio_historicalmatricula_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="pagamento",
+            index=models.Index(
+                fields=["status", "data_vencimento"], name="pagamento_status_venc_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="parcela",
+            index=models.Index(
+                fields=["status", "data_vencimento"], name="parcela_status_venc_idx"
+            ),
+        ),
+    ]
@@ -78,6 +78,12 @@ class Pagamento(models.Model):
     )
     history = HistoricalRecords()
 
+    class Meta:
+        indexes = [
+            # Varredura de vencidos (marcar_pagamentos_atrasados) e contagens por status.
+            models.Index(fields=["status", "data_vencimento"], name="pagamento_status_venc_idx"),
+        ]
+
     def __str__(self):
         return f"Pagamento {self.id} - {self.status}"
 
@@ -93,6 +99,11 @@ class Parcela(models.Model):
         max_length=10, choices=Pagamento.STATUS_CHOICES, default="PENDENTE"
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "data_vencimento"], name="parcela_status_venc_idx"),
+        ]
+
     def __str__(self):
         return f"Parcela {self.numero_parcela} do Pagamento {self.pagamento.id}"
 
@@ -1,8 +1,8 @@
 # financeiro/serializers.py
 from rest_framework import serializers
-from django.db import transaction # Importar transaction para garantir atomicidade
 import os
 from .models import Plano, Matricula, Pagamento, Produto, Venda, VendaProduto, Parcela, EstoqueStudio
+from .services import MAXIMO_PARCELAS, registrar_matricula, registrar_venda
 from studios.models import Studio
 from alunos.serializers import AlunoSerializer
 from alunos.models import Aluno
@@ -41,17 +41,14 @@ class VendaProdutoNestedSerializer(serializers.ModelSerializer):
     class Meta:
         model = VendaProduto
         fields = ['produto_id', 'nome', 'quantidade', 'preco_unitario']
+        # Plano de consulta (core.plano_consulta): `nome` vem de produto.nome.
+        select_related = ['produto']
 
 class VendaProdutoWriteSerializer(serializers.Serializer):
     produto_id = serializers.IntegerField()
     quantidade = serializers.IntegerField(min_value=1)
     preco_unitario = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
 
-    def validate_produto_id(self, value):
-        if not Produto.objects.filter(pk=value).exists():
-            raise serializers.ValidationError("Produto não encontrado.")
-        return value
-
 class PlanoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Plano
@@ -78,6 +75,10 @@ class MatriculaSerializer(serializers.ModelSerializer):
     studio_id = serializers.PrimaryKeyRelatedField(
         queryset=Studio.objects.all(), source='studio', write_only=True
     )
+    numero_parcelas = serializers.IntegerField(
+        write_only=True, required=False, min_value=1, max_value=MAXIMO_PARCELAS,
+        help_text="Se informado, o pagamento da matrícula já é criado parcelado.",
+    )
 
     class Meta:
         model = Matricula
@@ -91,7 +92,12 @@ class MatriculaSerializer(serializers.ModelSerializer):
             'studio_id',
             'data_inicio',
             'data_fim',
+            'numero_parcelas',
         ]
+
+    def create(self, validated_data):
+        # Matrícula, pagamento (signal) e parcelas na mesma transação.
+        return registrar_matricula(**validated_data)
         
 class VendaSerializer(serializers.ModelSerializer):
     studio = StudioNestedSerializer(read_only=True)
@@ -112,54 +118,10 @@ class VendaSerializer(serializers.ModelSerializer):
         fields = ['id', 'aluno', 'aluno_id', 'data_venda', 'produtos', 'produtos_vendidos', 'studio', 'studio_id', 'valor_total']
         read_only_fields = ['data_venda'] 
 
-    @transaction.atomic # Garante que todas as operações sejam bem-sucedidas ou revertidas
     def create(self, validated_data):
+        # Existência dos produtos, estoque e baixa são tratados em conjunto pelo serviço.
         produtos_data = validated_data.pop('produtos_vendidos', [])
-        
-        if not produtos_data:
-            raise serializers.ValidationError("É necessário informar pelo menos um produto para a venda.")
-
-        studio_id = validated_data.get('studio').id if validated_data.get('studio') else None
-        if not studio_id:
-            raise serializers.ValidationError("O estúdio da venda é obrigatório.")
-
-        for item_data in produtos_data:
-            produto_id = item_data['produto_id']
-            quantidade_vendida = item_data['quantidade']
-            
-            try:
-                estoque_studio = EstoqueStudio.objects.get(produto_id=produto_id, studio_id=studio_id)
-                if estoque_studio.quantidade < quantidade_vendida:
-                    produto_nome = Produto.objects.get(pk=produto_id).nome
-                    raise serializers.ValidationError(
-                        f"Estoque insuficiente para o produto '{produto_nome}' no estúdio."
-                    )
-            except EstoqueStudio.DoesNotExist:
-                produto_nome = Produto.objects.get(pk=produto_id).nome
-                raise serializers.ValidationError(
-                    f"Estoque não encontrado para o produto '{produto_nome}' no estúdio."
-                )
-
-        total_value = sum(item['preco_unitario'] * item['quantidade'] for item in produtos_data)
-        validated_data['valor_total'] = total_value
-
-        venda = Venda.objects.create(**validated_data)
-
-        for item_data in produtos_data:
-            produto = Produto.objects.get(pk=item_data['produto_id'])
-            VendaProduto.objects.create(
-                venda=venda,
-                produto=produto,
-                quantidade=item_data['quantidade'],
-                preco_unitario=item_data['preco_unitario']
-            )
-            
-            # Atualiza o estoque após a criação bem-sucedida do VendaProduto
-            estoque_studio = EstoqueStudio.objects.get(produto=produto, studio=venda.studio)
-            estoque_studio.quantidade -= item_data['quantidade']
-            estoque_studio.save()
-
-        return venda
+        return registrar_venda(produtos_data, **validated_data)
 
 class PagamentoSerializer(serializers.ModelSerializer):
     matricula = MatriculaSerializer(read_only=True) 
@@ -208,6 +170,56 @@ class PagamentoSerializer(serializers.ModelSerializer):
             )
         return value
 
+
+class PagamentoResumoSerializer(serializers.ModelSerializer):
+    """
+    Variante leve para listagens (`?formato=resumido`): ids e nomes planos em
+    vez das matrículas e vendas aninhadas, resolvidos por JOIN.
+    """
+    aluno_id = serializers.SerializerMethodField()
+    aluno_nome = serializers.SerializerMethodField()
+    plano_nome = serializers.CharField(source='matricula.plano.nome', read_only=True, default=None)
+    studio_id = serializers.SerializerMethodField()
+    studio_nome = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Pagamento
+        fields = [
+            'id',
+            'matricula_id',
+            'venda_id',
+            'aluno_id',
+            'aluno_nome',
+            'plano_nome',
+            'studio_id',
+            'studio_nome',
+            'valor_total',
+            'metodo_pagamento',
+            'status',
+            'data_vencimento',
+            'data_pagamento',
+        ]
+        select_related = ['matricula__aluno', 'matricula__plano', 'matricula__studio', 'venda__aluno', 'venda__studio']
+
+    def _origem(self, obj):
+        return obj.matricula or obj.venda
+
+    def get_aluno_id(self, obj):
+        origem = self._origem(obj)
+        return origem.aluno_id if origem else None
+
+    def get_aluno_nome(self, obj):
+        origem = self._origem(obj)
+        return origem.aluno.get_full_name() if origem and origem.aluno_id else None
+
+    def get_studio_id(self, obj):
+        origem = self._origem(obj)
+        return origem.studio_id if origem else None
+
+    def get_studio_nome(self, obj):
+        origem = self._origem(obj)
+        return origem.studio.nome if origem and origem.studio_id else None
+
 class EstoqueStudioSerializer(serializers.ModelSerializer):
     studio_nome = serializers.CharField(source='studio.nome', read_only=True)
     produto_nome = serializers.CharField(source='produto.nome', read_only=True)
@@ -234,27 +246,14 @@ class EstoqueAjusteSerializer(serializers.Serializer):
         return value
 
 class ProdutoEstoqueSerializer(serializers.ModelSerializer):
-    quantidade_em_estoque = serializers.SerializerMethodField()
+    # Anotado pela view (financeiro.services.produtos_com_estoque) para o
+    # estúdio consultado, sem uma consulta por produto.
+    quantidade_em_estoque = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Produto
         fields = ['id', 'nome', 'preco', 'quantidade_em_estoque']
 
-    def get_quantidade_em_estoque(self, obj):
-        """
-        Este método busca a quantidade em estoque do produto (obj)
-        para o estúdio específico passado no contexto.
-        """
-        studio_id = self.context.get('studio_id')
-        if not studio_id:
-            return None 
-
-        try:
-            estoque = EstoqueStudio.objects.get(produto=obj, studio_id=studio_id)
-            return estoque.quantidade
-        except EstoqueStudio.DoesNotExist:
-            return 0 
-
 class ProdutoSerializer(serializers.ModelSerializer):
     estoque_studios = EstoqueStudioSerializer(many=True, read_only=True, source='estoquestudio_set')
 
@@ -266,3 +265,12 @@ class ParcelaSerializer(serializers.ModelSerializer):
     class Meta:
         model = Parcela
         fields = '__all__'
+
+class ParcelamentoSerializer(serializers.Serializer):
+    numero_parcelas = serializers.IntegerField(min_value=1, max_value=MAXIMO_PARCELAS)
+    primeiro_vencimento = serializers.DateField(
+        required=False, help_text="Vencimento da primeira parcela. Padrão: o vencimento do pagamento."
+    )
+
+class PagarParcelaSerializer(serializers.Serializer):
+    numero_parcela = serializers.IntegerField(min_value=1)
@@ -0,0 +1,448 @@
+# financeiro/services.py
+import calendar
+import operator
+from collections import Counter, defaultdict
+from decimal import Decimal
+from functools import reduce
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Case, CharField, Count, Exists, F, OuterRef, PositiveIntegerField, Prefetch, Q, Subquery, Value, When, prefetch_related_objects
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from core.tarefas import enfileirar
+from notifications.models import Notification
+
+from .models import EstoqueStudio, Matricula, Pagamento, Parcela, Produto, Venda, VendaProduto
+
+
+# --- Projeções de estoque (leitura) ---
+
+def produtos_com_estoque(studio_id, queryset=None):
+    """
+    Anota `quantidade_em_estoque` (0 quando o produto não tem estoque no
+    estúdio) com uma subconsulta correlacionada: o catálogo inteiro sai em
+    uma única consulta, pelo índice único (produto, studio).
+    """
+    queryset = Produto.objects.all() if queryset is None else queryset
+    estoque = EstoqueStudio.objects.filter(produto=OuterRef('pk'), studio_id=studio_id).values('quantidade')[:1]
+    return queryset.annotate(
+        quantidade_em_estoque=Coalesce(Subquery(estoque), Value(0), output_field=PositiveIntegerField())
+    )
+
+
+def produtos_para_leitura(queryset=None):
+    """Produtos com o estoque de cada estúdio (e o nome do estúdio) em um único prefetch."""
+    queryset = Produto.objects.all() if queryset is None else queryset
+    return queryset.prefetch_related(
+        Prefetch('estoquestudio_set', queryset=EstoqueStudio.objects.select_related('studio').order_by('studio_id'))
+    )
+
+
+# --- Vendas (baixa de estoque em conjunto) ---
+
+def _erro_de_estoque(quantidades, estoques):
+    """
+    Erro do primeiro item que impede a venda, na ordem em que foi informado,
+    sempre no campo `produtos_vendidos`. Só roda no caminho de erro: os nomes
+    dos produtos sem estoque no estúdio são buscados em uma consulta.
+    """
+    sem_estoque = [produto_id for produto_id in quantidades if produto_id not in estoques]
+    nomes = dict(Produto.objects.filter(pk__in=sem_estoque).values_list('pk', 'nome')) if sem_estoque else {}
+    for produto_id, quantidade in quantidades.items():
+        estoque = estoques.get(produto_id)
+        if estoque is None:
+            if produto_id not in nomes:
+                mensagem = f"Produto não encontrado: {produto_id}."
+            else:
+                mensagem = f"Estoque não encontrado para o produto '{nomes[produto_id]}' no estúdio."
+            return {"produtos_vendidos": mensagem}
+        if estoque.quantidade < quantidade:
+            return {"produtos_vendidos": f"Estoque insuficiente para o produto '{estoque.produto.nome}' no estúdio."}
+    return None
+
+
+def registrar_venda(itens, **dados_venda):
+    """
+    Cria a venda e seus itens e dá baixa no estoque do estúdio com um número
+    fixo de consultas, independente da quantidade de itens.
+
+    As linhas de EstoqueStudio envolvidas são travadas de uma vez (em ordem de
+    pk, para não haver deadlock entre vendas concorrentes) e conferidas em
+    memória. Depois vêm a venda, um bulk_create dos itens e um único UPDATE
+    condicional que só baixa o estoque que ainda cobre a quantidade vendida.
+    O histórico do estoque (simple_history) é gravado em lote, já que o
+    UPDATE não passa pelo save().
+
+    `itens` é uma lista de dicts com produto_id, quantidade e preco_unitario.
+    Itens repetidos do mesmo produto somam suas quantidades na baixa.
+    """
+    if not itens:
+        raise ValidationError("É necessário informar pelo menos um produto para a venda.")
+    studio = dados_venda.get('studio')
+    if studio is None:
+        raise ValidationError("O estúdio da venda é obrigatório.")
+
+    quantidades = Counter()
+    for item in itens:
+        quantidades[item['produto_id']] += item['quantidade']
+
+    with transaction.atomic():
+        estoques = {
+            estoque.produto_id: estoque
+            for estoque in EstoqueStudio.objects.select_for_update(of=('self',))
+            .select_related('produto')
+            .filter(studio=studio, produto_id__in=list(quantidades))
+            .order_by('pk')
+        }
+        erro = _erro_de_estoque(quantidades, estoques)
+        if erro:
+            raise ValidationError(erro)
+
+        venda = Venda.objects.create(
+            valor_total=sum(item['preco_unitario'] * item['quantidade'] for item in itens),
+            **dados_venda,
+        )
+        VendaProduto.objects.bulk_create(
+            VendaProduto(
+                venda=venda,
+                produto_id=item['produto_id'],
+                quantidade=item['quantidade'],
+                preco_unitario=item['preco_unitario'],
+            )
+            for item in itens
+        )
+
+        baixados = EstoqueStudio.objects.filter(
+            reduce(operator.or_, (
+                Q(pk=estoques[produto_id].pk, quantidade__gte=quantidade)
+                for produto_id, quantidade in quantidades.items()
+            ))
+        ).update(
+            quantidade=Case(
+                *(
+                    When(pk=estoques[produto_id].pk, then=F('quantidade') - quantidade)
+                    for produto_id, quantidade in quantidades.items()
+                ),
+                default=F('quantidade'),
+                output_field=PositiveIntegerField(),
+            )
+        )
+        if baixados != len(quantidades):
+            # Só acontece se o estoque mudou sem passar pela trava (ex.: bancos
+            # sem SELECT ... FOR UPDATE). Desfaz a venda inteira.
+            raise ValidationError({"produtos_vendidos": "O estoque foi alterado durante a venda. Tente novamente."})
+
+        for produto_id, quantidade in quantidades.items():
+            estoques[produto_id].quantidade -= quantidade
+        EstoqueStudio.history.bulk_history_create(list(estoques.values()), update=True)
+
+    prefetch_related_objects(
+        [venda], Prefetch('vendaproduto_set', queryset=VendaProduto.objects.select_related('produto'))
+    )
+    return venda
+
+
+# --- Vencimentos (PENDENTE -> ATRASADO) ---
+
+# Linhas marcadas por transação. Cada lote é confirmado antes do próximo,
+# então uma varredura interrompida pode simplesmente ser executada de novo.
+TAMANHO_LOTE_ATRASO = 1000
+
+
+def _estatisticas_atraso():
+    return defaultdict(lambda: {'pagamentos': 0, 'parcelas': 0, 'valor': Decimal('0')})
+
+
+def _aviso_atraso(descricao, valor, vencimento):
+    return (
+        f"{descricao} de R$ {valor:.2f}, vencido em {vencimento.strftime('%d/%m/%Y')}, está em atraso. "
+        "Regularize para manter seus benefícios."
+    )
+
+
+def marcar_pagamentos_atrasados(data_referencia=None, tamanho_lote=TAMANHO_LOTE_ATRASO, estatisticas=None):
+    """
+    Move para ATRASADO os pagamentos PENDENTE vencidos antes de
+    `data_referencia` (hoje, por padrão), em lotes percorridos pelo índice
+    (status, data_vencimento).
+
+    Cada lote é travado com SKIP LOCKED (um pagamento sendo editado fica para
+    a próxima execução), atualizado com um único UPDATE ... WHERE id IN (...),
+    registrado no histórico com bulk_history_create e avisado ao aluno com um
+    bulk_create de notificações. Retorna as estatísticas por estúdio.
+    """
+    data_referencia = data_referencia or timezone.localdate()
+    estatisticas = _estatisticas_atraso() if estatisticas is None else estatisticas
+    tipo_pagamento = ContentType.objects.get_for_model(Pagamento)
+    while True:
+        with transaction.atomic():
+            pagamentos = list(
+                Pagamento.objects.select_for_update(skip_locked=True, of=('self',))
+                .select_related('matricula', 'venda')
+                .filter(status='PENDENTE', data_vencimento__lt=data_referencia)
+                # Pagamentos parcelados seguem o status das parcelas (sincronizar_status_pagamentos).
+                .exclude(Exists(Parcela.objects.filter(pagamento=OuterRef('pk'))))
+                .order_by('data_vencimento', 'pk')[:tamanho_lote]
+            )
+            if not pagamentos:
+                break
+            Pagamento.objects.filter(pk__in=[pagamento.pk for pagamento in pagamentos], status='PENDENTE').update(
+                status='ATRASADO'
+            )
+            notificacoes = []
+            for pagamento in pagamentos:
+                pagamento.status = 'ATRASADO'
+                origem = pagamento.matricula or pagamento.venda
+                studio_id = origem.studio_id if origem else None
+                estatisticas[studio_id]['pagamentos'] += 1
+                estatisticas[studio_id]['valor'] += pagamento.valor_total
+                if origem and origem.aluno_id:
+                    notificacoes.append(Notification(
+                        recipient_id=origem.aluno_id,
+                        message=_aviso_atraso("Seu pagamento", pagamento.valor_total, pagamento.data_vencimento),
+                        level=Notification.NotificationLevel.WARNING,
+                        content_type=tipo_pagamento,
+                        object_id=pagamento.pk,
+                    ))
+            # O UPDATE não passa pelo save(): o histórico é gravado em lote.
+            Pagamento.history.bulk_history_create(pagamentos, update=True)
+            Notification.objects.bulk_create(notificacoes)
+    return estatisticas
+
+
+def marcar_parcelas_atrasadas(data_referencia=None, tamanho_lote=TAMANHO_LOTE_ATRASO, estatisticas=None):
+    """
+    Move para ATRASADO as parcelas PENDENTE vencidas, com os mesmos lotes
+    de marcar_pagamentos_atrasados, e sincroniza o status dos pagamentos
+    afetados. Parcela não tem histórico próprio.
+    """
+    data_referencia = data_referencia or timezone.localdate()
+    estatisticas = _estatisticas_atraso() if estatisticas is None else estatisticas
+    tipo_parcela = ContentType.objects.get_for_model(Parcela)
+    while True:
+        with transaction.atomic():
+            parcelas = list(
+                Parcela.objects.select_for_update(skip_locked=True, of=('self',))
+                .filter(status='PENDENTE', data_vencimento__lt=data_referencia)
+                .order_by('data_vencimento', 'pk')
+                .values_list(
+                    'pk', 'pagamento_id', 'numero_parcela', 'valor', 'data_vencimento',
+                    Coalesce('pagamento__matricula__aluno_id', 'pagamento__venda__aluno_id'),
+                    Coalesce('pagamento__matricula__studio_id', 'pagamento__venda__studio_id'),
+                )[:tamanho_lote]
+            )
+            if not parcelas:
+                break
+            Parcela.objects.filter(pk__in=[parcela[0] for parcela in parcelas], status='PENDENTE').update(
+                status='ATRASADO'
+            )
+            sincronizar_status_pagamentos({parcela[1] for parcela in parcelas})
+            notificacoes = []
+            for pk, _, numero, valor, vencimento, aluno_id, studio_id in parcelas:
+                estatisticas[studio_id]['parcelas'] += 1
+                estatisticas[studio_id]['valor'] += valor
+                if aluno_id:
+                    notificacoes.append(Notification(
+                        recipient_id=aluno_id,
+                        message=_aviso_atraso(f"A parcela {numero}", valor, vencimento),
+                        level=Notification.NotificationLevel.WARNING,
+                        content_type=tipo_parcela,
+                        object_id=pk,
+                    ))
+            Notification.objects.bulk_create(notificacoes)
+    return estatisticas
+
+
+def marcar_atrasados(data_referencia=None, tamanho_lote=TAMANHO_LOTE_ATRASO):
+    """Marca pagamentos e parcelas vencidos como ATRASADO, somando as estatísticas por estúdio."""
+    estatisticas = _estatisticas_atraso()
+    marcar_pagamentos_atrasados(data_referencia, tamanho_lote, estatisticas)
+    marcar_parcelas_atrasadas(data_referencia, tamanho_lote, estatisticas)
+    return dict(estatisticas)
+
+
+# --- Parcelamento ---
+
+# Parcelas aceitas por pagamento (planos anuais em até 12 vezes).
+MAXIMO_PARCELAS = 12
+
+
+def dividir_valor(valor, numero_parcelas):
+    """
+    Divide `valor` em `numero_parcelas` partes com duas casas decimais que
+    somam exatamente o total. Os centavos que sobram da divisão vão, um a
+    um, para as primeiras parcelas (100,00 em 3 vezes: 33,34 + 33,33 + 33,33).
+    """
+    centavos = int((Decimal(valor) * 100).to_integral_value())
+    base, resto = divmod(centavos, numero_parcelas)
+    return [Decimal(base + (1 if indice < resto else 0)) / 100 for indice in range(numero_parcelas)]
+
+
+def _somar_meses(data, meses):
+    """Mesma data `meses` depois, limitada ao último dia do mês (31/01 + 1 mês = 28/02 ou 29/02)."""
+    mes = data.month - 1 + meses
+    ano, mes = data.year + mes // 12, mes % 12 + 1
+    return data.replace(year=ano, month=mes, day=min(data.day, calendar.monthrange(ano, mes)[1]))
+
+
+def gerar_parcelas(pagamento, numero_parcelas, primeiro_vencimento=None):
+    """
+    Divide um pagamento PENDENTE em `numero_parcelas` parcelas mensais, a
+    primeira vencendo em `primeiro_vencimento` (o vencimento do pagamento,
+    por padrão). O número de consultas não depende da quantidade de parcelas:
+    uma trava no pagamento (que já confere se ele foi parcelado) e um
+    bulk_create.
+
+    A partir daí, o status do pagamento acompanha o das parcelas
+    (sincronizar_status_pagamentos).
+    """
+    if not 1 <= numero_parcelas <= MAXIMO_PARCELAS:
+        raise ValidationError(f"O número de parcelas deve estar entre 1 e {MAXIMO_PARCELAS}.")
+
+    with transaction.atomic():
+        pagamento = (
+            Pagamento.objects.select_for_update(of=('self',))
+            .annotate(parcelado=Exists(Parcela.objects.filter(pagamento=OuterRef('pk'))))
+            .get(pk=pagamento.pk)
+        )
+        if pagamento.status != 'PENDENTE':
+            raise ValidationError("Somente pagamentos pendentes podem ser parcelados.")
+        if pagamento.parcelado:
+            raise ValidationError("Este pagamento já foi parcelado.")
+
+        primeiro_vencimento = primeiro_vencimento or pagamento.data_vencimento
+        return Parcela.objects.bulk_create(
+            Parcela(
+                pagamento=pagamento,
+                numero_parcela=indice + 1,
+                valor=valor,
+                data_vencimento=_somar_meses(primeiro_vencimento, indice),
+            )
+            for indice, valor in enumerate(dividir_valor(pagamento.valor_total, numero_parcelas))
+        )
+
+
+def registrar_matricula(numero_parcelas=None, **dados_matricula):
+    """
+    Cria a matrícula (o signal gera o pagamento) e, se pedido, já parcela o
+    pagamento, tudo na mesma transação e com um número fixo de consultas.
+    """
+    with transaction.atomic():
+        matricula = Matricula.objects.create(**dados_matricula)
+        if numero_parcelas:
+            gerar_parcelas(Pagamento.objects.get(matricula=matricula), numero_parcelas)
+    return matricula
+
+
+def sincronizar_status_pagamentos(pagamento_ids):
+    """
+    Recalcula o status dos pagamentos parcelados a partir das parcelas, com
+    contagens agregadas em uma consulta:
+
+    - nenhuma parcela pendente ou atrasada: PAGO;
+    - ao menos uma parcela atrasada: ATRASADO;
+    - caso contrário: PENDENTE.
+
+    Só pagamentos PENDENTE ou ATRASADO são recalculados (um pagamento pago
+    ou cancelado não volta atrás). Os pagamentos são travados antes da
+    contagem, na mesma transação. Os que mudaram são atualizados com um
+    UPDATE por status de destino e entram no histórico em lote. Como o
+    UPDATE não dispara o post_save, os que quitam uma matrícula enfileiram
+    aqui a geração de créditos e o aviso de pagamento confirmado, como os
+    signals fazem. Retorna quantos pagamentos mudaram.
+    """
+    with transaction.atomic():
+        travados = list(
+            Pagamento.objects.select_for_update()
+            .filter(pk__in=pagamento_ids, status__in=['PENDENTE', 'ATRASADO'])
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        if not travados:
+            return 0
+        pagamentos = list(
+            Pagamento.objects.filter(pk__in=travados)
+            .annotate(
+                total_parcelas=Count('parcelas'),
+                parcelas_em_aberto=Count('parcelas', filter=Q(parcelas__status__in=['PENDENTE', 'ATRASADO'])),
+                parcelas_atrasadas=Count('parcelas', filter=Q(parcelas__status='ATRASADO')),
+            )
+            .annotate(
+                status_calculado=Case(
+                    When(parcelas_em_aberto=0, then=Value('PAGO')),
+                    When(parcelas_atrasadas__gt=0, then=Value('ATRASADO')),
+                    default=Value('PENDENTE'),
+                    output_field=CharField(),
+                )
+            )
+            .filter(total_parcelas__gt=0)
+            .exclude(status=F('status_calculado'))
+        )
+        if not pagamentos:
+            return 0
+
+        por_status = defaultdict(list)
+        for pagamento in pagamentos:
+            pagamento.status = pagamento.status_calculado
+            por_status[pagamento.status].append(pagamento)
+
+        hoje = timezone.localdate()
+        for novo_status, grupo in por_status.items():
+            campos = {'status': novo_status}
+            if novo_status == 'PAGO':
+                campos['data_pagamento'] = hoje
+                for pagamento in grupo:
+                    pagamento.data_pagamento = hoje
+            Pagamento.objects.filter(pk__in=[pagamento.pk for pagamento in grupo]).update(**campos)
+        Pagamento.history.bulk_history_create(pagamentos, update=True)
+        for pagamento in por_status.get('PAGO', []):
+            if pagamento.matricula_id:
+                enfileirar(
+                    "financeiro.gerar_creditos_matricula",
+                    chave=f"gerar_creditos_matricula:{pagamento.matricula_id}",
+                    matricula_id=pagamento.matricula_id,
+                )
+                enfileirar(
+                    "notifications.notificar_pagamento_confirmado",
+                    chave=f"notificar_pagamento_confirmado:{pagamento.pk}",
+                    pagamento_id=pagamento.pk,
+                )
+    return len(pagamentos)
+
+
+def pagar_parcela(pagamento, numero_parcela):
+    """
+    Marca uma parcela em aberto como PAGO e sincroniza o status do pagamento.
+
+    Os créditos da matrícula são liberados já na primeira parcela paga: o
+    parcelamento financia o plano, não adia o acesso às aulas. A tarefa é
+    idempotente e usa a mesma chave da quitação, então as parcelas seguintes
+    (e a quitação final) não geram créditos de novo.
+    """
+    with transaction.atomic():
+        pagas = Parcela.objects.filter(
+            pagamento=pagamento, numero_parcela=numero_parcela, status__in=['PENDENTE', 'ATRASADO']
+        ).update(status='PAGO')
+        if not pagas:
+            raise ValidationError({"numero_parcela": "Parcela não encontrada ou já quitada."})
+        sincronizar_status_pagamentos([pagamento.pk])
+        if pagamento.matricula_id:
+            enfileirar(
+                "financeiro.gerar_creditos_matricula",
+                chave=f"gerar_creditos_matricula:{pagamento.matricula_id}",
+                matricula_id=pagamento.matricula_id,
+            )
+
+
+def quitar_parcelas_em_aberto(pagamento_id):
+    """
+    Marca como PAGO as parcelas ainda em aberto de um pagamento quitado
+    diretamente (sem passar por pagar_parcela), para que a varredura de
+    vencidos não as marque depois como ATRASADO. Retorna quantas mudaram.
+    """
+    return Parcela.objects.filter(
+        pagamento_id=pagamento_id, status__in=['PENDENTE', 'ATRASADO']
+    ).update(status='PAGO')
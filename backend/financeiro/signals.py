@@ -2,10 +2,10 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.utils import timezone
 
-from agendamentos.models import CreditoAula
-from alunos.models import Aluno
+from core.tarefas import enfileirar
 
 from .models import Matricula, Pagamento
+from .services import quitar_parcelas_em_aberto
 
 
 @receiver(post_save, sender=Matricula)
@@ -28,34 +28,26 @@ def gerar_pagamento_matricula(sender, instance, created, **kwargs):
 @receiver(post_save, sender=Pagamento)
 def gerar_creditos_aula(sender, instance, created, **kwargs):
     """
-    Gera os Créditos de Aula para o aluno quando um pagamento de
-    matrícula é confirmado (status='PAGO').
-
-    Verifica se os créditos já foram gerados para essa matrícula para
-    evitar duplicidade.
+    Enfileira a geração dos Créditos de Aula quando um pagamento de
+    matrícula é confirmado (status='PAGO'). A tarefa é idempotente e a
+    chave evita enfileirar duas vezes a mesma matrícula.
     """
     # Condição 1: O status do pagamento deve ser 'PAGO'
     # Condição 2: O pagamento deve estar associado a uma matrícula
-    if instance.status == 'PAGO' and instance.matricula:
-        matricula = instance.matricula
-
-        try:
-            aluno_perfil = matricula.aluno.aluno
-        except AttributeError:
-            return
-
-        if not CreditoAula.objects.filter(matricula_origem=matricula).exists():
-            
-            plano = matricula.plano
-            
-            # Cálculo dos créditos
-            semanas = (plano.duracao_dias / 7)
-            total_creditos = int(semanas * plano.creditos_semanais)
-            data_validade = matricula.data_fim
-
-            CreditoAula.objects.create(
-                aluno=aluno_perfil, 
-                quantidade=total_creditos,
-                data_validade=data_validade,
-                matricula_origem=matricula 
-            )
\ No newline at end of file
+    if instance.status == 'PAGO' and instance.matricula_id:
+        enfileirar(
+            "financeiro.gerar_creditos_matricula",
+            chave=f"gerar_creditos_matricula:{instance.matricula_id}",
+            matricula_id=instance.matricula_id,
+        )
+
+
+@receiver(post_save, sender=Pagamento)
+def quitar_parcelas(sender, instance, created, **kwargs):
+    """
+    Um pagamento parcelado marcado como PAGO direto (ex.: PATCH de status)
+    leva junto as parcelas em aberto; sem isso elas seguiriam PENDENTE e
+    cairiam como ATRASADO num pagamento já quitado.
+    """
+    if instance.status == 'PAGO' and not created:
+        quitar_parcelas_em_aberto(instance.pk)
@@ -0,0 +1,52 @@
+# financeiro/tarefas.py
+from datetime import date
+
+from agendamentos.models import CreditoAula
+from alunos.models import Aluno
+from core.tarefas import tarefa
+
+from .models import Matricula
+from .services import marcar_atrasados
+
+
+@tarefa("financeiro.gerar_creditos_matricula")
+def gerar_creditos_matricula(matricula_id):
+    """
+    Gera os Créditos de Aula de uma matrícula paga.
+
+    Verifica se os créditos já foram gerados para essa matrícula para
+    evitar duplicidade, então pode ser reexecutada com segurança.
+    """
+    if CreditoAula.objects.filter(matricula_origem_id=matricula_id).exists():
+        return
+
+    matricula = Matricula.objects.select_related("plano").filter(pk=matricula_id).first()
+    if matricula is None:
+        return
+
+    # O aluno da matrícula é um Usuario; os créditos pertencem ao perfil de Aluno.
+    aluno_perfil = Aluno.objects.filter(usuario_id=matricula.aluno_id).first()
+    if aluno_perfil is None:
+        return
+
+    plano = matricula.plano
+
+    # Cálculo dos créditos
+    semanas = (plano.duracao_dias / 7)
+    total_creditos = int(semanas * plano.creditos_semanais)
+
+    CreditoAula.objects.create(
+        aluno=aluno_perfil,
+        quantidade=total_creditos,
+        data_validade=matricula.data_fim,
+        matricula_origem=matricula
+    )
+
+
+@tarefa("financeiro.marcar_atrasados")
+def marcar_atrasados_tarefa(data_referencia=None):
+    """
+    Versão enfileirável da varredura de vencidos (manage.py marcar_pagamentos_atrasados).
+    `data_referencia` vem como texto ISO, já que os argumentos da fila são JSON.
+    """
+    marcar_atrasados(date.fromisoformat(data_referencia) if data_referencia else None)
@@ -4,9 +4,13 @@ from django.urls import reverse
 from django.contrib.auth import get_user_model
 from studios.models import Studio
 from usuarios.models import Colaborador, Perfil
-from financeiro.models import Plano, Matricula, Produto, EstoqueStudio, Venda, VendaProduto
+from financeiro.models import Plano, Matricula, Produto, EstoqueStudio, Venda, VendaProduto, Pagamento, Parcela
 from django.utils import timezone
 from datetime import timedelta
+from core.tarefas import executar_pendentes
+from agendamentos.models import CreditoAula
+from financeiro.services import marcar_parcelas_atrasadas
+from notifications.models import Notification
 
 User = get_user_model()
 
@@ -80,4 +84,359 @@ class FinanceiroPerformCreateTests(APITestCase):
         VendaProduto.objects.create(venda=venda, produto=self.produto, quantidade=15, preco_unitario=self.produto.preco)
         
         estoque = EstoqueStudio.objects.get(produto=self.produto, studio=self.studio1)
-        self.assertEqual(estoque.quantidade, 10) 
\ No newline at end of file
+        self.assertEqual(estoque.quantidade, 10) 
+
+class VendaEstoqueTests(APITestCase):
+    """
+    Testes para a criação de vendas com baixa de estoque em conjunto.
+    """
+
+    def setUp(self):
+        from studios.models import FuncaoOperacional
+
+        self.studio = Studio.objects.create(nome='Studio Vendas', endereco='Rua das Vendas')
+        perfil_admin, _ = Perfil.objects.get_or_create(nome='ADMINISTRADOR')
+        funcao_admin, _ = FuncaoOperacional.objects.get_or_create(nome='Administrador de Studio')
+        self.admin = User.objects.create_user(
+            username='admin.vendas', email='admin.vendas@example.com', password='password123', cpf='97979797971',
+        )
+        colaborador = Colaborador.objects.create(usuario=self.admin)
+        colaborador.perfis.add(perfil_admin)
+        colaborador.unidades.add(self.studio, through_defaults={'permissao': funcao_admin})
+
+        self.produtos = [Produto.objects.create(nome=f'Produto {i}', preco=10) for i in range(30)]
+        EstoqueStudio.objects.bulk_create(
+            EstoqueStudio(produto=produto, studio=self.studio, quantidade=5) for produto in self.produtos
+        )
+        self.url = reverse('venda-list')
+        self.client.force_authenticate(user=self.admin)
+
+    def _vender(self, produtos, quantidade=2):
+        return self.client.post(self.url, {
+            'studio_id': self.studio.pk,
+            'aluno_id': None,
+            'produtos_vendidos': [
+                {'produto_id': produto.pk, 'quantidade': quantidade, 'preco_unitario': '10.00'} for produto in produtos
+            ],
+        }, format='json')
+
+    def test_numero_de_consultas_nao_depende_dos_itens(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as um_item:
+            self.assertEqual(self._vender(self.produtos[:1]).status_code, status.HTTP_201_CREATED)
+        with CaptureQueriesContext(connection) as trinta_itens:
+            response = self._vender(self.produtos)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(trinta_itens), len(um_item))
+        self.assertEqual(len(response.data['produtos']), 30)
+        self.assertEqual(str(response.data['valor_total']), '600.00')
+        self.assertEqual(EstoqueStudio.objects.get(produto=self.produtos[0]).quantidade, 1)
+        self.assertEqual(EstoqueStudio.objects.get(produto=self.produtos[1]).quantidade, 3)
+        # A baixa em lote também fica no histórico do estoque.
+        self.assertEqual(EstoqueStudio.history.filter(produto=self.produtos[0], history_type='~').count(), 2)
+
+    def test_estoque_insuficiente_nao_baixa_nada(self):
+        response = self._vender(self.produtos[:3], quantidade=6)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data['produtos_vendidos'], "Estoque insuficiente para o produto 'Produto 0' no estúdio."
+        )
+        self.assertFalse(Venda.objects.exists())
+        self.assertEqual(set(EstoqueStudio.objects.values_list('quantidade', flat=True)), {5})
+
+    def test_erros_de_produto_vem_no_campo_produtos_vendidos(self):
+        sem_estoque = Produto.objects.create(nome='Produto Sem Estoque', preco=10)
+        inexistente = Produto(pk=sem_estoque.pk + 1000, nome='Inexistente', preco=10)
+
+        for produto, mensagem in (
+            (sem_estoque, "Estoque não encontrado para o produto 'Produto Sem Estoque' no estúdio."),
+            (inexistente, f"Produto não encontrado: {inexistente.pk}."),
+        ):
+            response = self._vender([produto])
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data['produtos_vendidos'], mensagem)
+        self.assertFalse(Venda.objects.exists())
+
+
+class CatalogoEstoqueConsultasTests(APITestCase):
+    """
+    Regressão de consultas do catálogo de produtos com estoque por estúdio.
+    """
+
+    def setUp(self):
+        self.studio = Studio.objects.create(nome='Studio Catálogo', endereco='Rua do Catálogo')
+        outro_studio = Studio.objects.create(nome='Studio Vizinho', endereco='Rua Vizinha')
+        self.produtos = [Produto.objects.create(nome=f'Item {i}', preco=5) for i in range(25)]
+        EstoqueStudio.objects.bulk_create(
+            EstoqueStudio(produto=produto, studio=self.studio, quantidade=i) for i, produto in enumerate(self.produtos[:20])
+        )
+        EstoqueStudio.objects.create(produto=self.produtos[-1], studio=outro_studio, quantidade=99)
+        self.client.force_authenticate(user=User.objects.create_user(
+            username='cliente.catalogo', email='cliente.catalogo@example.com', password='password123',
+            cpf='98989898981',
+        ))
+
+    def test_catalogo_em_numero_fixo_de_consultas(self):
+        for nome in ('produtos-por-studio', 'estoque-por-studio'):
+            # Estúdio (404) e produtos com o estoque anotado, independente do número de produtos.
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse(nome, args=[self.studio.pk]))
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            estoque = {item['id']: item['quantidade_em_estoque'] for item in response.data}
+            self.assertEqual(len(estoque), 25)
+            self.assertEqual(estoque[self.produtos[3].pk], 3)
+            # Sem linha de estoque no estúdio consultado (mesmo tendo em outro).
+            self.assertEqual(estoque[self.produtos[-1].pk], 0)
+
+
+class PagamentoListagemConsultasTests(APITestCase):
+    """
+    Regressão de consultas da listagem de pagamentos (plano de consulta dos serializers).
+    """
+
+    def setUp(self):
+        from studios.models import FuncaoOperacional
+
+        self.studio = Studio.objects.create(nome='Studio Pagamentos', endereco='Rua dos Pagamentos')
+        perfil_admin, _ = Perfil.objects.get_or_create(nome='ADMINISTRADOR')
+        funcao_admin, _ = FuncaoOperacional.objects.get_or_create(nome='Administrador de Studio')
+        self.admin = User.objects.create_user(
+            username='admin.pagamentos', email='admin.pagamentos@example.com', password='password123',
+            cpf='99999999901',
+        )
+        colaborador = Colaborador.objects.create(usuario=self.admin)
+        colaborador.perfis.add(perfil_admin)
+        colaborador.unidades.add(self.studio, through_defaults={'permissao': funcao_admin})
+
+        self.plano = Plano.objects.create(nome='Plano Mensal', duracao_dias=30, creditos_semanais=2, preco=150)
+        self.produtos = [Produto.objects.create(nome=f'Acessório {i}', preco=20) for i in range(3)]
+        self.total_alunos = 0
+        self.url = reverse('pagamento-list')
+        self.client.force_authenticate(user=self.admin)
+
+    def _criar_pagamentos(self, quantidade):
+        from alunos.models import Aluno
+
+        for _ in range(quantidade):
+            self.total_alunos += 1
+            usuario = User.objects.create_user(
+                username=f'pagante{self.total_alunos}', email=f'pagante{self.total_alunos}@example.com',
+                password='password123', cpf=f'{88800000000 + self.total_alunos}', first_name='Pagante',
+            )
+            aluno = Aluno.objects.create(usuario=usuario, dataNascimento='1990-01-01', contato='11988888888')
+            aluno.unidades.add(self.studio)
+            # O signal de Matricula gera o pagamento da matrícula.
+            Matricula.objects.create(
+                aluno=usuario, plano=self.plano, studio=self.studio,
+                data_inicio=timezone.localdate(), data_fim=timezone.localdate() + timedelta(days=30),
+            )
+            venda = Venda.objects.create(aluno=usuario, studio=self.studio, valor_total=40)
+            for produto in self.produtos:
+                VendaProduto.objects.create(venda=venda, produto=produto, quantidade=1, preco_unitario=20)
+            Pagamento.objects.create(venda=venda, valor_total=40, data_vencimento=timezone.localdate())
+
+    def _consultas_da_listagem(self, parametros=None):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(self.url, parametros or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(consultas), response.data['results']
+
+    def test_listagem_completa_em_numero_fixo_de_consultas(self):
+        self._criar_pagamentos(2)
+        poucas, _ = self._consultas_da_listagem()
+        self._criar_pagamentos(8)
+        muitas, resultados = self._consultas_da_listagem()
+
+        self.assertEqual(muitas, poucas)
+        self.assertEqual(len(resultados), 20)
+        da_matricula = next(item for item in resultados if item['matricula'])
+        self.assertEqual(da_matricula['matricula']['plano']['nome'], 'Plano Mensal')
+        self.assertEqual(da_matricula['matricula']['aluno']['unidades'], [self.studio.pk])
+        da_venda = next(item for item in resultados if item['venda'])
+        self.assertEqual([produto['nome'] for produto in da_venda['venda']['produtos']],
+                         ['Acessório 0', 'Acessório 1', 'Acessório 2'])
+
+    def test_formato_resumido(self):
+        self._criar_pagamentos(2)
+        poucas, _ = self._consultas_da_listagem({'formato': 'resumido'})
+        self._criar_pagamentos(8)
+        muitas, resultados = self._consultas_da_listagem({'formato': 'resumido'})
+
+        self.assertEqual(muitas, poucas)
+        da_matricula = next(item for item in resultados if item['matricula_id'])
+        self.assertEqual(da_matricula['plano_nome'], 'Plano Mensal')
+        self.assertEqual(da_matricula['studio_nome'], 'Studio Pagamentos')
+        self.assertEqual(da_matricula['aluno_nome'], 'Pagante')
+        da_venda = next(item for item in resultados if item['venda_id'])
+        self.assertIsNone(da_venda['plano_nome'])
+        self.assertEqual(da_venda['studio_id'], self.studio.pk)
+        self.assertNotIn('matricula', da_venda)
+
+
+class MarcarAtrasadosTests(APITestCase):
+    """
+    Varredura de vencidos: pagamentos e parcelas PENDENTE passam a ATRASADO em lote.
+    """
+
+    def setUp(self):
+        from financeiro.services import marcar_atrasados
+
+        self.marcar_atrasados = marcar_atrasados
+        self.hoje = timezone.localdate()
+        self.studio = Studio.objects.create(nome='Studio Cobrança', endereco='Rua da Cobrança')
+        self.aluno = User.objects.create_user(
+            username='devedor', email='devedor@example.com', password='password123', cpf='77700000001',
+        )
+        plano = Plano.objects.create(nome='Plano Cobrança', duracao_dias=30, creditos_semanais=2, preco=120)
+        matricula = Matricula.objects.create(
+            aluno=self.aluno, plano=plano, studio=self.studio,
+            data_inicio=self.hoje, data_fim=self.hoje + timedelta(days=30),
+        )
+        # O signal de Matricula gera um pagamento que vence daqui a 10 dias.
+        self.futuro = Pagamento.objects.get(matricula=matricula)
+        self.vencido = Pagamento.objects.create(
+            matricula=matricula, valor_total=80, data_vencimento=self.hoje - timedelta(days=3),
+        )
+        # Pagamento parcelado: vencido, mas o status segue o das parcelas.
+        self.parcelado = Pagamento.objects.create(
+            matricula=matricula, valor_total=120, data_vencimento=self.hoje - timedelta(days=1),
+        )
+        self.parcela_vencida = Parcela.objects.create(
+            pagamento=self.parcelado, numero_parcela=1, valor=60, data_vencimento=self.hoje - timedelta(days=1),
+        )
+        self.parcela_futura = Parcela.objects.create(
+            pagamento=self.parcelado, numero_parcela=2, valor=60, data_vencimento=self.hoje + timedelta(days=29),
+        )
+
+    def test_marca_somente_vencidos_e_avisa_o_aluno(self):
+        estatisticas = self.marcar_atrasados(tamanho_lote=1)
+
+        self.vencido.refresh_from_db()
+        self.futuro.refresh_from_db()
+        self.parcela_vencida.refresh_from_db()
+        self.parcela_futura.refresh_from_db()
+        self.assertEqual(self.vencido.status, 'ATRASADO')
+        self.assertEqual(self.futuro.status, 'PENDENTE')
+        self.assertEqual(self.parcela_vencida.status, 'ATRASADO')
+        self.assertEqual(self.parcela_futura.status, 'PENDENTE')
+        self.parcelado.refresh_from_db()
+        self.assertEqual(self.parcelado.status, 'ATRASADO')
+
+        self.assertEqual(estatisticas[self.studio.id]['pagamentos'], 1)
+        self.assertEqual(estatisticas[self.studio.id]['parcelas'], 1)
+        self.assertEqual(estatisticas[self.studio.id]['valor'], 140)
+
+        self.assertEqual(self.vencido.history.first().history_type, '~')
+        self.assertEqual(self.vencido.history.first().status, 'ATRASADO')
+        self.assertEqual(Notification.objects.filter(recipient=self.aluno).count(), 2)
+
+    def test_reexecucao_nao_altera_nada(self):
+        self.marcar_atrasados()
+        self.assertEqual(self.marcar_atrasados(), {})
+        self.assertEqual(Notification.objects.filter(recipient=self.aluno).count(), 2)
+
+
+class ParcelamentoTests(APITestCase):
+    """
+    Geração de parcelas: divisão exata em centavos, criação em lote e status do pagamento.
+    """
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin.parcelas', email='admin.parcelas@example.com', password='password123',
+            cpf='66600000001', is_superuser=True,
+        )
+        self.studio = Studio.objects.create(nome='Studio Parcelas', endereco='Rua das Parcelas')
+        self.plano_anual = Plano.objects.create(nome='Plano Anual', duracao_dias=365, creditos_semanais=2, preco='1000.00')
+        self.aluno = User.objects.create_user(
+            username='parcelante', email='parcelante@example.com', password='password123', cpf='66600000002',
+        )
+        from alunos.models import Aluno
+        Aluno.objects.create(usuario=self.aluno, dataNascimento='1990-01-01', contato='11977777777')
+        self.client.force_authenticate(user=self.admin)
+
+    def _matricular(self, **extra):
+        hoje = timezone.localdate()
+        return self.client.post(reverse('matricula-list'), {
+            'aluno_id': self.aluno.id, 'plano_id': self.plano_anual.id, 'studio_id': self.studio.id,
+            'data_inicio': hoje.isoformat(), 'data_fim': (hoje + timedelta(days=365)).isoformat(), **extra,
+        }, format='json')
+
+    def test_dividir_valor_soma_exatamente_o_total(self):
+        from decimal import Decimal
+        from financeiro.services import dividir_valor
+
+        self.assertEqual(dividir_valor(Decimal('100.00'), 3), [Decimal('33.34'), Decimal('33.33'), Decimal('33.33')])
+        self.assertEqual(sum(dividir_valor(Decimal('1000.00'), 12)), Decimal('1000.00'))
+
+    def test_matricula_anual_em_12_parcelas_com_consultas_fixas(self):
+        # Número fixo de consultas: não cresce com a quantidade de parcelas.
+        with self.assertNumQueries(16):
+            response = self._matricular(numero_parcelas=12)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+
+        pagamento = Pagamento.objects.get(matricula_id=response.data['id'])
+        parcelas = list(pagamento.parcelas.order_by('numero_parcela'))
+        self.assertEqual(len(parcelas), 12)
+        self.assertEqual(sum(parcela.valor for parcela in parcelas), pagamento.valor_total)
+        self.assertEqual(parcelas[0].data_vencimento, pagamento.data_vencimento)
+        primeiro = pagamento.data_vencimento
+        for indice, parcela in enumerate(parcelas):
+            meses = (parcela.data_vencimento.year - primeiro.year) * 12 + parcela.data_vencimento.month - primeiro.month
+            self.assertEqual(meses, indice)
+
+    def test_parcelar_pagamento_pela_api_e_quitar_parcelas(self):
+        response = self._matricular()
+        pagamento = Pagamento.objects.get(matricula_id=response.data['id'])
+        url = reverse('pagamento-parcelar', args=[pagamento.id])
+
+        response = self.client.post(url, {'numero_parcelas': 2}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual([parcela['valor'] for parcela in response.data], ['500.00', '500.00'])
+
+        response = self.client.post(url, {'numero_parcelas': 2}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        url_pagar = reverse('pagamento-pagar-parcela', args=[pagamento.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url_pagar, {'numero_parcela': 1}, format='json')
+        pagamento.refresh_from_db()
+        self.assertEqual(pagamento.status, 'PENDENTE')
+        # A primeira parcela paga já libera os créditos da matrícula.
+        executar_pendentes()
+        self.assertEqual(CreditoAula.objects.filter(matricula_origem_id=pagamento.matricula_id).count(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url_pagar, {'numero_parcela': 2}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        pagamento.refresh_from_db()
+        self.assertEqual(pagamento.status, 'PAGO')
+        self.assertEqual(pagamento.data_pagamento, timezone.localdate())
+        self.assertEqual(pagamento.history.first().status, 'PAGO')
+
+        # O UPDATE não passa pelo post_save: o aviso de confirmação vem da sincronização.
+        executar_pendentes()
+        self.assertTrue(Notification.objects.filter(
+            recipient=self.aluno, object_id=pagamento.pk, level=Notification.NotificationLevel.SUCCESS
+        ).exists())
+        self.assertEqual(CreditoAula.objects.filter(matricula_origem_id=pagamento.matricula_id).count(), 1)
+
+    def test_quitar_pagamento_parcelado_direto_quita_as_parcelas(self):
+        response = self._matricular(numero_parcelas=3)
+        pagamento = Pagamento.objects.get(matricula_id=response.data['id'])
+
+        pagamento.status = 'PAGO'
+        pagamento.save()
+
+        self.assertEqual(set(pagamento.parcelas.values_list('status', flat=True)), {'PAGO'})
+        # Nada sobra para a varredura marcar como atrasado.
+        estatisticas = marcar_parcelas_atrasadas(timezone.localdate() + timedelta(days=400))
+        self.assertEqual(dict(estatisticas), {})
@@ -2,7 +2,7 @@ from rest_framework import viewsets, status, generics
 from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
 from drf_spectacular.utils import extend_schema, extend_schema_view
@@ -17,18 +17,25 @@ from .serializers import (
     PlanoSerializer,
     MatriculaSerializer,
     PagamentoSerializer,
+    PagamentoResumoSerializer,
     ProdutoSerializer,
     VendaSerializer,
     EstoqueAjusteSerializer,
     EstoqueStudioSerializer,
     ProdutoEstoqueSerializer,
+    ParcelaSerializer,
+    ParcelamentoSerializer,
+    PagarParcelaSerializer,
     create_historical_serializer,
 )
 from .permissions import IsAdminFinanceiro, IsPaymentOwner, CanManagePagamentos, IsAlunoOwner, IsAlunoOwnerOfMatricula
 from django.db.models import Q
+from core.pagination import PagamentoPaginacao, VendaPaginacao
+from core.plano_consulta import PlanoConsultaMixin
+from .services import gerar_parcelas, pagar_parcela, produtos_com_estoque, produtos_para_leitura
 
 @extend_schema(tags=['Financeiro - Matrículas (Aluno)'])
-class MinhasMatriculasListView(generics.ListAPIView):
+class MinhasMatriculasListView(PlanoConsultaMixin, generics.ListAPIView):
     """
     Endpoint para o aluno logado visualizar suas próprias matrículas.
     """
@@ -46,14 +53,11 @@ class MinhasMatriculasListView(generics.ListAPIView):
         Retorna as matrículas do aluno logado, ordenadas da mais recente para a mais antiga.
         """
         user = self.request.user # O objeto Usuario
-        return Matricula.objects.filter(aluno=user).select_related( # Filtrar por Usuario
-            'aluno', # aluna é FK para Usuario
-            'plano',
-            'studio'
-        ).order_by('-data_inicio')
+        # As relações lidas pelo serializer entram pelo plano de consulta (PlanoConsultaMixin).
+        return Matricula.objects.filter(aluno=user).order_by('-data_inicio')
 
 @extend_schema(tags=['Financeiro - Pagamentos (Aluno)'])
-class MeusPagamentosListView(generics.ListAPIView):
+class MeusPagamentosListView(PlanoConsultaMixin, generics.ListAPIView):
     """
     Endpoint para o aluno logado visualizar seus próprios pagamentos.
     """
@@ -74,10 +78,6 @@ class MeusPagamentosListView(generics.ListAPIView):
         # Filtra pagamentos associados a matrículas do aluno OU a vendas do aluno
         return Pagamento.objects.filter(
             Q(matricula__aluno=user) | Q(venda__aluno=user)
-        ).select_related(
-            'matricula__aluno', # aluna é FK para Usuario
-            'matricula__plano',
-            'venda__aluno' # aluna é FK para Usuario
         ).order_by('-data_vencimento')
 
 
@@ -92,23 +92,15 @@ class PlanoViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAdminFinanceiro]
 
 @extend_schema(tags=['Matrículas'])
-class MatriculaViewSet(viewsets.ModelViewSet):
+class MatriculaViewSet(PlanoConsultaMixin, viewsets.ModelViewSet):
     """
     API endpoint para gerenciar Matrículas de alunos em planos.
     Acesso restrito a Admin Master e Administradores.
+    O perfil do aluno, o plano e o studio vêm pelo plano de consulta do serializer.
     """
+    queryset = Matricula.objects.all()
     serializer_class = MatriculaSerializer
     permission_classes = [IsAdminFinanceiro]
-    def get_queryset(self):
-        """
-        Otimiza a consulta para evitar problemas de N+1
-        ao buscar o perfil do aluno, o plano e o studio.
-        """
-        return Matricula.objects.select_related(
-            'aluno', # aluna é FK para Usuario
-            'plano',
-            'studio'
-        ).all()
 
     def perform_create(self, serializer):
         serializer.save()
@@ -151,15 +143,23 @@ class MatriculaViewSet(viewsets.ModelViewSet):
     partial_update=extend_schema(summary="Atualizar Parcialmente (Admin)"),
     destroy=extend_schema(summary="Excluir Pagamento (Admin)"),
 )
-class PagamentoViewSet(viewsets.ModelViewSet):
+class PagamentoViewSet(PlanoConsultaMixin, viewsets.ModelViewSet):
     """
     API endpoint para gerenciar Pagamentos.
+    Na listagem, `?formato=resumido` troca as matrículas e vendas aninhadas
+    por ids e nomes planos (PagamentoResumoSerializer).
     """
     queryset = Pagamento.objects.all()
     serializer_class = PagamentoSerializer
     permission_classes = [CanManagePagamentos]
+    pagination_class = PagamentoPaginacao
     parser_classes = [MultiPartParser, FormParser]
 
+    def get_serializer_class(self):
+        if self.action == 'list' and self.request.query_params.get('formato') == 'resumido':
+            return PagamentoResumoSerializer
+        return super().get_serializer_class()
+
     @extend_schema(
         summary="Anexar Comprovante (Aluno)",
         description="Endpoint para o aluno (dono) fazer upload do seu comprovante.",
@@ -229,7 +229,7 @@ class PagamentoViewSet(viewsets.ModelViewSet):
         """
         Busca um pagamento pelo ID da venda associada.
         """
-        pagamento = get_object_or_404(Pagamento, venda__id=venda_id)
+        pagamento = get_object_or_404(self.get_queryset(), venda__id=venda_id)
         serializer = self.get_serializer(pagamento)
         return Response(serializer.data)
 
@@ -249,6 +249,41 @@ class PagamentoViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @extend_schema(
+        summary="Parcelar Pagamento",
+        description=(
+            "Divide um pagamento pendente em parcelas mensais (até 12). Os centavos da divisão "
+            "vão para as primeiras parcelas, e o status do pagamento passa a seguir o das parcelas."
+        ),
+        request=ParcelamentoSerializer,
+        responses={201: ParcelaSerializer(many=True)}
+    )
+    @action(detail=True, methods=['post'], permission_classes=[IsAdminFinanceiro], parser_classes=[JSONParser, FormParser])
+    def parcelar(self, request, pk=None):
+        pagamento = self.get_object()
+        entrada = ParcelamentoSerializer(data=request.data)
+        entrada.is_valid(raise_exception=True)
+        parcelas = gerar_parcelas(pagamento, **entrada.validated_data)
+        return Response(ParcelaSerializer(parcelas, many=True).data, status=status.HTTP_201_CREATED)
+
+    @extend_schema(
+        summary="Quitar Parcela",
+        description="Marca uma parcela como paga e recalcula o status do pagamento.",
+        request=PagarParcelaSerializer,
+        responses={200: ParcelaSerializer(many=True)}
+    )
+    @action(
+        detail=True, methods=['post'], url_path='pagar-parcela',
+        permission_classes=[IsAdminFinanceiro], parser_classes=[JSONParser, FormParser]
+    )
+    def pagar_parcela(self, request, pk=None):
+        pagamento = self.get_object()
+        entrada = PagarParcelaSerializer(data=request.data)
+        entrada.is_valid(raise_exception=True)
+        pagar_parcela(pagamento, entrada.validated_data['numero_parcela'])
+        parcelas = pagamento.parcelas.order_by('numero_parcela')
+        return Response(ParcelaSerializer(parcelas, many=True).data)
+
     @extend_schema(
         summary="Consultar Histórico do Pagamento",
         responses=create_historical_serializer(Pagamento.history.model)(many=True)
@@ -270,6 +305,9 @@ class ProdutoViewSet(viewsets.ModelViewSet):
     serializer_class = ProdutoSerializer
     permission_classes = [IsAdminFinanceiro]
 
+    def get_queryset(self):
+        return produtos_para_leitura(super().get_queryset())
+
 @extend_schema(
     tags=['Produtos'],
     description='Endpoint para listar todos os produtos do catálogo, incluindo a quantidade em estoque para um estúdio específico.'
@@ -285,23 +323,22 @@ class ProdutosPorStudioView(APIView):
         # Garante que o estúdio existe
         get_object_or_404(Studio, pk=studio_id)
 
-        # Pega todos os produtos do catálogo
-        produtos = Produto.objects.all()
+        # Todo o catálogo, com o estoque do estúdio anotado na mesma consulta
+        produtos = produtos_com_estoque(studio_id)
 
-        # Passa o 'studio_id' para o contexto do serializer
-        # para que ele possa buscar a quantidade correta
-        serializer = ProdutoEstoqueSerializer(produtos, many=True, context={'studio_id': studio_id})
+        serializer = ProdutoEstoqueSerializer(produtos, many=True)
 
         return Response(serializer.data)
 
 @extend_schema(tags=['Vendas'])
-class VendaViewSet(viewsets.ModelViewSet):
+class VendaViewSet(PlanoConsultaMixin, viewsets.ModelViewSet):
     """
     API endpoint para gerenciar Vendas de produtos.
     """
     queryset = Venda.objects.all()
     serializer_class = VendaSerializer
     permission_classes = [CanManagePagamentos]
+    pagination_class = VendaPaginacao
 
     def perform_create(self, serializer):
         serializer.save()
@@ -324,10 +361,8 @@ class VendaViewSet(viewsets.ModelViewSet):
         Busca vendas pelo ID do aluno associado.
         """
         # Usamos filter() pois um aluno pode ter várias vendas (histórico)
+        # Os itens e produtos já vêm pelo plano de consulta do serializer (sem N+1).
         queryset = self.get_queryset().filter(aluno__id=aluno_id)
-        
-        # Otimiza a consulta para buscar os produtos relacionados e evitar N+1 queries
-        queryset = queryset.prefetch_related('produtos')
 
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
@@ -401,12 +436,10 @@ class EstoquePorStudioView(APIView):
         # Garante que o estúdio existe
         get_object_or_404(Studio, pk=studio_id)
 
-        # Pega todos os produtos do catálogo
-        produtos = Produto.objects.all()
+        # Todo o catálogo, com o estoque do estúdio anotado na mesma consulta
+        produtos = produtos_com_estoque(studio_id)
 
-        # Passa o 'studio_id' para o contexto do serializer
-        # para que ele possa buscar a quantidade correta
-        serializer = ProdutoEstoqueSerializer(produtos, many=True, context={'studio_id': studio_id})
+        serializer = ProdutoEstoqueSerializer(produtos, many=True)
 
         return Response(serializer.data)
 
@@ -419,6 +452,6 @@ class EstoquePorProdutoView(APIView):
 
     def get(self, request, produto_id, format=None):
         get_object_or_404(Produto, pk=produto_id)
-        estoque = EstoqueStudio.objects.filter(produto_id=produto_id)
+        estoque = EstoqueStudio.objects.filter(produto_id=produto_id).select_related('produto', 'studio')
         serializer = EstoqueStudioSerializer(estoque, many=True)
         return Response(serializer.data)
@@ -39,6 +39,10 @@ class Notification(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Notificação'
+        indexes = [
+            # Listagem paginada por cursor das notificações de cada usuário.
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notification_recipient_idx'),
+        ]
         verbose_name_plural = 'Notificações'
 
     def __str__(self):
@@ -2,66 +2,53 @@
 from django.db.models.signals import post_save, pre_delete
 from django.dispatch import receiver
 from django.contrib.contenttypes.models import ContentType
+from core.tarefas import enfileirar
 from .models import Notification
 from financeiro.models import Pagamento, Produto
-from usuarios.models import Usuario, Colaborador, Perfil
+from usuarios.models import Usuario
 from agendamentos.models import Aula
+from agendamentos.services import em_cancelamento_em_lote
 
 def criar_notificacao_para_admins(instance, message, level='INFO'):
     """
-    Função auxiliar para criar notificações para todos os admins.
+    Função auxiliar que enfileira notificações para todos os admins.
+    O fan-out por admin roda no worker, não na requisição.
     """
-    admin_roles = ['ADMIN_MASTER', 'ADMINISTRADOR']
-    admins = Usuario.objects.filter(colaborador__perfis__nome__in=admin_roles).distinct()
-    content_type = ContentType.objects.get_for_model(instance)
-
-    for admin in admins:
-        Notification.objects.create(
-            recipient=admin,
-            message=message,
-            level=level,
-            content_type=content_type,
-            object_id=instance.pk
-        )
+    enfileirar(
+        "notifications.notificar_perfis",
+        perfis=['ADMIN_MASTER', 'ADMINISTRADOR'],
+        message=message,
+        level=level,
+        content_type_id=ContentType.objects.get_for_model(instance).pk,
+        object_id=instance.pk,
+    )
 
 @receiver(post_save, sender=Usuario)
 def notificar_novo_usuario(sender, instance, created, **kwargs):
     """
     Cenário 8: Notifica o ADMIN_MASTER quando um novo usuário se cadastra.
     """
-    try:
-        Perfil.objects.get(nome='ADMIN_MASTER')
-    except Perfil.DoesNotExist:
-        return 
-
     if created:
-        try:
-            
-            admin_master_user = Usuario.objects.get(colaborador__perfis__nome='ADMIN_MASTER')
-            Notification.objects.create(
-                recipient=admin_master_user,
-                message=f"Um novo usuário, {instance.get_full_name()}, acabou de se cadastrar no sistema.",
-                level=Notification.NotificationLevel.INFO,
-                content_object=instance
-            )
-        except Usuario.DoesNotExist:
-            
-            pass
+        enfileirar(
+            "notifications.notificar_perfis",
+            perfis=['ADMIN_MASTER'],
+            message=f"Um novo usuário, {instance.get_full_name()}, acabou de se cadastrar no sistema.",
+            level=Notification.NotificationLevel.INFO,
+            content_type_id=ContentType.objects.get_for_model(Usuario).pk,
+            object_id=instance.pk,
+        )
 
 @receiver(post_save, sender=Pagamento)
 def notificar_pagamento_confirmado(sender, instance, created, **kwargs):
     """
     Cenário 2: Notifica o aluno quando seu pagamento é confirmado.
     """
-    if instance.status == 'PAGO' and not created:
-        if instance.matricula:
-            aluno_usuario = instance.matricula.aluno
-            Notification.objects.create(
-                recipient=aluno_usuario,
-                message=f"Seu pagamento de R$ {instance.valor_total} foi confirmado! Seus créditos para o {instance.matricula.plano.nome} já estão disponíveis.",
-                level=Notification.NotificationLevel.SUCCESS,
-                content_object=instance
-            )
+    if instance.status == 'PAGO' and not created and instance.matricula_id:
+        enfileirar(
+            "notifications.notificar_pagamento_confirmado",
+            chave=f"notificar_pagamento_confirmado:{instance.pk}",
+            pagamento_id=instance.pk,
+        )
 
 @receiver(post_save, sender=Produto)
 def notificar_estoque_baixo(sender, instance, **kwargs):
@@ -74,11 +61,18 @@ def notificar_estoque_baixo(sender, instance, **kwargs):
 def notificar_cancelamento_aula(sender, instance, **kwargs):
     """
     Cenário 5: Notifica os alunos inscritos quando uma aula é cancelada.
+    Os destinatários são lidos agora, antes de as inscrições serem apagadas.
+    O cancelamento em lote (agendamentos.services.cancelar_aulas) avisa os alunos por conta própria.
     """
-    alunos_inscritos = instance.alunos_inscritos.all()
-    for inscricao in alunos_inscritos:
-        Notification.objects.create(
-            recipient=inscricao.aluno.usuario,
-            message=f"Aviso: A aula de {instance.modalidade.nome} no dia {instance.data_hora_inicio.strftime('%d/%m às %H:%M')} foi cancelada. Seu crédito de aula foi estornado.",
-            level=Notification.NotificationLevel.WARNING,
-        )
+    if em_cancelamento_em_lote():
+        return
+    # A PK de Aluno é o próprio usuário, então aluno_id já é o destinatário.
+    recipient_ids = list(instance.alunos_inscritos.values_list('aluno_id', flat=True))
+    if not recipient_ids:
+        return
+    enfileirar(
+        "notifications.notificar_usuarios",
+        recipient_ids=recipient_ids,
+        message=f"Aviso: A aula de {instance.modalidade.nome} no dia {instance.data_hora_inicio.strftime('%d/%m às %H:%M')} foi cancelada. Seu crédito de aula foi estornado.",
+        level=Notification.NotificationLevel.WARNING,
+    )
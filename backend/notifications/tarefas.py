@@ -0,0 +1,63 @@
+# notifications/tarefas.py
+from core.tarefas import tarefa
+from usuarios.models import Usuario
+
+from .models import Notification
+
+ADMIN_ROLES = ['ADMIN_MASTER', 'ADMINISTRADOR']
+
+
+def _criar_em_lote(recipient_ids, message, level, content_type_id=None, object_id=None):
+    Notification.objects.bulk_create(
+        Notification(
+            recipient_id=recipient_id,
+            message=message,
+            level=level,
+            content_type_id=content_type_id,
+            object_id=object_id,
+        )
+        for recipient_id in recipient_ids
+    )
+
+
+@tarefa("notifications.notificar_usuarios")
+def notificar_usuarios(recipient_ids, message, level=Notification.NotificationLevel.INFO,
+                       content_type_id=None, object_id=None):
+    """Cria a mesma notificação para uma lista de usuários com um único INSERT."""
+    _criar_em_lote(recipient_ids, message, level, content_type_id, object_id)
+
+
+@tarefa("notifications.notificar_perfis")
+def notificar_perfis(perfis, message, level=Notification.NotificationLevel.INFO,
+                     content_type_id=None, object_id=None):
+    """Cria a notificação para todos os colaboradores com algum dos perfis informados."""
+    recipient_ids = (
+        Usuario.objects.filter(colaborador__perfis__nome__in=perfis)
+        .values_list('pk', flat=True)
+        .distinct()
+    )
+    _criar_em_lote(list(recipient_ids), message, level, content_type_id, object_id)
+
+
+@tarefa("notifications.notificar_pagamento_confirmado")
+def notificar_pagamento_confirmado(pagamento_id):
+    """
+    Cenário 2: Notifica o aluno quando seu pagamento é confirmado.
+    """
+    from django.contrib.contenttypes.models import ContentType
+    from financeiro.models import Pagamento
+
+    pagamento = (
+        Pagamento.objects.select_related('matricula__plano')
+        .filter(pk=pagamento_id, status='PAGO', matricula__isnull=False)
+        .first()
+    )
+    if pagamento is None:
+        return
+    Notification.objects.create(
+        recipient_id=pagamento.matricula.aluno_id,
+        message=f"Seu pagamento de R$ {pagamento.valor_total} foi confirmado! Seus créditos para o {pagamento.matricula.plano.nome} já estão disponíveis.",
+        level=Notification.NotificationLevel.SUCCESS,
+        content_type=ContentType.objects.get_for_model(Pagamento),
+        object_id=pagamento.pk,
+    )
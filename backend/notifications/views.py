@@ -6,6 +6,7 @@ from rest_framework.permissions import IsAuthenticated
 from drf_spectacular.utils import extend_schema
 from .models import Notification
 from .serializers import NotificationSerializer
+from core.pagination import NotificacaoPaginacao
 
 @extend_schema(tags=['Notificações'])
 class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
@@ -14,6 +15,7 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     """
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = NotificacaoPaginacao
 
     def get_queryset(self):
         """Retorna apenas as notificações do usuário logado."""
@@ -32,3 +34,9 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
         """Marca todas as notificações do usuário como lidas."""
         self.get_queryset().update(is_read=True)
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=['get'], url_path='unread-count')
+    def unread_count(self, request):
+        """Conta as notificações não lidas, sem depender das páginas já carregadas."""
+        total = self.get_queryset().filter(is_read=False).count()
+        return Response({'unread_count': total})
@@ -16,6 +16,7 @@ from .permissions import IsAdminMasterOrReadOnly, IsStudioAdminOrAdminMaster
 from financeiro.models import Matricula, Venda, EstoqueStudio, Pagamento, Produto
 from avaliacoes.models import Avaliacao
 from agendamentos.models import Aula, ListaEspera, AulaAluno
+from agendamentos.services import filtrar_por_periodo
 from alunos.models import Aluno
 from usuarios.models import Usuario, Colaborador
 from notifications.models import Notification
@@ -67,7 +68,7 @@ class DashboardStudioView(APIView):
         ).count()
 
         # --- DADOS DE AGENDAMENTOS ---
-        aulas_hoje = Aula.objects.filter(studio=studio, data_hora_inicio__date=today)
+        aulas_hoje = filtrar_por_periodo(Aula.objects.filter(studio=studio), today, today)
         total_vagas_hoje = aulas_hoje.aggregate(total=Sum('capacidade_maxima'))['total'] or 1
         total_inscritos_hoje = AulaAluno.objects.filter(aula__in=aulas_hoje).count()
         taxa_ocupacao = (total_inscritos_hoje / total_vagas_hoje) * 100 if total_vagas_hoje > 0 else 0
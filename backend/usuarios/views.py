@@ -9,6 +9,7 @@ from drf_spectacular.utils import extend_schema
 
 from .models import Usuario, Colaborador, Perfil
 from .serializers import UsuarioSerializer, ColaboradorSerializer, PerfilSerializer
+from core.pagination import UsuarioPaginacao
 
 
 @extend_schema(
@@ -65,6 +66,9 @@ class UsuarioViewSet(viewsets.ModelViewSet):
     
     # O serializer que será usado para converter os dados.
     serializer_class = UsuarioSerializer
+
+    # Paginação por cursor: a listagem completa de usuários pode ser grande.
+    pagination_class = UsuarioPaginacao
     
     # A permissão define quem pode acessar esta view.
     # Apenas Admin Master ou Administradores podem gerenciar usuários.
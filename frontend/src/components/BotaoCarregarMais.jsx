@@ -0,0 +1,22 @@
+import React from 'react';
+
+// Botão exibido ao fim das listagens paginadas por cursor.
+const BotaoCarregarMais = ({ temMais, carregando, onClick }) => {
+  if (!temMais) return null;
+
+  return (
+    <div className="flex justify-center mt-4">
+      <button
+        type="button"
+        onClick={onClick}
+        disabled={carregando}
+        className="flex min-w-[84px] cursor-pointer items-center justify-center overflow-hidden rounded-xl h-10 px-5 bg-input-background-light dark:bg-input-background-dark text-text-light dark:text-text-dark gap-2 text-sm font-bold leading-normal disabled:opacity-50"
+      >
+        <span className="material-symbols-outlined">expand_more</span>
+        <span className="truncate">{carregando ? 'Carregando...' : 'Carregar mais'}</span>
+      </button>
+    </div>
+  );
+};
+
+export default BotaoCarregarMais;
@@ -20,6 +20,9 @@ const Header = ({ title = "Painel de Controle", showBackButton = false, greeting
     loading,
     handleMarkAsRead,
     handleMarkAllAsRead,
+    temMais,
+    carregandoMais,
+    carregarMais,
   } = useNotificationsViewModel();
 
   const toggleMenu = () => setIsMenuOpen(!isMenuOpen);
@@ -102,6 +105,9 @@ const Header = ({ title = "Painel de Controle", showBackButton = false, greeting
                 loading={loading}
                 onMarkAsRead={handleMarkAsRead}
                 onMarkAllAsRead={handleMarkAllAsRead}
+                temMais={temMais}
+                carregandoMais={carregandoMais}
+                onCarregarMais={carregarMais}
                 onClose={() => setIsNotificationsOpen(false)}
               />
             )}
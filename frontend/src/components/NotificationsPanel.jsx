@@ -1,8 +1,11 @@
 import React from 'react';
 import { useNavigate } from 'react-router-dom';
 import NotificationItem from './NotificationItem';
+import BotaoCarregarMais from './BotaoCarregarMais';
 
-const NotificationsPanel = ({ notifications, loading, onMarkAsRead, onMarkAllAsRead, onClose }) => {
+const NotificationsPanel = ({
+    notifications, loading, onMarkAsRead, onMarkAllAsRead, onClose, temMais, carregandoMais, onCarregarMais,
+}) => {
     const navigate = useNavigate();
 
     const handleNotificationClick = (notification) => {
@@ -60,6 +63,11 @@ const NotificationsPanel = ({ notifications, loading, onMarkAsRead, onMarkAllAsR
                         Nenhuma notificação nova.
                     </p>
                 )}
+                {!loading && (
+                    <div className="pb-4">
+                        <BotaoCarregarMais temMais={temMais} carregando={carregandoMais} onClick={onCarregarMais} />
+                    </div>
+                )}
             </div>
         </div>
     );
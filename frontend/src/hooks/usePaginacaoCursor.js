@@ -0,0 +1,43 @@
+import { useState, useCallback } from 'react';
+import { getPagina } from '../services/api';
+
+/**
+ * Hook para consumir listagens paginadas por cursor de forma incremental.
+ * A tela carrega a primeira página (via getPagina) e a entrega a `iniciar`;
+ * as seguintes só são buscadas quando o usuário pede mais itens.
+ * @returns {object} Itens acumulados e funções para avançar a paginação.
+ */
+export const usePaginacaoCursor = () => {
+  const [itens, setItens] = useState([]);
+  const [proxima, setProxima] = useState(null);
+  const [carregandoMais, setCarregandoMais] = useState(false);
+
+  // Substitui os itens pela primeira página de uma nova consulta.
+  const iniciar = useCallback((response) => {
+    setItens(response.data);
+    setProxima(response.proxima);
+  }, []);
+
+  // Busca a página seguinte e a acrescenta ao fim da lista.
+  const carregarMais = useCallback(async () => {
+    if (!proxima || carregandoMais) return;
+    setCarregandoMais(true);
+    try {
+      // O link `next` já carrega os filtros e o cursor da página seguinte.
+      const response = await getPagina(proxima);
+      setItens(prev => [...prev, ...response.data]);
+      setProxima(response.proxima);
+    } finally {
+      setCarregandoMais(false);
+    }
+  }, [proxima, carregandoMais]);
+
+  return {
+    itens,
+    setItens,
+    iniciar,
+    carregarMais,
+    temMais: Boolean(proxima),
+    carregandoMais,
+  };
+};
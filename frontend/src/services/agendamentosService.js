@@ -1,14 +1,14 @@
-import api from './api';
+import api, { getPagina } from './api';
 
 const agendamentosService = {
   /**
-   * Busca todos os agendamentos do aluno autenticado.
-   * @returns {Promise<Array>} Uma lista de agendamentos.
+   * Busca a primeira página dos agendamentos do aluno autenticado, em ordem de início.
+   * @param {object} params - Filtros opcionais { data_inicio, data_fim, page_size } (datas em YYYY-MM-DD).
+   * @returns {Promise<object>} A resposta com os agendamentos em `data` e o link da página seguinte em `proxima`.
    */
-  getMeusAgendamentos: async () => {
+  getMeusAgendamentos: async (params = {}) => {
     try {
-      const response = await api.get('/agendamentos/aulas-alunos/');
-      return response.data;
+      return await getPagina('/agendamentos/aulas-alunos/', { params });
     } catch (error) {
       console.error("Erro ao buscar meus agendamentos:", error);
       throw error;
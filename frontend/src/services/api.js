@@ -76,6 +76,39 @@ api.interceptors.response.use(
 
 export default api;
 
+// As listagens volumosas da API são paginadas por cursor ({ next, previous, results }).
+// Busca uma única página: `data` traz os itens e `proxima` o link da página
+// seguinte (null na última página ou em endpoints não paginados).
+export const getPagina = async (url, config = {}) => {
+  const response = await api.get(url, config);
+  const { data } = response;
+  if (!data || !Array.isArray(data.results)) {
+    return { ...response, proxima: null };
+  }
+  return { ...response, data: data.results, proxima: data.next };
+};
+
+// Segue os links `next` e devolve todos os itens em `data`. Só serve para
+// listas pequenas e limitadas (ex.: usuários de um select); telas de volume
+// alto devem usar getPagina com o hook usePaginacaoCursor.
+export const getTodasAsPaginas = async (url, config = {}) => {
+  const itens = [];
+  let response = await api.get(url, config);
+  while (true) {
+    const { data } = response;
+    if (!data || !Array.isArray(data.results)) {
+      // Endpoint não paginado: devolve a resposta como veio.
+      return response;
+    }
+    itens.push(...data.results);
+    if (!data.next) {
+      return { ...response, data: itens };
+    }
+    // O link `next` já carrega os filtros e o cursor da página seguinte.
+    response = await api.get(data.next, { ...config, params: undefined });
+  }
+};
+
 export const getAlunoPorCpf = (cpf) => api.get(`/alunos/${cpf}/`);
 export const getUsuario = (userId) => api.get(`/usuarios/${userId}/`);
 export const getColaboradorPorCpf = (cpf) => api.get(`/colaboradores/${cpf}/`);
@@ -1,13 +1,11 @@
-import api from './api';
+import api, { getPagina } from './api';
 
 const BASE_URL = '/agendamentos/aulas/';
 
-export const getAulas = (studioId = null) => {
-    let url = BASE_URL;
-    if (studioId) {
-        url += `?studio=${studioId}`;
-    }
-    return api.get(url);
+// Primeira página das aulas, em ordem de início. Aceita { studio, data_inicio,
+// data_fim, page_size } (datas em YYYY-MM-DD); as seguintes vêm pelo link em `proxima`.
+export const getAulas = (params = {}) => {
+    return getPagina(BASE_URL, { params });
 };
 
 export const createAula = (aulaData) => {
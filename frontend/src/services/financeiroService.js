@@ -1,4 +1,4 @@
-import api from './api';
+import api, { getPagina } from './api';
 
 const postWithFormData = (url, formData) => {
     return api.post(url, formData, {
@@ -26,10 +26,11 @@ const financeiroService = {
     },
 
     /**
-     * Retorna uma lista de todos os pagamentos.
+     * Retorna a primeira página dos pagamentos, dos mais recentes aos mais antigos.
+     * As seguintes são buscadas pelo link em `proxima`.
      */
     getPagamentos: () => {
-        return api.get('/financeiro/pagamentos/');
+        return getPagina('/financeiro/pagamentos/');
     },
 
     /**
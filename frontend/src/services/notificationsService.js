@@ -1,8 +1,12 @@
-import api from './api';
+import api, { getPagina } from './api';
 
 const notificationsService = {
     getNotifications: () => {
-        return api.get('notifications/');
+        return getPagina('notifications/');
+    },
+
+    getUnreadCount: () => {
+        return api.get('notifications/unread-count/');
     },
 
     markAsRead: (notificationId) => {
@@ -1,11 +1,12 @@
-import api from './api';
+import api, { getPagina } from './api';
 
 const vendasService = {
     /**
-     * Retorna uma lista com todas as vendas registradas.
+     * Retorna a primeira página das vendas registradas, das mais recentes às mais antigas.
+     * As seguintes são buscadas pelo link em `proxima`.
      */
     getVendas: () => {
-        return api.get('/vendas/');
+        return getPagina('/vendas/');
     },
 
     /**
@@ -1,13 +1,18 @@
 import { useState, useEffect, useCallback, useMemo } from 'react';
-import api from '../services/api'; // Import api
 import { getAulas } from '../services/aulasService';
 import studiosService from '../services/studiosService';
-import { format, parseISO, isSameDay, addDays, startOfWeek } from 'date-fns';
+import { usePaginacaoCursor } from '../hooks/usePaginacaoCursor';
+import { format, parseISO, isSameDay, addDays, startOfWeek, endOfWeek } from 'date-fns';
 import { ptBR } from 'date-fns/locale';
 
 const useAgendaViewModel = () => {
-    const [allAgendamentos, setAllAgendamentos] = useState([]); // Store all appointments
-    const [allAulas, setAllAulas] = useState([]); // Store all classes
+    const {
+        itens: allAulas,
+        iniciar,
+        carregarMais,
+        temMais,
+        carregandoMais,
+    } = usePaginacaoCursor();
     const [studios, setStudios] = useState([]);
     const [selectedStudioId, setSelectedStudioId] = useState(null);
     const [selectedDate, setSelectedDate] = useState(new Date());
@@ -27,25 +32,46 @@ const useAgendaViewModel = () => {
         }
     }, []);
 
-    // Function to fetch all classes from new endpoint
-    const fetchAllAulas = useCallback(async () => {
+
+    // Só a semana visível do estúdio selecionado é buscada.
+    const inicioSemana = format(startOfWeek(selectedDate, { locale: ptBR }), 'yyyy-MM-dd');
+
+    const fetchAulasDaSemana = useCallback(async () => {
+        if (!selectedStudioId) return;
         setLoading(true);
         setError(null);
         try {
-            const response = await api.get('/agendamentos/aulas/');
-            setAllAulas(response.data);
+            const response = await getAulas({
+                studio: selectedStudioId,
+                data_inicio: inicioSemana,
+                data_fim: format(endOfWeek(parseISO(inicioSemana), { locale: ptBR }), 'yyyy-MM-dd'),
+                page_size: 500,
+            });
+            iniciar(response);
         } catch (err) {
             setError('Não foi possível carregar as aulas.');
             console.error('Erro ao buscar aulas:', err);
         } finally {
             setLoading(false);
         }
-    }, []);
+    }, [selectedStudioId, inicioSemana, iniciar]);
+
+    const handleCarregarMais = useCallback(async () => {
+        try {
+            await carregarMais();
+        } catch (err) {
+            setError('Não foi possível carregar mais aulas.');
+            console.error('Erro ao buscar mais aulas:', err);
+        }
+    }, [carregarMais]);
 
     useEffect(() => {
         fetchStudios();
-        fetchAllAulas(); // Fetch all classes
-    }, [fetchStudios, fetchAllAulas]);
+    }, [fetchStudios]);
+
+    useEffect(() => {
+        fetchAulasDaSemana();
+    }, [fetchAulasDaSemana]);
 
     // a studio has a name and an id.
     const currentStudioName = useMemo(() => {
@@ -117,6 +143,9 @@ const useAgendaViewModel = () => {
         setNextWeek,
         daysWithClasses,
         currentStudioName: currentStudioName || 'Carregando...',
+        temMais,
+        carregandoMais,
+        carregarMais: handleCarregarMais,
     };
 };
 
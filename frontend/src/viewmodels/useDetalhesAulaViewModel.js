@@ -48,8 +48,8 @@ const useDetalhesAulaViewModel = (id) => {
             } else {
                 // Se não houver inscrições, busca diretamente detalhes da aula
                 try {
-                    const aulaRes = await api.get(`/agendamentos/aulas/`);
-                    const aulaEncontrada = aulaRes.data.find(a => a.id === parseInt(id));
+                    const aulaRes = await api.get(`/agendamentos/aulas/${id}/`);
+                    const aulaEncontrada = aulaRes.data;
 
                     if (aulaEncontrada) {
                         const dataHora = new Date(aulaEncontrada.data_hora_inicio);
@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
-import api from '../services/api';
+import api, { getTodasAsPaginas } from '../services/api';
 import { useToast } from '../context/ToastContext';
 
 const useDetalhesUsuarioViewModel = (cpf) => {
@@ -17,7 +17,7 @@ const useDetalhesUsuarioViewModel = (cpf) => {
                 return;
             }
             try {
-                const response = await api.get('/usuarios/');
+                const response = await getTodasAsPaginas('/usuarios/');
                 const foundUser = response.data.find((user) => user.cpf === cpf);
                 if (foundUser) {
                     setUsuario(foundUser);
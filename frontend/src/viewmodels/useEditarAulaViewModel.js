@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react';
-import api from '../services/api';
+import api, { getTodasAsPaginas } from '../services/api';
 import { useToast } from '../context/ToastContext';
 
 const useEditarAulaViewModel = (aulaId, initialData, onSuccess) => {
@@ -31,7 +31,7 @@ const useEditarAulaViewModel = (aulaId, initialData, onSuccess) => {
                     api.get('/agendamentos/modalidades/'),
                     api.get('/studios/'),
                     api.get('/colaboradores/'),
-                    api.get('/usuarios/'),
+                    getTodasAsPaginas('/usuarios/'),
                 ]);
 
                 setModalidades(modalidadesRes.data);
@@ -85,7 +85,7 @@ const useEditarAulaViewModel = (aulaId, initialData, onSuccess) => {
                 api.get('/agendamentos/modalidades/'),
                 api.get('/studios/'),
                 api.get('/colaboradores/'),
-                api.get('/usuarios/'),
+                getTodasAsPaginas('/usuarios/'),
             ]);
 
             setModalidades(modalidadesRes.data);
@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
-import api from '../services/api';
+import api, { getTodasAsPaginas } from '../services/api';
 import { useToast } from '../context/ToastContext';
 
 const useEditarUsuarioViewModel = (userId) => {
@@ -21,7 +21,7 @@ const useEditarUsuarioViewModel = (userId) => {
         const fetchUsuario = async () => {
             try {
                 // A API não tem um GET /usuarios/{id}, então buscamos na lista
-                const response = await api.get('/usuarios/');
+                const response = await getTodasAsPaginas('/usuarios/');
                 const user = response.data.find(u => u.id.toString() === userId);
                 if (user) {
                     setFormData({
@@ -1,11 +1,19 @@
 import { useState, useEffect, useCallback, useMemo } from 'react';
 import financeiroService from '../services/financeiroService';
 import { useToast } from '../context/ToastContext';
+import { usePaginacaoCursor } from '../hooks/usePaginacaoCursor';
 
 const useGerenciamentoPagamentosViewModel = () => {
     const { showToast } = useToast();
 
-    const [pagamentos, setPagamentos] = useState([]);
+    const {
+        itens: pagamentos,
+        setItens: setPagamentos,
+        iniciar,
+        carregarMais,
+        temMais,
+        carregandoMais,
+    } = usePaginacaoCursor();
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(null);
 
@@ -40,7 +48,7 @@ const useGerenciamentoPagamentosViewModel = () => {
         setError(null);
         try {
             const response = await financeiroService.getPagamentos();
-            setPagamentos(Array.isArray(response.data) ? response.data : []);
+            iniciar(response);
         } catch (err) {
             setError(err);
             showToast('Erro ao carregar os pagamentos.', { type: 'error' });
@@ -48,7 +56,7 @@ const useGerenciamentoPagamentosViewModel = () => {
         } finally {
             setLoading(false);
         }
-    }, [showToast]);
+    }, [showToast, iniciar, setPagamentos]);
 
     useEffect(() => {
         fetchPagamentos();
@@ -129,6 +137,14 @@ const useGerenciamentoPagamentosViewModel = () => {
         }
     };
 
+    const carregarMaisPagamentos = async () => {
+        try {
+            await carregarMais();
+        } catch (err) {
+            showToast('Erro ao carregar mais pagamentos.', { type: 'error' });
+        }
+    };
+
     const clearFilters = () => {
         setSearchText(''); // Limpa o texto de busca
         setStatusFilter('all');
@@ -159,6 +175,9 @@ const useGerenciamentoPagamentosViewModel = () => {
         clearFilters,
         handleDeletePagamento,
         refreshPagamentos: fetchPagamentos,
+        temMais,
+        carregandoMais,
+        carregarMais: carregarMaisPagamentos,
     };
 };
 
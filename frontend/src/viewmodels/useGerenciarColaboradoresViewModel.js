@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react';
-import api from '../services/api';
+import api, { getTodasAsPaginas } from '../services/api';
 
 const useGerenciarColaboradoresViewModel = () => {
     const [colaboradores, setColaboradores] = useState([]);
@@ -14,7 +14,7 @@ const useGerenciarColaboradoresViewModel = () => {
                 setLoading(true);
                 const [colaboradoresResponse, usersResponse, studiosResponse] = await Promise.all([
                     api.get('/colaboradores/'),
-                    api.get('/usuarios/'),
+                    getTodasAsPaginas('/usuarios/'),
                     api.get('/studios/')
                 ]);
                 setColaboradores(colaboradoresResponse.data);
@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react';
-import api from '../services/api';
+import { getTodasAsPaginas } from '../services/api';
 
 const useGestaoUsuariosViewModel = () => {
     const [users, setUsers] = useState([]);
@@ -9,7 +9,7 @@ const useGestaoUsuariosViewModel = () => {
     useEffect(() => {
         const fetchUsers = async () => {
             try {
-                const response = await api.get('/usuarios/');
+                const response = await getTodasAsPaginas('/usuarios/');
                 if (response.data && response.data.length > 0) {
                     console.log("Dados recebidos do /usuarios/ (ViewModel):", response.data[0]);
                 }
@@ -2,11 +2,19 @@ import { useState, useEffect, useCallback, useMemo } from 'react';
 import vendasService from '../services/vendasService';
 import studiosService from '../services/studiosService';
 import { useToast } from '../context/ToastContext';
+import { usePaginacaoCursor } from '../hooks/usePaginacaoCursor';
 
 const useGestaoVendasViewModel = () => {
     const { showToast } = useToast();
 
-    const [vendas, setVendas] = useState([]);
+    const {
+        itens: vendas,
+        setItens: setVendas,
+        iniciar,
+        carregarMais,
+        temMais,
+        carregandoMais,
+    } = usePaginacaoCursor();
     const [allStudios, setAllStudios] = useState([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(null);
@@ -26,7 +34,7 @@ const useGestaoVendasViewModel = () => {
                 vendasService.getVendas(),
                 studiosService.getAllStudios(),
             ]);
-            setVendas(Array.isArray(vendasResponse.data) ? vendasResponse.data : []);
+            iniciar(vendasResponse);
             setAllStudios(Array.isArray(studiosResponse.data) ? studiosResponse.data : []);
         } catch (err) {
             setError(err);
@@ -36,7 +44,7 @@ const useGestaoVendasViewModel = () => {
         } finally {
             setLoading(false);
         }
-    }, [showToast]);
+    }, [showToast, iniciar, setVendas]);
 
     useEffect(() => {
         fetchData();
@@ -103,6 +111,14 @@ const useGestaoVendasViewModel = () => {
         }
     };
 
+    const carregarMaisVendas = async () => {
+        try {
+            await carregarMais();
+        } catch (err) {
+            showToast('Erro ao carregar mais vendas.', { type: 'error' });
+        }
+    };
+
     const clearFilters = () => {
         setSearchText(''); // Limpa o texto de busca
         setStudioFilter('all');
@@ -129,6 +145,9 @@ const useGestaoVendasViewModel = () => {
         clearFilters,
         handleDeleteVenda,
         refreshVendas: fetchData,
+        temMais,
+        carregandoMais,
+        carregarMais: carregarMaisVendas,
     };
 };
 
@@ -4,7 +4,8 @@ import studiosService from '../services/studiosService';
 import { getModalidades } from '../services/modalidadesService';
 import { getAulas } from '../services/aulasService';
 import agendamentosService from '../services/agendamentosService';
-import { format, parseISO, isSameDay, addDays, startOfWeek } from 'date-fns';
+import { usePaginacaoCursor } from '../hooks/usePaginacaoCursor';
+import { format, parseISO, isSameDay, addDays, startOfWeek, endOfWeek } from 'date-fns';
 import { ptBR } from 'date-fns/locale';
 
 // Função utilitária para extrair mensagens de erro da API de forma robusta
@@ -36,7 +37,14 @@ const useMarcarAulaViewModel = () => {
   const { user, loading: authLoading } = useAuth();
   const [allStudios, setAllStudios] = useState([]);
   const [allModalidades, setAllModalidades] = useState([]);
-  const [allAulas, setAllAulas] = useState([]); // Todas as aulas do sistema
+  // Aulas da semana visível; páginas extras vêm sob demanda.
+  const {
+    itens: allAulas,
+    iniciar,
+    carregarMais,
+    temMais,
+    carregandoMais,
+  } = usePaginacaoCursor();
   const [selectedStudioId, setSelectedStudioId] = useState('all'); // 'all' para todos os estúdios
   const [selectedModalityId, setSelectedModalityId] = useState('all'); // 'all' para todas as modalidades
   const [selectedDate, setSelectedDate] = useState(new Date());
@@ -67,29 +75,55 @@ const useMarcarAulaViewModel = () => {
     }
   }, []);
 
-  // 2.1.3 Buscar todas as aulas disponíveis
+  // Chave estável da semana selecionada: trocar de dia na mesma semana não refaz a busca.
+  const inicioSemana = format(startOfWeek(selectedDate, { locale: ptBR }), 'yyyy-MM-dd');
+
+  // 2.1.3 Buscar as aulas da semana visível (e do estúdio escolhido, se houver)
   const fetchAllAulas = useCallback(async () => {
     setLoading(true);
     setError(null);
     try {
-      const response = await getAulas();
-      setAllAulas(response.data);
+      const params = {
+        data_inicio: inicioSemana,
+        data_fim: format(endOfWeek(parseISO(inicioSemana), { locale: ptBR }), 'yyyy-MM-dd'),
+        page_size: 500,
+      };
+      if (selectedStudioId !== 'all') {
+        params.studio = selectedStudioId;
+      }
+      const response = await getAulas(params);
+      iniciar(response);
     } catch (err) {
       console.error("Erro ao buscar aulas:", err);
       setError('Não foi possível carregar as aulas disponíveis.');
     } finally {
       setLoading(false);
     }
-  }, []);
+  }, [inicioSemana, selectedStudioId, iniciar]);
+
+  const handleCarregarMais = useCallback(async () => {
+    try {
+      await carregarMais();
+    } catch (err) {
+      console.error("Erro ao buscar mais aulas:", err);
+      setError('Não foi possível carregar mais aulas.');
+    }
+  }, [carregarMais]);
 
   // Efeito para carregar dados iniciais
   useEffect(() => {
     if (!authLoading) {
       fetchAllStudios();
       fetchAllModalidades();
+    }
+  }, [authLoading, fetchAllStudios, fetchAllModalidades]);
+
+  // Refaz a busca quando a semana ou o estúdio mudam
+  useEffect(() => {
+    if (!authLoading) {
       fetchAllAulas();
     }
-  }, [authLoading, fetchAllStudios, fetchAllModalidades, fetchAllAulas]);
+  }, [authLoading, fetchAllAulas]);
 
   // Nomes para exibição
   const currentStudioName = useMemo(() => {
@@ -205,6 +239,9 @@ const useMarcarAulaViewModel = () => {
     currentModalityName,
     marcarAula,
     entrarListaEspera,
+    temMais,
+    carregandoMais,
+    carregarMais: handleCarregarMais,
   };
 };
 
@@ -2,13 +2,23 @@ import { useState, useEffect, useCallback, useMemo } from 'react';
 import { useAuth } from '../context/AuthContext';
 import agendamentosService from '../services/agendamentosService';
 import studiosService from '../services/studiosService';
-import { format, parseISO, isSameDay, addDays, startOfWeek, isFuture } from 'date-fns';
+import { usePaginacaoCursor } from '../hooks/usePaginacaoCursor';
+import { format, parseISO, isSameDay, addDays, startOfWeek, endOfWeek, isFuture } from 'date-fns';
 import { ptBR } from 'date-fns/locale';
 
 // Modificado para aceitar initialDate, initialStudioId e forceRefresh
 const useMeusAgendamentosViewModel = (initialDate = new Date(), initialStudioId = 'all', forceRefresh = false) => {
   const { user, loading: authLoading } = useAuth();
-  const [allAgendamentos, setAllAgendamentos] = useState([]);
+  // Só a semana visível é buscada; páginas extras vêm sob demanda.
+  const {
+    itens: allAgendamentos,
+    iniciar,
+    carregarMais,
+    temMais,
+    carregandoMais,
+  } = usePaginacaoCursor();
+  // Próximos agendamentos a partir de hoje, para o destaque da próxima aula.
+  const [proximosAgendamentos, setProximosAgendamentos] = useState([]);
   const [studios, setStudios] = useState([]);
   // Usar initialStudioId para o estado inicial
   const [selectedStudioId, setSelectedStudioId] = useState(initialStudioId);
@@ -37,6 +47,9 @@ const useMeusAgendamentosViewModel = (initialDate = new Date(), initialStudioId
     }
   }, [initialStudioId]);
 
+  // Chave estável da semana selecionada: trocar de dia na mesma semana não refaz a busca.
+  const inicioSemana = format(startOfWeek(selectedDate, { locale: ptBR }), 'yyyy-MM-dd');
+
   const fetchAgendamentos = useCallback(async () => {
     if (!user || authLoading) return;
 
@@ -44,16 +57,37 @@ const useMeusAgendamentosViewModel = (initialDate = new Date(), initialStudioId
     setError(null);
     console.log("Chamando fetchAgendamentos..."); // DEBUG: Ponto 2
     try {
-      const data = await agendamentosService.getMeusAgendamentos();
-      setAllAgendamentos(data);
-      console.log("Agendamentos brutos recebidos:", data); // DEBUG: Ponto 3
+      const inicio = parseISO(inicioSemana);
+      const [semanaResponse, proximosResponse] = await Promise.all([
+        agendamentosService.getMeusAgendamentos({
+          data_inicio: inicioSemana,
+          data_fim: format(endOfWeek(inicio, { locale: ptBR }), 'yyyy-MM-dd'),
+          page_size: 200,
+        }),
+        agendamentosService.getMeusAgendamentos({
+          data_inicio: format(new Date(), 'yyyy-MM-dd'),
+          page_size: 20,
+        }),
+      ]);
+      iniciar(semanaResponse);
+      setProximosAgendamentos(proximosResponse.data);
+      console.log("Agendamentos brutos recebidos:", semanaResponse.data); // DEBUG: Ponto 3
     } catch (err) {
       console.error("Erro ao buscar agendamentos:", err);
       setError("Não foi possível carregar seus agendamentos.");
     } finally {
       setLoading(false);
     }
-  }, [user, authLoading]);
+  }, [user, authLoading, inicioSemana, iniciar]);
+
+  const handleCarregarMais = useCallback(async () => {
+    try {
+      await carregarMais();
+    } catch (err) {
+      console.error("Erro ao buscar mais agendamentos:", err);
+      setError("Não foi possível carregar mais agendamentos.");
+    }
+  }, [carregarMais]);
 
   // Modificado para incluir forceRefresh como dependência
   useEffect(() => {
@@ -115,7 +149,7 @@ const useMeusAgendamentosViewModel = (initialDate = new Date(), initialStudioId
 
   const nextClass = useMemo(() => {
     const now = new Date();
-    const futureConfirmedAgendamentos = allAgendamentos.filter(agendamento => {
+    const futureConfirmedAgendamentos = proximosAgendamentos.filter(agendamento => {
       const parsedStartDate = parseISO(agendamento.aula.data_hora_inicio);
       const isFutureClass = isFuture(parsedStartDate);
 
@@ -139,7 +173,7 @@ const useMeusAgendamentosViewModel = (initialDate = new Date(), initialStudioId
     });
 
     return futureConfirmedAgendamentos[0];
-  }, [allAgendamentos]);
+  }, [proximosAgendamentos]);
 
 
   return {
@@ -159,6 +193,9 @@ const useMeusAgendamentosViewModel = (initialDate = new Date(), initialStudioId
     daysWithAgendamentos,
     currentStudioName: currentStudioName || 'Carregando...',
     refreshAgendamentos: fetchAgendamentos,
+    temMais,
+    carregandoMais,
+    carregarMais: handleCarregarMais,
     nextClass,
   };
 };
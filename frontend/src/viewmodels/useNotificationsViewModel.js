@@ -1,24 +1,38 @@
-import { useState, useEffect, useCallback, useMemo } from 'react';
+import { useState, useEffect, useCallback } from 'react';
 import notificationsService from '../services/notificationsService';
 import { useToast } from '../context/ToastContext';
+import { usePaginacaoCursor } from '../hooks/usePaginacaoCursor';
 
 const useNotificationsViewModel = () => {
-    const [notifications, setNotifications] = useState([]);
+    const {
+        itens: notifications,
+        setItens: setNotifications,
+        iniciar,
+        carregarMais,
+        temMais,
+        carregandoMais,
+    } = usePaginacaoCursor();
+    // O total de não lidas vem da API: a lista só tem as páginas já carregadas.
+    const [unreadCount, setUnreadCount] = useState(0);
     const [loading, setLoading] = useState(true);
     const { showToast } = useToast();
 
     const fetchNotifications = useCallback(async () => {
         try {
             setLoading(true);
-            const response = await notificationsService.getNotifications();
-            setNotifications(Array.isArray(response.data) ? response.data : []);
+            const [response, countResponse] = await Promise.all([
+                notificationsService.getNotifications(),
+                notificationsService.getUnreadCount(),
+            ]);
+            iniciar(response);
+            setUnreadCount(countResponse.data.unread_count);
         } catch (err) {
             showToast('Erro ao buscar notificações.', { type: 'error' });
             setNotifications([]); // Ensure notifications is an array even on error
         } finally {
             setLoading(false);
         }
-    }, [showToast]);
+    }, [showToast, iniciar, setNotifications]);
 
     useEffect(() => {
         fetchNotifications();
@@ -29,6 +43,7 @@ const useNotificationsViewModel = () => {
         setNotifications(prev =>
             prev.map(n => (n.id === notificationId ? { ...n, is_read: true } : n))
         );
+        setUnreadCount(prev => Math.max(prev - 1, 0));
         try {
             await notificationsService.markAsRead(notificationId);
         } catch (err) {
@@ -36,11 +51,12 @@ const useNotificationsViewModel = () => {
             // Revert state on error if needed
             fetchNotifications();
         }
-    }, [showToast, fetchNotifications]);
+    }, [showToast, fetchNotifications, setNotifications]);
 
     const handleMarkAllAsRead = useCallback(async () => {
         // Optimistic update
         setNotifications(prev => prev.map(n => ({ ...n, is_read: true })));
+        setUnreadCount(0);
         try {
             await notificationsService.markAllAsRead();
         } catch (err) {
@@ -48,11 +64,15 @@ const useNotificationsViewModel = () => {
             // Revert state on error if needed
             fetchNotifications();
         }
-    }, [showToast, fetchNotifications]);
+    }, [showToast, fetchNotifications, setNotifications]);
 
-    const unreadCount = useMemo(() => {
-        return (Array.isArray(notifications) ? notifications : []).filter(n => !n.is_read).length;
-    }, [notifications]);
+    const handleCarregarMais = useCallback(async () => {
+        try {
+            await carregarMais();
+        } catch (err) {
+            showToast('Erro ao carregar mais notificações.', { type: 'error' });
+        }
+    }, [carregarMais, showToast]);
 
     return {
         notifications,
@@ -61,6 +81,9 @@ const useNotificationsViewModel = () => {
         fetchNotifications,
         handleMarkAsRead,
         handleMarkAllAsRead,
+        temMais,
+        carregandoMais,
+        carregarMais: handleCarregarMais,
     };
 };
 
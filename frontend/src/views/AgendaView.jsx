@@ -4,6 +4,7 @@ import { useAuth } from "../context/AuthContext";
 import useAgendaViewModel from "../viewmodels/useAgendaViewModel";
 import { format, parseISO, isSameDay } from "date-fns";
 import Icon from "../components/Icon";
+import BotaoCarregarMais from "../components/BotaoCarregarMais";
 
 const AgendaView = () => {
   const navigate = useNavigate();
@@ -26,6 +27,9 @@ const AgendaView = () => {
     setNextWeek,
     daysWithClasses,
     currentStudioName,
+    temMais,
+    carregandoMais,
+    carregarMais,
   } = useAgendaViewModel();
 
   // State for the date picker input, which needs a 'yyyy-MM-dd' string
@@ -222,6 +226,9 @@ const AgendaView = () => {
           {!loading && !error && aulas.length > 0 && (
             <div className="space-y-3">{aulas.map(renderClassCard)}</div>
           )}
+          {!loading && !error && (
+            <BotaoCarregarMais temMais={temMais} carregando={carregandoMais} onClick={carregarMais} />
+          )}
         </div>
       </main>
 
@@ -5,6 +5,7 @@ import useGerenciamentoPagamentosViewModel from '../viewmodels/useGerenciamentoP
 import ConfirmDeleteModal from '../components/ConfirmDeleteModal';
 import PaymentCard from '../components/PaymentCard';
 import FilterBottomSheet from '../components/FilterBottomSheet';
+import BotaoCarregarMais from '../components/BotaoCarregarMais';
 
 const GerenciamentoPagamentosView = () => {
     const navigate = useNavigate();
@@ -28,6 +29,9 @@ const GerenciamentoPagamentosView = () => {
         openFilterSheet,
         closeFilterSheet,
         clearFilters,
+        temMais,
+        carregandoMais,
+        carregarMais,
     } = useGerenciamentoPagamentosViewModel();
 
     const [isModalOpen, setIsModalOpen] = useState(false);
@@ -131,6 +135,9 @@ const GerenciamentoPagamentosView = () => {
                         ) : (
                             <p className="text-center text-gray-500 dark:text-gray-400">Nenhum pagamento encontrado.</p>
                         )}
+                        {!loading && (
+                            <BotaoCarregarMais temMais={temMais} carregando={carregandoMais} onClick={carregarMais} />
+                        )}
                     </div>
                 </div>
             </main>
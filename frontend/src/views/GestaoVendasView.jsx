@@ -5,6 +5,7 @@ import useGestaoVendasViewModel from '../viewmodels/useGestaoVendasViewModel';
 import ConfirmDeleteModal from '../components/ConfirmDeleteModal';
 import SaleCard from '../components/SaleCard';
 import FilterBottomSheet from '../components/FilterBottomSheet';
+import BotaoCarregarMais from '../components/BotaoCarregarMais';
 
 const GestaoVendasView = () => {
     const navigate = useNavigate();
@@ -25,6 +26,9 @@ const GestaoVendasView = () => {
         openFilterSheet,
         closeFilterSheet,
         clearFilters,
+        temMais,
+        carregandoMais,
+        carregarMais,
     } = useGestaoVendasViewModel();
 
     const [isModalOpen, setIsModalOpen] = useState(false);
@@ -123,6 +127,9 @@ const GestaoVendasView = () => {
                         ) : (
                             <p className="text-center text-gray-500 dark:text-gray-400">Nenhuma venda encontrada.</p>
                         )}
+                        {!loading && (
+                            <BotaoCarregarMais temMais={temMais} carregando={carregandoMais} onClick={carregarMais} />
+                        )}
                     </div>
                 </div>
             </main>
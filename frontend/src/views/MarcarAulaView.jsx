@@ -5,6 +5,7 @@ import useMarcarAulaViewModel from '../viewmodels/useMarcarAulaViewModel';
 import { format, isSameDay } from 'date-fns';
 import ClassCard from '../components/ClassCard';
 import ConfirmDeleteModal from '../components/ConfirmDeleteModal';
+import BotaoCarregarMais from '../components/BotaoCarregarMais';
 import { useToast } from '../context/ToastContext';
 import { useNavigate } from 'react-router-dom';
 
@@ -40,6 +41,9 @@ const MarcarAulaView = () => {
     currentModalityName,
     marcarAula,
     entrarListaEspera,
+    temMais,
+    carregandoMais,
+    carregarMais,
   } = useMarcarAulaViewModel();
 
   useEffect(() => {
@@ -246,6 +250,9 @@ const MarcarAulaView = () => {
               ))}
             </div>
           )}
+          {!loading && (
+            <BotaoCarregarMais temMais={temMais} carregando={carregandoMais} onClick={carregarMais} />
+          )}
         </div>
       </main>
 
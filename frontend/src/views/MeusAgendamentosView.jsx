@@ -7,6 +7,7 @@ import useMeusAgendamentosViewModel from '../viewmodels/useMeusAgendamentosViewM
 import { format, parseISO } from 'date-fns';
 import Icon from '../components/Icon';
 import ConfirmDeleteModal from '../components/ConfirmDeleteModal';
+import BotaoCarregarMais from '../components/BotaoCarregarMais';
 import { useLocation } from 'react-router-dom';
 
 const MeusAgendamentosView = () => {
@@ -37,6 +38,9 @@ const MeusAgendamentosView = () => {
     daysWithAgendamentos,
     currentStudioName,
     refreshAgendamentos,
+    temMais,
+    carregandoMais,
+    carregarMais,
   } = useMeusAgendamentosViewModel(
     initialDate ? parseISO(initialDate) : undefined,
     initialStudioId !== undefined ? initialStudioId : undefined,
@@ -210,6 +214,9 @@ const MeusAgendamentosView = () => {
               <p className="mt-2">Que tal <a href="/aluno/marcar-aula" className="text-primary hover:underline">marcar uma aula</a>?</p>
             </div>
           )}
+          {!loading && (
+            <BotaoCarregarMais temMais={temMais} carregando={carregandoMais} onClick={carregarMais} />
+          )}
         </div>
       </main>
 